@@ -0,0 +1,265 @@
+import asyncio
+import inspect
+import warnings
+
+from lib.cache import value_version
+from lib.catalogs import post_cliente_catalog_errors
+from lib.faults import decode_fault
+from lib.idempotency import IdempotencyError
+from lib.parsers import extract_preaprobado
+from lib.registry import operations
+from lib.resilience import CircuitOpenError, circuit_breaker
+from lib.settings import CLIENT_CREATED, ENV
+from lib.timing import collect, emit, stage
+from lib.tracing import trace
+from lib.utils import (
+    async_call_service,
+    build_reply_message,
+    capture_soap_error,
+    clean_dict,
+    get_async_client,
+    serialize_soap_response,
+    to_json,
+)
+from lib.validation import RequestValidationError, preflight_errors
+from service import idempotency_store, list_selection_cache
+
+
+warnings.simplefilter("ignore")
+
+
+# Versiones asíncronas de los servicios de service.py, comparten los caches y el formato de las respuestas. Un
+# mismo contenedor puede tener varias llamadas a Credifamilia en curso mientras espera las respuestas.
+
+
+@capture_soap_error
+async def get_list_selection(client):
+    """
+    Ver service.get_list_selection.
+    """
+    get_list_selection_response = await async_call_service(client, "getListSelection", _soapheaders=None)
+    return serialize_soap_response(get_list_selection_response.result)
+
+
+@capture_soap_error
+async def post_existe_cliente(client, request_data):
+    """
+    Ver service.post_existe_cliente.
+    """
+    post_existe_cliente_response = await async_call_service(
+        client, "postExisteCliente", request=request_data, _soapheaders=None
+    )
+    return serialize_soap_response(post_existe_cliente_response.result)
+
+
+@capture_soap_error
+async def get_list_proyectos_by_constructora(client, request_data):
+    """
+    Ver service.get_list_proyectos_by_constructora.
+    """
+    resp = await async_call_service(client, "getListProyectosByConstructora", request=request_data, _soapheaders=None)
+    return serialize_soap_response(resp.result)
+
+
+@capture_soap_error
+async def post_cliente_radicacion(client, request_data):
+    """
+    Ver service.post_cliente_radicacion.
+    """
+    from factories import FilingFactory
+
+    return await _post_cliente_radicacion(client, FilingFactory.get_request(request_data))
+
+
+@capture_soap_error
+async def _post_cliente_radicacion(client, filing_data):
+    resp = await async_call_service(client, "postClienteRadicacion", request=filing_data, _soapheaders=None)
+    return serialize_soap_response(resp.result)
+
+
+@capture_soap_error
+async def get_address_pregunta(client):
+    """
+    Ver service.get_address_pregunta.
+    """
+    get_address_pregunta_response = await async_call_service(client, "getAdresPreguntaRequest")
+    return serialize_soap_response(get_address_pregunta_response.result)
+
+
+@capture_soap_error
+async def post_cliente(client, request_data):
+    """
+    Ver service.post_cliente.
+    """
+    return serialize_soap_response((await _post_cliente(client, request_data)).result)
+
+
+async def _post_cliente(client, request_data, preflight=True):
+    return await async_call_service(
+        client, "postCliente", request=request_data, preflight=preflight, _soapheaders=None
+    )
+
+
+@capture_soap_error
+async def get_preaprobado(client, idTransaccion):
+    """
+    Ver service.get_preaprobado.
+    """
+    request_data = {"idTransaccion": idTransaccion or "1"}
+    get_preaprobado_response = await async_call_service(
+        client, "getPreaprobado", request=request_data, _soapheaders=None
+    )
+    with stage("preaprobado"):
+        response = extract_preaprobado(get_preaprobado_response.envelope)
+        for key in ("result_client", "result_client_detail"):
+            if isinstance(response[key], dict):
+                response[key] = clean_dict(response[key])
+    return response
+
+
+@capture_soap_error
+async def service_create_client(client, data):
+    """
+    Ver service.service_create_client, las listas se validan mientras postExisteCliente está en curso.
+    """
+    # los errores de tipos y campos del esquema se responden sin llamar a Credifamilia
+    schema_errors = preflight_errors("postCliente", data)
+    if schema_errors:
+        return build_reply_message(
+            True,
+            f"Error al crear cliente: {' '.join(schema_errors)}",
+            {"errors": schema_errors},
+            from_function="service_create_client",
+        )
+    client_exist_data = {
+        "tipoDocumento": data.get("tipoDocumento"),
+        "numeroDocumento": data.get("numeroDocumento"),
+        "origen": "LQN",
+    }
+    # a diferencia de los hilos de service.py, cancelar la tarea interrumpe getListSelection si está en curso
+    catalog_errors_task = asyncio.ensure_future(_post_cliente_catalog_errors(client, data))
+    try:
+        client_exist_result = await post_existe_cliente(client, client_exist_data)
+    except Exception:
+        catalog_errors_task.cancel()
+        raise
+
+    if client_exist_result.get("existe") is not False:
+        catalog_errors_task.cancel()
+        return build_reply_message(
+            False, client_exist_result.get("mensaje"), client_exist_result, from_function="service_create_client"
+        )
+
+    catalog_errors = await catalog_errors_task
+    if catalog_errors:
+        return build_reply_message(
+            True,
+            f"Error al crear cliente: {' '.join(catalog_errors)}",
+            {"errors": catalog_errors},
+            from_function="service_create_client",
+        )
+
+    post_cliente_response = await _post_cliente(client, data, preflight=False)
+    client_result = serialize_soap_response(post_cliente_response.result)
+    fault = decode_fault(post_cliente_response.envelope)
+    if fault:
+        return build_reply_message(
+            True,
+            f"Error al crear cliente: (fault = {fault.message})",
+            client_result,
+            from_function="service_create_client",
+        )
+
+    approved_result = await get_preaprobado(client, client_result.get("idTransaccion"))
+    approved_result.update({"idTransaccion": client_result.get("idTransaccion")})
+    return build_reply_message(False, CLIENT_CREATED, approved_result, from_function="service_create_client")
+
+
+async def _post_cliente_catalog_errors(client, data):
+    """
+    Ver service._post_cliente_catalog_errors.
+    """
+    try:
+        list_selection = await list_selection_cache.get_or_load_async(ENV, lambda: get_list_selection(client))
+    except Exception:
+        return []
+    return post_cliente_catalog_errors(data, list_selection)
+
+
+async def async_handler(event, context):
+    service = event.get("service")
+    format = event.get("format", "json")
+    data = event.get("data", None)
+
+    with trace(service) as outcome, collect() as timings:
+        try:
+            operation = async_operations.get(service)
+            client = get_async_client() if operation is not None and operation.needs_client else None
+            result = await dispatch(client, service, data)
+            outcome.failed = isinstance(result, dict) and result.get("error") is True
+            if format == "json" and not isinstance(result, str):
+                with stage("json"):
+                    result = to_json(result)
+        finally:
+            emit(timings, service)
+
+    return result
+
+
+# mismas operaciones y metadatos de service.py con los servicios asíncronos, las que no llaman a Credifamilia
+# (invalidate_proyectos_by_constructora, get_resilience_stats) se mantienen síncronas
+async_operations = operations.with_handlers(
+    {
+        "create_client": lambda client, data: service_create_client(client, data),
+        "get_list_selection": lambda client, data: get_list_selection(client),
+        "get_address_pregunta": lambda client, data: get_address_pregunta(client),
+        "post_existe_cliente": lambda client, data: post_existe_cliente(client, data),
+        "get_preaprobado": lambda client, data: get_preaprobado(client, data["idTransaccion"]),
+        "post_cliente_radicacion": lambda client, data: _post_cliente_radicacion(client, data),
+        "get_list_proyectos_by_constructora": lambda client, data: get_list_proyectos_by_constructora(client, data),
+    }
+)
+
+
+async def dispatch(client, service, data):
+    """
+    Ver service.dispatch.
+    """
+    operation = async_operations.get(service)
+    if operation is None:
+        return {"error": True, "message": "Ningun servicio utilizado"}
+
+    data = operation.validate(data)
+    try:
+        cache_key = operation.cache_key(data) if operation.cacheable else None
+        if cache_key is not None:
+            return await operation.cache.get_or_load_async(cache_key, lambda: operation.handler(client, data))
+        if operation.idempotency_key is not None:
+            return await idempotency_store.run_async(
+                operation.idempotency_key(data),
+                value_version(data),
+                lambda: operation.handler(client, data),
+                operation.replayable,
+            )
+        result = operation.handler(client, data)
+        return await result if inspect.isawaitable(result) else result
+    except CircuitOpenError as error:
+        return build_reply_message(True, str(error), circuit_breaker.stats(), from_function=service)
+    except IdempotencyError as error:
+        return build_reply_message(True, str(error), idempotency_store.stats(), from_function=service)
+    except RequestValidationError as error:
+        return build_reply_message(True, str(error), {"errors": error.errors}, from_function=service)
+
+
+_loop = None
+
+
+def handler(event, context):
+    """
+    Punto de entrada de la lambda para el modo asíncrono (handler: async_service.handler). Todas las invocaciones
+    corren en el mismo event loop para reutilizar las conexiones del cliente.
+    """
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(async_handler(event, context))
@@ -0,0 +1,114 @@
+"""
+Validation of post_cliente_radicacion filings: the compiled plans of FilingFactory.get_request against building the
+pydantic model and dumping it with .dict(exclude_unset=True), and against a discriminated union of the models on
+type (pydantic >= 1.9), over generated filings of every profile type.
+
+    python -m benchmarks.bench_filing [--filings 1000] [--invalid 0.1]
+"""
+import argparse
+import random
+import time
+from typing import Literal, Union
+
+from pydantic import BaseModel, Field, ValidationError
+
+from factories import FILING_TYPES, FilingFactory
+from tests.utils import radicacion_data
+
+# fields that the clients send as text or as numbers, the validation converts them
+NUMBERS = ("activos", "pasivos", "egresos", "telefonoEmpresa", "estrato")
+HOUSE_NUMBERS = ("plazoCredito", "valorInmueble", "creditoSolicitadoValorAFinanciar", "recursosPropios")
+
+
+def generate_filings(count: int, invalid: float, seed: int = 0) -> list:
+    """
+    :param count: filings of every profile type
+    :param invalid: share of the filings with a missing field or a value that is not a number
+    """
+    rng = random.Random(seed)
+    filings = []
+    for profile in FILING_TYPES:
+        for _ in range(count):
+            filing = radicacion_data(profile, proyecto=str(rng.randint(1, 500)))
+            for name in NUMBERS:
+                value = rng.randint(1, 10**9)
+                filing[name] = str(value) if rng.random() < 0.5 else value
+            for name in HOUSE_NUMBERS:
+                value = rng.randint(1, 10**9)
+                filing["vivienda"][name] = str(value) if rng.random() < 0.5 else value
+            if rng.random() < invalid:
+                if rng.random() < 0.5:
+                    filing.pop(rng.choice(("ip", "canal", "estrato", "vivienda")))
+                else:
+                    filing["vivienda"]["plazoCredito"] = "veinte años"
+            filings.append(filing)
+    return filings
+
+
+def model_request(profile):
+    return FilingFactory.get_filing(profile).dict(exclude_unset=True)
+
+
+def build_union():
+    """
+    the same models with a Literal type field, behind a discriminated union on it
+    """
+    tagged = tuple(
+        type(f"Tagged{model.__name__}", (model,), {"__annotations__": {"type": Literal[name]}})
+        for name, model in FILING_TYPES.items()
+    )
+
+    class Filing(BaseModel):
+        __root__: Union[tagged] = Field(..., discriminator="type")
+
+    def union_request(profile):
+        return Filing.parse_obj(profile).__root__.dict(exclude_unset=True, exclude={"type"})
+
+    return union_request
+
+
+def outcome(validate, profile):
+    try:
+        return validate(profile)
+    except ValidationError as error:
+        return error.errors()
+
+
+def measure(validate, filings) -> float:
+    started = time.perf_counter()
+    for profile in filings:
+        try:
+            validate(profile)
+        except ValidationError:
+            pass
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filings", type=int, default=1000, help="filings of every profile type")
+    parser.add_argument("--invalid", type=float, default=0.1)
+    args = parser.parse_args()
+
+    filings = generate_filings(args.filings, args.invalid)
+    union_request = build_union()
+    for profile in filings:
+        expected = outcome(model_request, profile)
+        assert outcome(FilingFactory.get_request, profile) == expected
+        # the union reports its errors under the tag of the model, only the valid requests compare
+        if isinstance(expected, dict):
+            assert union_request(profile) == expected
+
+    print(f"{'validation':<12} {'filings':>8} {'total ms':>10} {'us/filing':>10} {'speedup':>8}")
+    model = min(measure(model_request, filings) for _ in range(3))
+    union = min(measure(union_request, filings) for _ in range(3))
+    compiled = min(measure(FilingFactory.get_request, filings) for _ in range(3))
+    for name, seconds in (("model", model), ("union", union), ("compiled", compiled)):
+        print(
+            f"{name:<12} {len(filings):>8} {seconds * 1000:>10.1f} {seconds / len(filings) * 1e6:>10.1f}"
+            f" {model / seconds:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
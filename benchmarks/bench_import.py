@@ -0,0 +1,110 @@
+"""
+Cold start import time of the lambda, every import runs in a new interpreter as it happens in a new container.
+
+    python -m benchmarks.bench_import [--runs 10] [--json]
+    python -m benchmarks.bench_import --profile service [--top 25]
+
+--profile prints the modules that take longest to import according to python -X importtime, the same report is
+available with make importtime.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from lib.settings import BASE_DIR
+
+# what a new container imports before answering: the synchronous handler, the async one and the synchronous
+# handler once a radicación loads the pydantic models
+TARGETS = {
+    "service": "import service",
+    "async_service": "import async_service",
+    "service + factories": "import service, factories",
+}
+# dependencies that only some operations need and must not be part of the import of the handler
+HEAVY_MODULES = ("asyncio", "pydantic", "models", "sentry_sdk")
+
+SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def import_once(statement: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", SCRIPT.format(statement=statement, heavy=HEAVY_MODULES)]
+    # the bytecode is already compiled by the first run, as it is in the lambda package
+    return subprocess.run(
+        command, cwd=BASE_DIR, capture_output=True, text=True, check=True, env={**os.environ, "SENTRY_DSN": ""}
+    )
+
+
+def run(runs: int) -> dict:
+    results = {}
+    for name, statement in TARGETS.items():
+        import_once(statement)
+        samples = [json.loads(import_once(statement).stdout) for _ in range(runs)]
+        seconds = sorted(sample["seconds"] for sample in samples)
+        results[name] = {
+            "p50_ms": statistics.median(seconds) * 1000,
+            "min_ms": seconds[0] * 1000,
+            "max_ms": seconds[-1] * 1000,
+            "loaded": samples[0]["loaded"],
+        }
+    return results
+
+
+def profile(module: str, top: int) -> list:
+    """
+    :return: (cumulative microseconds, self microseconds, module) of the slowest imports of module
+    """
+    stderr = import_once(f"import {module}", importtime=True).stderr
+    modules, group = [], []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        group.append((int(cumulative), int(own), name.rstrip()))
+        # importtime prints every module after its dependencies, a line without indentation closes the tree of
+        # an import of the interpreter (site, encodings, ...) or of the script
+        if not name.startswith("  "):
+            if name.strip() in (module, module.split(".")[0]):
+                modules.extend(group)
+            group = []
+    return sorted(modules, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="print the results as json, to compare between runs")
+    parser.add_argument("--profile", metavar="MODULE", help="print the slowest imports of MODULE instead")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(f"{'cumulative ms':>14} {'self ms':>10}  module")
+        for cumulative, own, name in profile(args.profile, args.top):
+            print(f"{cumulative / 1000:>14.1f} {own / 1000:>10.1f} {name}")
+        return
+
+    results = run(args.runs)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'import':<22} {'p50 ms':>10} {'min ms':>10} {'max ms':>10}  heavy modules loaded")
+    for name, result in results.items():
+        loaded = ", ".join(result["loaded"]) or "-"
+        print(f"{name:<22} {result['p50_ms']:>10.1f} {result['min_ms']:>10.1f} {result['max_ms']:>10.1f}  {loaded}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Latency and allocations of every stage of a request, offline against a local soap server that answers with the
+canned responses of tests/utils.
+
+    python -m benchmarks.bench_pipeline [--iterations 200] [--json]
+
+Every stage is timed on its own with the output of the previous one prepared outside the measure, the
+allocations are the peak of memory traced by tracemalloc during one call.
+"""
+import argparse
+import copy
+import json
+import statistics
+import time
+import tracemalloc
+
+from lxml import etree
+
+from factories import FilingFactory
+from lib.parsers import extract_preaprobado
+from lib.settings import CERT_FILE, KEY_FILE
+from lib.signature import BinarySignatureTimestamp
+from lib.utils import clean_dict, create_client, serialize_soap_response
+from service import operations
+from tests.utils import (
+    PREAPROBADO_BODY,
+    RADICACION_BODY,
+    RESULTADO_CODEUDOR,
+    SOAP_ENVELOPE,
+    LocalSoapServer,
+    radicacion_data,
+)
+
+HEADERS = {"SOAPAction": '"urn:postClienteRadicacion"', "Content-Type": 'text/xml; charset="utf-8"'}
+ALLOCATION_CALLS = 5
+
+
+def measure(function, setup=None, iterations=200):
+    """
+    :param function: stage to measure, receives the value returned by setup
+    :param setup: builds the input of every call outside the measure
+    :return: latencies of every call in seconds and peak of traced memory in bytes
+    """
+    latencies = []
+    for _ in range(iterations):
+        argument = setup() if setup else None
+        started = time.perf_counter()
+        function(argument)
+        latencies.append(time.perf_counter() - started)
+
+    # tracing starts and stops around every call (reset_peak is not in python 3.8), only the memory allocated by
+    # the call is traced so the peak needs no baseline
+    peaks = []
+    for _ in range(ALLOCATION_CALLS):
+        argument = setup() if setup else None
+        tracemalloc.start()
+        try:
+            function(argument)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return latencies, min(peaks)
+
+
+def summary(latencies, peak):
+    latencies = sorted(latencies)
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "alloc_kb": peak / 1024,
+    }
+
+
+def postprocess_preaprobado(envelope):
+    response = extract_preaprobado(envelope)
+    for key in ("result_client", "result_client_detail"):
+        if isinstance(response[key], dict):
+            response[key] = clean_dict(response[key])
+    return response
+
+
+def run(iterations):
+    client = create_client(operations)
+    client.wsse = None
+    signer = BinarySignatureTimestamp(key_file=KEY_FILE, certfile=CERT_FILE)
+    data = radicacion_data()
+    filing = FilingFactory.get_request(data)
+    envelope = client.create_message(client.service, "postClienteRadicacion", request=filing)
+    signed = copy.deepcopy(envelope)
+    signer.apply(signed, {})
+
+    binding = client.service._binding
+    operation = binding.get("postClienteRadicacion")
+    codeudores = "".join(RESULTADO_CODEUDOR.format(monto=1000000 + i, numero_documento=10000000 + i) for i in range(2))
+    body = PREAPROBADO_BODY.format(carta="cGRm" * 1024, codeudores=codeudores)
+    preaprobado = etree.fromstring(SOAP_ENVELOPE.format(body=body).encode("utf-8"))
+
+    results = {}
+    with LocalSoapServer({"postClienteRadicacion": RADICACION_BODY}) as server:
+        response = client.transport.post_xml(server.url, signed, HEADERS)
+        stages = (
+            ("client construction", lambda _: create_client(operations), None),
+            ("filing validation", lambda _: FilingFactory.get_request(data), None),
+            (
+                "envelope build",
+                lambda _: client.create_message(client.service, "postClienteRadicacion", request=filing),
+                None,
+            ),
+            ("signature", lambda unsigned: signer.apply(unsigned, {}), lambda: copy.deepcopy(envelope)),
+            ("http round trip", lambda _: client.transport.post_xml(server.url, signed, HEADERS), None),
+            (
+                "response parsing",
+                lambda _: serialize_soap_response(binding.process_reply(client, operation, response)),
+                None,
+            ),
+            ("preaprobado post-processing", lambda _: postprocess_preaprobado(preaprobado), None),
+        )
+        for name, function, setup in stages:
+            stage_iterations = max(1, iterations // 20) if name == "client construction" else iterations
+            results[name] = summary(*measure(function, setup, stage_iterations))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print the results as json, to compare between runs")
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'stage':<30} {'p50 ms':>10} {'p95 ms':>10} {'mean ms':>10} {'alloc KB':>10}")
+    for name, result in results.items():
+        print(
+            f"{name:<30} {result['p50_ms']:>10.3f} {result['p95_ms']:>10.3f} {result['mean_ms']:>10.3f} "
+            f"{result['alloc_kb']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
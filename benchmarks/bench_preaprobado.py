@@ -0,0 +1,88 @@
+"""
+Compare the extraction of getPreaprobado responses from the lxml tree against the previous
+pretty-print -> xmltodict -> json round trip.
+
+    python -m benchmarks.bench_preaprobado
+"""
+import base64
+import json
+import os
+import timeit
+
+import xmltodict
+from lxml import etree
+
+from lib.parsers import extract_preaprobado
+from lib.utils import CustomEncoder, clean_dict, serialize_soap_response
+from tests.utils import PREAPROBADO_BODY, RESULTADO_CODEUDOR, SOAP_ENVELOPE
+
+SIZES = (
+    # (letter size in bytes, co-debtors)
+    (0, 0),
+    (64 * 1024, 2),
+    (1024 * 1024, 10),
+    (4 * 1024 * 1024, 50),
+)
+
+
+def build_envelope(letter_size: int, codeudores: int):
+    carta = base64.b64encode(os.urandom(letter_size)).decode("ascii")
+    body = PREAPROBADO_BODY.format(
+        carta=carta,
+        codeudores="".join(
+            RESULTADO_CODEUDOR.format(monto=1000000 + i, numero_documento=10000000 + i) for i in range(codeudores)
+        ),
+    )
+    parser = etree.XMLParser(huge_tree=True)
+    return etree.fromstring(SOAP_ENVELOPE.format(body=body).encode("utf-8"), parser)
+
+
+def legacy_preaprobado(envelope):
+    your_pretty_xml = etree.tostring(envelope, encoding="unicode", pretty_print=True)
+    xml = xmltodict.parse(your_pretty_xml)
+    result_str = json.dumps(xml, cls=CustomEncoder, default=str)
+    result = json.loads(result_str)
+    result_return = (
+        result.get("soapenv:Envelope").get("soapenv:Body").get("ns:getPreaprobadoResponse").get("ns:return")
+    )
+    result_client = result_return.get("ax22:resultadoCliente")
+    result_client_detail = result_return.get("ax22:resultadoCliente").get("ax28:detalle")
+    preaproved_letter = result_return.get("ax22:cartaPreaprobado")
+    result_client.pop("ax28:detalle")
+    response = {}
+    response["result_client"] = clean_dict(result_client)
+    response["result_client_detail"] = clean_dict(result_client_detail)
+    response["preaproved_letter"] = preaproved_letter
+    response = clean_dict(response)
+    return serialize_soap_response(response)
+
+
+def lxml_preaprobado(envelope):
+    response = extract_preaprobado(envelope)
+    for key in ("result_client", "result_client_detail"):
+        if isinstance(response[key], dict):
+            response[key] = clean_dict(response[key])
+    return response
+
+
+def measure(function, envelope, number):
+    return min(timeit.repeat(lambda: function(envelope), number=number, repeat=5)) / number
+
+
+def main():
+    print(f"{'letter':>10} {'codeudores':>10} {'legacy ms':>10} {'lxml ms':>10} {'speedup':>8}")
+    for letter_size, codeudores in SIZES:
+        envelope = build_envelope(letter_size, codeudores)
+        assert legacy_preaprobado(envelope) == lxml_preaprobado(envelope)
+
+        number = max(1, 200 // (1 + letter_size // (64 * 1024)))
+        legacy = measure(legacy_preaprobado, envelope, number)
+        extracted = measure(lxml_preaprobado, envelope, number)
+        print(
+            f"{letter_size:>10} {codeudores:>10} {legacy * 1000:>10.3f} {extracted * 1000:>10.3f} "
+            f"{legacy / extracted:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compare serialize_soap_response + the json encoding done by handler against the previous
+serialize_object -> json.dumps -> json.loads -> json.dumps chain on getListSelection sized payloads.
+
+    python -m benchmarks.bench_serializer
+"""
+import json
+import timeit
+from collections import deque
+
+from zeep import helpers
+
+from lib.utils import CustomEncoder, create_client, serialize_soap_response, to_json
+from service import operations
+
+LISTS = (
+    "listCiudadResidencia",
+    "listConstructoras",
+    "listEstadoCivil",
+    "listNacionalidad",
+    "listNivelEducacion",
+    "listOcupacionPrincipal",
+    "listTipoContrato",
+    "listTipoDocumento",
+    "listTipoProducto",
+)
+FIELDS = (10, 100, 1000)
+
+
+def build_list_selection(client, fields: int):
+    list_selection = client.get_type("{http://response.web.proptech.credifamilia.com/xsd}GetListSelectionResponse")
+    field = client.get_type("{http://model.web.proptech.credifamilia.com/xsd}Field")
+    elements = dict(list_selection.elements)
+    values = {}
+    for name in LISTS:
+        list_type = elements[name].type
+        values[name] = list_type(field=[field(label=f"{name} {i}", value=str(i)) for i in range(fields)])
+    return list_selection(**values)
+
+
+def legacy(soap_object):
+    input_dict = helpers.serialize_object(soap_object)
+    format_keys = []
+    for x in input_dict:
+        if isinstance(input_dict[x], deque):
+            format_keys.append(x)
+
+    for x in format_keys:
+        input_dict[x] = list(input_dict[x])
+    result = json.loads(json.dumps(input_dict, cls=CustomEncoder, default=str))
+    return json.dumps(result, cls=CustomEncoder, default=str)
+
+
+def single_pass(soap_object):
+    return to_json(serialize_soap_response(soap_object))
+
+
+def main():
+    client = create_client(operations)
+    print(f"{'fields':>8} {'legacy ms':>10} {'new ms':>10} {'speedup':>8}")
+    for fields in FIELDS:
+        soap_object = build_list_selection(client, fields)
+        assert json.loads(legacy(soap_object)) == json.loads(single_pass(soap_object))
+
+        number = max(1, 2000 // fields)
+        old = min(timeit.repeat(lambda: legacy(soap_object), number=number, repeat=5)) / number
+        new = min(timeit.repeat(lambda: single_pass(soap_object), number=number, repeat=5)) / number
+        print(f"{fields:>8} {old * 1000:>10.3f} {new * 1000:>10.3f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Compare the signing throughput of BinarySignatureTimestamp against the previous implementation, which parsed the
+key on every envelope, signed with a BinarySecurityToken and then rewrote the SecurityTokenReference after a
+recursive str() search of the security header.
+
+    python -m benchmarks.bench_signing
+"""
+import copy
+import timeit
+
+from lxml import etree
+from zeep.wsse import utils
+from zeep.wsse.signature import BinarySignature, _make_verify_key, _read_file, _verify_envelope_with_key
+
+from factories import FilingFactory
+from lib.settings import CERT_FILE, KEY_FILE
+from lib.signature import BinarySignatureTimestamp
+from lib.utils import create_client
+from service import operations
+from tests.utils import radicacion_data
+
+
+class LegacyBinarySignatureTimestamp(BinarySignature):
+    def find_by_str(self, elements: list, text: str):
+        for e in elements:
+            name = str(e)
+            if text in name:
+                return e
+            childs = e.getchildren()
+            if childs:
+                result = self.find_by_str(childs, text)
+                if result:
+                    return result
+        return None
+
+    def apply(self, envelope, headers):
+        super().apply(envelope, headers)
+
+        security = utils.get_security_header(envelope)
+        children = security.getchildren()
+        ref = self.find_by_str(children, "SecurityTokenReference")
+        old_key = ref.find("wsse:Reference", namespaces=utils.NSMAP)
+        ref.remove(old_key)
+        binary = security.find("wsse:BinarySecurityToken", namespaces=utils.NSMAP)
+        identifier = utils.WSSE("KeyIdentifier")
+        identifier.text = binary.text.replace("\n", "")
+        identifier.set(
+            "EncodingType",
+            "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-soap-message-security-1.0#Base64Binary",
+        )
+        identifier.set(
+            "ValueType", "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-x509-token-profile-1.0#X509v3"
+        )
+        ref.append(identifier)
+        se = security.find("wsse:BinarySecurityToken", namespaces=utils.NSMAP)
+        parent = se.getparent()
+        parent.remove(se)
+        return envelope, headers
+
+
+def build_envelope():
+    """
+    unsigned envelope of postClienteRadicacion with the data used by the tests
+    """
+    filing = FilingFactory.get_filing(radicacion_data()).dict(exclude_unset=True)
+
+    client = create_client(operations)
+    client.wsse = None
+    return client.create_message(client.service, "postClienteRadicacion", request=filing)
+
+
+def key_info(envelope):
+    """
+    structure of the KeyInfo that credifamilia reads, without the values that change on every signature
+    """
+    security = utils.get_security_header(envelope)
+    return [(element.tag, element.text) for element in security.iter("{*}KeyInfo", "{*}KeyIdentifier")], [
+        child.tag for child in security
+    ]
+
+
+def signs_per_second(signer, envelope, number):
+    def sign():
+        signer.apply(copy.deepcopy(envelope), {})
+
+    copy_time = min(timeit.repeat(lambda: copy.deepcopy(envelope), number=number, repeat=5))
+    sign_time = min(timeit.repeat(sign, number=number, repeat=5))
+    return number / (sign_time - copy_time)
+
+
+def main():
+    envelope = build_envelope()
+    legacy = LegacyBinarySignatureTimestamp(KEY_FILE, CERT_FILE)
+    current = BinarySignatureTimestamp(key_file=KEY_FILE, certfile=CERT_FILE)
+
+    verify_key = _make_verify_key(_read_file(CERT_FILE))
+    signed = {}
+    for name, signer in (("legacy", legacy), ("current", current)):
+        signed[name] = copy.deepcopy(envelope)
+        signer.apply(signed[name], {})
+        _verify_envelope_with_key(signed[name], verify_key)
+    assert key_info(signed["legacy"]) == key_info(signed["current"])
+
+    print(f"envelope: {len(etree.tostring(envelope))} bytes")
+    legacy_rate = signs_per_second(legacy, envelope, 500)
+    current_rate = signs_per_second(current, envelope, 500)
+    print(f"{'legacy':>10} {legacy_rate:>10.0f} envelopes/s")
+    print(f"{'current':>10} {current_rate:>10.0f} envelopes/s {current_rate / legacy_rate:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Call service.handler at a target rate against the stub server and report the latency percentiles.
+
+    python -m benchmarks.load --service post_existe_cliente --rps 50 --duration 10 --latency 0.05
+
+The requests are scheduled at fixed times (open loop), the latency is measured from the scheduled time so the
+queueing caused by a slow server is part of the result. Use --endpoint to load an already running server.
+
+Every request carries its own document or idTransaccion, so create_client and post_cliente_radicacion reach the
+server instead of being answered by the idempotency store, and get_list_proyectos_by_constructora asks for a new
+constructora each time. get_list_selection has a single cache key: after the first request it measures cache hits.
+"""
+import argparse
+import functools
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import service
+from lib.catalogs import POST_CLIENTE_CATALOGS, catalog_values
+from lib.utils import get_client
+from tests.stub_server import StubServer
+from tests.utils import radicacion_data
+
+# scenarios answered from the cache of the lambda after the first request
+CACHE_HIT_SCENARIOS = {"get_list_selection"}
+
+
+@functools.lru_cache(maxsize=None)
+def _client_catalogs() -> dict:
+    return catalog_values(service.dispatch(get_client(), "get_list_selection", None))
+
+
+def create_client_event(index: int) -> dict:
+    """
+    new client for every request, the values of the lists are taken from the get_list_selection of the server so
+    the catalog check passes
+    """
+    catalogs = _client_catalogs()
+    data = {
+        "origen": "LQN",
+        "numeroDocumento": 20000000 + index,
+        "fechaNacimiento": "1990-01-01T00:00:00",
+        "nombres": "Carga",
+        "apellidos": f"Prueba {index}",
+        "correoElectronico": f"carga{index}@example.com",
+        "celular": 3000000000 + index,
+        "tipoActividad": "Empleado",
+        "fechaIngresoEmpleo": "2021-07-19T00:00:00",
+        "viviendaPropia": False,
+        "valorInmueble": 120000000,
+        "valorCredito": 70000000,
+        "numeroPersonasaCargo": 0,
+        "ingresosMensuales": 2700000,
+        "recursosPropios": 0,
+        "encontroVivienda": True,
+        "codigoCapcha": "",
+        "idTransaccion": "",
+        "ip": "192.168.0.1",
+        "canal": "Web",
+        "autorizacionConsultaCentrales": True,
+    }
+    for field, list_names in POST_CLIENTE_CATALOGS.items():
+        list_names = (list_names,) if isinstance(list_names, str) else list_names
+        allowed = next((catalogs[name] for name in list_names if catalogs.get(name)), None)
+        data[field] = min(allowed) if allowed else "Otro"
+    return {"service": "create_client", "data": data}
+
+
+def radicacion_event(index: int) -> dict:
+    data = radicacion_data()
+    data["idTransaccion"] = "%032x" % index
+    return {"service": "post_cliente_radicacion", "data": data}
+
+
+EVENTS = {
+    "post_existe_cliente": lambda i: {
+        "service": "post_existe_cliente",
+        "data": {"tipoDocumento": "Cédula ciudadanía", "numeroDocumento": 10000000 + i, "origen": "LQN"},
+    },
+    "get_preaprobado": lambda i: {"service": "get_preaprobado", "data": {"idTransaccion": "%032x" % i}},
+    "get_list_selection": lambda i: {"service": "get_list_selection"},
+    "get_list_proyectos_by_constructora": lambda i: {
+        "service": "get_list_proyectos_by_constructora",
+        "data": {"nombre": f"Constructora {i}"},
+    },
+    "get_address_pregunta": lambda i: {"service": "get_address_pregunta"},
+    "create_client": create_client_event,
+    "post_cliente_radicacion": radicacion_event,
+}
+
+
+def percentile(values: list, q: float) -> float:
+    """
+    :param values: sorted values
+    :param q: percentile between 0 and 100, nearest rank
+    """
+    if not values:
+        return float("nan")
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def run_load(event, rps: float, duration: float, workers: int) -> dict:
+    """
+    :param event: function that builds the event of the i-th request
+    :return: latencies in seconds of the successful calls, number of errors and the elapsed time
+    """
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def call(index, scheduled):
+        try:
+            result = service.handler({**event(index), "format": "dict"}, None)
+            failed = isinstance(result, dict) and result.get("error") is True
+        except Exception as error:
+            failed = type(error).__name__
+        latency = time.perf_counter() - scheduled
+        with lock:
+            (errors if failed else latencies).append(latency)
+
+    total = int(rps * duration)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for index in range(total):
+            scheduled = started + index / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(call, index, scheduled)
+    return {"latencies": sorted(latencies), "errors": len(errors), "elapsed": time.perf_counter() - started}
+
+
+def report(service_name: str, rps: float, result: dict):
+    latencies = result["latencies"]
+    completed = len(latencies) + result["errors"]
+    cache = "  (cache hits)" if service_name in CACHE_HIT_SCENARIOS else ""
+    print(f"service: {service_name}{cache}  target: {rps:.0f} rps  achieved: {completed / result['elapsed']:.1f} rps")
+    print(f"requests: {completed}  errors: {result['errors']}")
+    print(f"{'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    print(
+        f"{percentile(latencies, 50) * 1000:>10.1f} {percentile(latencies, 95) * 1000:>10.1f} "
+        f"{percentile(latencies, 99) * 1000:>10.1f} {(latencies[-1] if latencies else float('nan')) * 1000:>10.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--service", default="post_existe_cliente", choices=sorted(EVENTS))
+    parser.add_argument("--rps", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--workers", type=int, default=32, help="calls in flight at most")
+    parser.add_argument("--endpoint", help="url of a running server, by default a stub server is started")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the stub server takes to answer")
+    parser.add_argument("--latency-jitter", type=float, default=0)
+    parser.add_argument("--fault-rate", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--scale", type=int, default=1)
+    args = parser.parse_args()
+
+    client = get_client()
+    event = EVENTS[args.service]
+    if args.endpoint:
+        client.transport.endpoint = args.endpoint
+        # the first event loads what the builder needs (ej. the lists of create_client) outside of the measure
+        event(0)
+        result = run_load(event, args.rps, args.duration, args.workers)
+    else:
+        stub = StubServer(args.latency, args.latency_jitter, args.fault_rate, args.error_rate, args.scale)
+        with stub:
+            client.transport.endpoint = stub.url
+            event(0)
+            result = run_load(event, args.rps, args.duration, args.workers)
+    report(args.service, args.rps, result)
+
+
+if __name__ == "__main__":
+    main()
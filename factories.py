@@ -1,3 +1,8 @@
+from pydantic import BaseModel, Extra, ValidationError
+from pydantic.error_wrappers import ErrorWrapper
+from pydantic.errors import MissingError
+from pydantic.fields import SHAPE_SINGLETON
+
 import models
 
 
@@ -11,14 +16,114 @@ FILING_TYPES = {
 }
 
 
+def _plain_strings(model) -> bool:
+    config = model.__config__
+    return not (
+        config.anystr_strip_whitespace
+        or config.anystr_lower
+        or config.anystr_upper
+        or config.min_anystr_length
+        or config.max_anystr_length is not None
+    )
+
+
+class CompiledModel:
+    """
+    validation plan of a pydantic model, compiled once from its fields. It turns a dict straight into the dict of
+    model(**data).dict(exclude_unset=True), with the same coercions and the same ValidationError, without building
+    the model and dumping it again: the nested models are validated by their own plans, the values that already
+    have the type of the field are taken as they are and the rest go through the validators of the field once.
+    Models with validators of their own or extra fields other than ignore are validated by the model.
+    A discriminated union on type (pydantic >= 1.9) would also pick the model by the tag, but it still builds the
+    model and dumps it, and it needs a type field in every model that must be left out of the request: it is slower
+    than the model alone (see benchmarks/bench_filing.py)
+    :param model: pydantic model
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.compiled = (
+            model.__config__.extra == Extra.ignore
+            and not model.__pre_root_validators__
+            and not model.__post_root_validators__
+        )
+        plain_strings = _plain_strings(model)
+        # (alias, name, field, plan of the nested model, type taken as it is)
+        self.fields = []
+        for field in model.__fields__.values():
+            nested = exact = None
+            if field.shape == SHAPE_SINGLETON and not field.class_validators:
+                if isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+                    nested = compile_model(field.type_)
+                elif field.type_ in (int, bool) or (field.type_ is str and plain_strings):
+                    exact = field.type_
+            self.fields.append((field.alias, field.name, field, nested, exact))
+
+    def validate(self, data: dict) -> dict:
+        """
+        :return: the values of data that are fields of the model, converted to their types
+        :raise ValidationError: with every error of the data, as the model raises it
+        """
+        if not self.compiled:
+            return self.model(**data).dict(exclude_unset=True)
+        values, errors = {}, []
+        for alias, name, field, nested, exact in self.fields:
+            if alias not in data:
+                if field.required:
+                    errors.append(ErrorWrapper(MissingError(), loc=alias))
+                continue
+            value = data[alias]
+            if exact is not None and type(value) is exact:
+                values[name] = value
+            elif nested is not None and isinstance(value, dict):
+                try:
+                    values[name] = nested.validate(value)
+                except ValidationError as error:
+                    errors.append(ErrorWrapper(error, loc=alias))
+            else:
+                value, error = field.validate(value, values, loc=alias, cls=self.model)
+                if error:
+                    errors.append(error)
+                else:
+                    values[name] = value.dict(exclude_unset=True) if isinstance(value, BaseModel) else value
+        if errors:
+            raise ValidationError(errors, self.model)
+        return values
+
+
+_compiled = {}
+
+
+def compile_model(model) -> CompiledModel:
+    """
+    :return: the plan of the model, compiled on the first use
+    """
+    plan = _compiled.get(model)
+    if plan is None:
+        plan = _compiled[model] = CompiledModel(model)
+    return plan
+
+
 class FilingFactory:
     @staticmethod
-    def get_filing(profile):
+    def get_type(profile):
         if not profile.get("type"):
             raise Exception("The type field is required")
 
         if profile.get("type") not in FILING_TYPES:
             raise Exception("Profile type not found")
 
-        Filing = FILING_TYPES[profile.get("type")]
+        return FILING_TYPES[profile.get("type")]
+
+    @staticmethod
+    def get_filing(profile):
+        Filing = FilingFactory.get_type(profile)
         return Filing(**profile)
+
+    @staticmethod
+    def get_request(profile):
+        """
+        request of postClienteRadicacion for the profile, the same as get_filing(profile).dict(exclude_unset=True)
+        through the compiled plan of its type
+        """
+        return compile_model(FilingFactory.get_type(profile)).validate(profile)
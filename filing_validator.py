@@ -0,0 +1,178 @@
+"""
+Offline validation of post_cliente_radicacion filings before a campaign, without calling credifamilia.
+
+    python filing_validator.py filings.jsonl [--output errors.jsonl] [--catalogs list_selection.json]
+                               [--workers 4] [--chunksize 200] [--all]
+
+Every filing goes through the same checks as the lambda: the models of FilingFactory, the schema of the WSDL and,
+with --catalogs, the lists of the CRM (a get_list_selection response saved as json). The input is JSONL, one filing
+per line, or CSV with one column per field and dotted names for the nested ones (vivienda.plazoCredito). The output
+gets one json line per filing with errors, in the order of the input, as the filings are validated; the throughput
+is reported on stderr. The exit status is 1 when some filing has errors.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+from pydantic import ValidationError
+
+from factories import FilingFactory
+from lib.catalogs import catalog_values, filing_catalog_errors
+from lib.validation import get_request_validator
+
+# allowed values of the lists of the CRM inside every worker, set by _init_worker
+_catalogs = {}
+
+
+def _init_worker(catalogs: dict):
+    global _catalogs
+    _catalogs = catalogs
+    # the schema is compiled once per worker, not once per filing
+    get_request_validator()
+
+
+def unflatten(row: dict) -> dict:
+    """
+    :param row: row of a csv, the empty cells are fields that were not sent
+    :return: the filing with the dotted columns as nested dictionaries
+    """
+    filing = {}
+    for column, value in row.items():
+        if not column or value is None or value == "":
+            continue
+        *parents, name = column.strip().split(".")
+        node = filing
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[name] = value
+    return filing
+
+
+def filing_errors(filing, catalogs: dict = None) -> list:
+    """
+    :param filing: data of a post_cliente_radicacion event
+    :param catalogs: allowed values returned by catalog_values, the lists are not checked without them
+    :return: list with a message for every error of the filing, empty when the lambda would send it
+    """
+    if not isinstance(filing, dict):
+        return [f"La radicación debe ser un objeto, no {type(filing).__name__}."]
+    try:
+        request = FilingFactory.get_request(filing)
+    except ValidationError as error:
+        return [f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()]
+    except Exception as error:
+        return [str(error)]
+    errors = get_request_validator().errors("postClienteRadicacion", request)
+    if catalogs:
+        errors += filing_catalog_errors(request, catalogs)
+    return errors
+
+
+def validate_record(record: tuple) -> dict:
+    """
+    :param record: (line of the input, filing or the text of a jsonl line)
+    :return: result of the filing for the output
+    """
+    line, filing = record
+    if isinstance(filing, str):
+        try:
+            filing = json.loads(filing)
+        except ValueError as error:
+            return {"line": line, "idTransaccion": None, "errors": [f"JSON inválido: {error}"]}
+    errors = filing_errors(filing, _catalogs)
+    transaction = filing.get("idTransaccion") if isinstance(filing, dict) else None
+    return {"line": line, "idTransaccion": transaction, "errors": errors}
+
+
+def read_records(path: str):
+    """
+    :return: (line, filing) of the input as it is read, the jsonl lines are parsed by the workers
+    """
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(file)
+            for row in reader:
+                # line where the row ends, a quoted cell can span lines
+                yield reader.line_num, unflatten(row)
+            return
+        for line, text in enumerate(file, start=1):
+            if text.strip():
+                yield line, text
+
+
+def load_catalogs(path: str) -> dict:
+    """
+    :param path: json with a response of get_list_selection, or the reply of the lambda that contains it
+    """
+    with open(path, encoding="utf-8") as file:
+        list_selection = json.load(file)
+    if "payload" in list_selection and isinstance(list_selection["payload"], dict):
+        list_selection = list_selection["payload"]
+    return catalog_values(list_selection)
+
+
+def validate_file(
+    path: str, output, catalogs: dict = None, workers: int = 1, chunksize: int = 200, write_valid: bool = False
+) -> dict:
+    """
+    :param path: jsonl or csv with the filings
+    :param output: text file where the results are written
+    :param workers: processes, 1 validates in this process
+    :param write_valid: also write the filings without errors
+    :return: counts and throughput of the validation
+    """
+    catalogs = catalogs or {}
+    started = time.perf_counter()
+    counts = {"records": 0, "valid": 0, "invalid": 0}
+    if workers > 1:
+        pool = Pool(workers, initializer=_init_worker, initargs=(catalogs,))
+        results = pool.imap(validate_record, read_records(path), chunksize=chunksize)
+    else:
+        pool = None
+        _init_worker(catalogs)
+        results = map(validate_record, read_records(path))
+    try:
+        for result in results:
+            counts["records"] += 1
+            counts["invalid" if result["errors"] else "valid"] += 1
+            if result["errors"] or write_valid:
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    seconds = time.perf_counter() - started
+    return {**counts, "seconds": seconds, "records_per_second": counts["records"] / seconds if seconds else 0.0}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="jsonl or csv with the filings")
+    parser.add_argument("--output", default="-", help="jsonl with the errors of every filing, - for stdout")
+    parser.add_argument("--catalogs", help="json with a response of get_list_selection")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunksize", type=int, default=200, help="filings sent to a worker at a time")
+    parser.add_argument("--all", action="store_true", help="also write the filings without errors")
+    args = parser.parse_args(argv)
+
+    catalogs = load_catalogs(args.catalogs) if args.catalogs else {}
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        report = validate_file(args.input, output, catalogs, args.workers, args.chunksize, args.all)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(
+        f"{report['records']} radicaciones, {report['valid']} válidas, {report['invalid']} con errores "
+        f"en {report['seconds']:.2f} s ({report['records_per_second']:.0f} radicaciones/s)",
+        file=sys.stderr,
+    )
+    return 1 if report["invalid"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,370 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    version: str
+    stored_at: float
+
+
+def value_version(value: Any) -> str:
+    """
+    :param value: value stored in the cache
+    :return: sha256 of the value, it changes only when the content changes
+    """
+    content = json.dumps(value, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+class MemoryBackend:
+    """
+    key-value store kept in memory, stand-in for the persistent backends in tests and local runs
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        return self._data.get(key)
+
+    def set(self, key: str, record: dict):
+        self._data[key] = record
+
+    def add(self, key: str, record: dict) -> bool:
+        """
+        store the record only if the key does not exist
+        :return: whether it was stored
+        """
+        with self._lock:
+            if key in self._data:
+                return False
+            self._data[key] = record
+            return True
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+
+class FileBackend:
+    """
+    one json file per key, in lambda the directory lives in /tmp and survives while the container is warm
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, key: str) -> Optional[dict]:
+        try:
+            with open(self._path(key), encoding="utf-8") as record:
+                return json.load(record)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_tmp(self, record: dict) -> str:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, "w", encoding="utf-8") as tmp:
+            json.dump(record, tmp, default=str)
+        return tmp_path
+
+    def set(self, key: str, record: dict):
+        os.replace(self._write_tmp(record), self._path(key))
+
+    def add(self, key: str, record: dict) -> bool:
+        tmp_path = self._write_tmp(record)
+        try:
+            # unlike replace, link fails when the file exists
+            os.link(tmp_path, self._path(key))
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class SQLiteBackend:
+    """
+    records stored in a sqlite database, in lambda the file lives in /tmp like the FileBackend
+    """
+
+    def __init__(self, path: str):
+        import sqlite3
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS records (key TEXT PRIMARY KEY, record TEXT NOT NULL)")
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connection.execute("SELECT record FROM records WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, record: dict):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO records (key, record) VALUES (?, ?)", (key, json.dumps(record, default=str))
+            )
+
+    def add(self, key: str, record: dict) -> bool:
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO records (key, record) VALUES (?, ?)", (key, json.dumps(record, default=str))
+            )
+        return cursor.rowcount == 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._connection.execute("DELETE FROM records WHERE key = ?", (key,))
+
+
+class DynamoDBBackend:
+    """
+    records stored in a dynamodb table with a string partition key named "key"
+    :param endpoint_url: endpoint of a local stand-in of dynamodb, ej. http://localhost:8000 for DynamoDB Local
+    """
+
+    def __init__(self, table: str, endpoint_url: str = None):
+        import boto3
+
+        self.table = boto3.resource("dynamodb", endpoint_url=endpoint_url).Table(table)
+
+    def get(self, key: str) -> Optional[dict]:
+        item = self.table.get_item(Key={"key": key}).get("Item")
+        return json.loads(item["record"]) if item else None
+
+    def set(self, key: str, record: dict):
+        self.table.put_item(Item={"key": key, "record": json.dumps(record, default=str)})
+
+    def add(self, key: str, record: dict) -> bool:
+        try:
+            self.table.put_item(
+                Item={"key": key, "record": json.dumps(record, default=str)},
+                ConditionExpression="attribute_not_exists(#key)",
+                ExpressionAttributeNames={"#key": "key"},
+            )
+            return True
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+
+    def delete(self, key: str):
+        self.table.delete_item(Key={"key": key})
+
+
+def build_backend(name: str, directory: str = None, table: str = None, path: str = None, endpoint_url: str = None):
+    """
+    :param name: memory, file, sqlite, dynamodb or none
+    :param path: database of the sqlite backend
+    :param endpoint_url: endpoint of the dynamodb backend, the default one of aws when it is None
+    :return: the persistent backend or None when the cache lives only in the process
+    """
+    if name == "file":
+        return FileBackend(directory)
+    if name == "sqlite":
+        return SQLiteBackend(path)
+    if name == "dynamodb":
+        return DynamoDBBackend(table, endpoint_url)
+    if name == "memory":
+        return MemoryBackend()
+    return None
+
+
+class TTLCache:
+    """
+    two tier cache: entries are served from the process while they are fresh, after the ttl they are still
+    served for stale_ttl seconds while a background thread refreshes them. The persistent backend keeps the
+    last known value for the next process: the file and sqlite backends live in /tmp and only serve the same
+    container, the dynamodb backend is shared and lets a new container start without calling the api. With
+    max_entries the process tier evicts the least recently used keys
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        stale_ttl: float = 0,
+        backend=None,
+        max_entries: int = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.backend = backend
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "changes": 0,
+            "evictions": 0,
+        }
+
+    def _backend_key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    def _get_entry(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if self.max_entries is not None:
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+        elif self.backend is not None:
+            record = self.backend.get(self._backend_key(key))
+            if record is not None:
+                entry = CacheEntry(record["value"], record["version"], record["stored_at"])
+                with self._lock:
+                    self._store(key, entry)
+        return entry
+
+    def _store(self, key: str, entry: CacheEntry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if self.max_entries is not None:
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _lookup(self, key: str):
+        """
+        :return: the entry and whether it is stale, or None when it must be loaded
+        """
+        entry = self._get_entry(key)
+        if entry is not None:
+            age = self.clock() - entry.stored_at
+            if age < self.ttl:
+                self._stats["hits"] += 1
+                return entry, False
+            if age < self.ttl + self.stale_ttl:
+                self._stats["stale_hits"] += 1
+                return entry, True
+        self._stats["misses"] += 1
+        return None
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> Any:
+        """
+        :param key: key of the value
+        :param loader: function that obtains the value from the api
+        :return: the cached value, the loader is only called on a miss or in background once it expires
+        """
+        found = self._lookup(key)
+        if found is None:
+            return self.refresh(key, loader).value
+        entry, stale = found
+        if stale:
+            self._refresh_in_background(key, loader)
+        return entry.value
+
+    async def get_or_load_async(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        same as get_or_load for loaders that are coroutines, the stale refresh runs as a task of the loop
+        :param key: key of the value
+        :param loader: coroutine function that obtains the value from the api
+        :return: the cached value
+        """
+        found = self._lookup(key)
+        if found is None:
+            value = await loader()
+            return self.refresh(key, lambda: value).value
+        entry, stale = found
+        if stale:
+            self._refresh_in_task(key, loader)
+        return entry.value
+
+    def refresh(self, key: str, loader: Callable[[], Any]) -> CacheEntry:
+        value = loader()
+        entry = CacheEntry(value, value_version(value), self.clock())
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None and previous.version != entry.version:
+                self._stats["changes"] += 1
+            self._store(key, entry)
+            self._stats["refreshes"] += 1
+        if self.backend is not None:
+            self.backend.set(self._backend_key(key), entry._asdict())
+        return entry
+
+    def _refresh_in_background(self, key: str, loader: Callable[[], Any]):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def target():
+            try:
+                self.refresh(key, loader)
+            except Exception:
+                # the stale value keeps being served until a refresh succeeds
+                self._stats["refresh_errors"] += 1
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=target, daemon=True).start()
+
+    def _refresh_in_task(self, key: str, loader: Callable[[], Awaitable[Any]]):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        async def target():
+            try:
+                value = await loader()
+                self.refresh(key, lambda: value)
+            except Exception:
+                self._stats["refresh_errors"] += 1
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        # only the async path reaches this point, asyncio is not imported by the synchronous lambda
+        import asyncio
+
+        # the loop keeps only weak references to its tasks
+        task = asyncio.ensure_future(target())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def version(self, key: str) -> Optional[str]:
+        entry = self._get_entry(key)
+        return entry.version if entry is not None else None
+
+    def invalidate(self, key: str = None):
+        """
+        :param key: key to remove, every key of the process tier when it is None
+        """
+        with self._lock:
+            keys = [key] if key is not None else list(self._entries)
+            for item in keys:
+                self._entries.pop(item, None)
+                if self.backend is not None:
+                    self.backend.delete(self._backend_key(item))
+
+    def stats(self) -> dict:
+        return {**self._stats, "size": len(self._entries)}
@@ -0,0 +1,101 @@
+POST_CLIENTE_CATALOGS = {
+    "tipoDocumento": "listTipoDocumento",
+    "ciudadResidencia": "listCiudadResidencia",
+    "ocupacion": "listOcupacionPrincipal",
+    "tipoContrato": "listTipoContrato",
+    "tipoProducto": "listTipoProducto",
+    "estadoCivil": "listEstadoCivil",
+    "sexo": ("listSexo", "listGenero"),
+}
+
+CODEUDOR_CATALOGS = {
+    "tipoDocumento": "listTipoDocumento",
+    "ciudadResidencia": "listCiudadResidencia",
+    "ocupacion": "listOcupacionCodeudor",
+}
+
+
+def catalog_values(list_selection: dict) -> dict:
+    """
+    :param list_selection: response of get_list_selection
+    :return: dictionary with the allowed values of every list
+    """
+    catalogs = {}
+    for name, catalog in (list_selection or {}).items():
+        fields = (catalog or {}).get("field") or []
+        catalogs[name] = {field.get("value") for field in fields if field}
+    return catalogs
+
+
+def catalog_errors(data: dict, catalogs: dict, fields: dict, prefix: str = "") -> list:
+    """
+    check the fields of a request against the lists of the CRM, lists missing from the catalog are not checked
+    :param data: request to check
+    :param catalogs: allowed values returned by catalog_values
+    :param fields: list that holds the allowed values of every field, or a tuple of lists when the name
+                   changes between environments
+    :param prefix: prefix of the field names in the messages
+    :return: list with a message for every value that is not allowed
+    """
+    errors = []
+    for field, list_names in fields.items():
+        if isinstance(list_names, str):
+            list_names = (list_names,)
+        allowed = next((catalogs[name] for name in list_names if catalogs.get(name)), None)
+        value = data.get(field)
+        if not allowed or value is None:
+            continue
+        if str(value) not in allowed:
+            errors.append(f"{prefix}{field}: El valor '{value}' no es válido.")
+    return errors
+
+
+def post_cliente_catalog_errors(data: dict, list_selection: dict) -> list:
+    """
+    :param data: request of postCliente
+    :param list_selection: response of get_list_selection
+    :return: list with a message for every value that is not in the lists of the CRM
+    """
+    catalogs = catalog_values(list_selection)
+    errors = catalog_errors(data, catalogs, POST_CLIENTE_CATALOGS)
+    codeudores = data.get("codeudor") or []
+    if isinstance(codeudores, dict):
+        codeudores = [codeudores]
+    for codeudor in codeudores:
+        errors += catalog_errors(codeudor, catalogs, CODEUDOR_CATALOGS, prefix="codeudor.")
+    return errors
+
+
+FILING_CATALOGS = {
+    "nacionalidad": "listNacionalidad",
+    "nivelEducacion": "listNivelEducacion",
+    "estrato": "listEstrato",
+    "tipoViviendaResidencia": "listTipoViviendaResidencia",
+}
+
+HOUSE_CATALOGS = {
+    "tipoVivienda": "listTipoViviendaInmueble",
+    "tipoInmueble": "listTipoInmueble",
+    "destinoInmueble": "listDestinoInmueble",
+    "constructora": "listConstructoras",
+    "tipoParqueadero": "listTipoParqueadero",
+    "modalidadCredito": "listModalidadCredito",
+}
+
+REFERENCE_CATALOGS = {
+    "referenciaPersonal": {"parentesco": "listParentescoPersonal"},
+    "referenciaFamiliar": {"parentesco": "listParentescoFamiliar"},
+}
+
+
+def filing_catalog_errors(data: dict, catalogs: dict) -> list:
+    """
+    :param data: request of postClienteRadicacion
+    :param catalogs: allowed values returned by catalog_values
+    :return: list with a message for every value that is not in the lists of the CRM
+    """
+    errors = catalog_errors(data, catalogs, FILING_CATALOGS)
+    errors += catalog_errors(data.get("vivienda") or {}, catalogs, HOUSE_CATALOGS, prefix="vivienda.")
+    for reference, fields in REFERENCE_CATALOGS.items():
+        errors += catalog_errors(data.get(reference) or {}, catalogs, fields, prefix=f"{reference}.")
+    return errors
@@ -0,0 +1,61 @@
+from typing import NamedTuple, Optional
+
+from lxml import etree
+from lxml.etree import _Element
+from zeep.exceptions import Fault
+
+from lib.parsers import NAMESPACES, RESPONSE_NS
+from lib.settings import UNDEFINED_ERROR
+
+_FAULT = etree.XPath("/soapenv:Envelope/soapenv:Body/soapenv:Fault", namespaces=NAMESPACES)
+_FAULT_STRING = "faultstring"
+_STATUS_CODE = etree.QName(RESPONSE_NS, "code").text
+_STATUS_DESCRIPTION = etree.QName(RESPONSE_NS, "description").text
+
+
+class SoapFault(NamedTuple):
+    faultstring: str
+    code: Optional[str] = None
+    description: Optional[str] = None
+
+    @property
+    def message(self) -> str:
+        if self.description is None:
+            return self.faultstring
+        return f"{self.faultstring}. {self.description}"
+
+
+def _decode(element: _Element, faultstring: Optional[str] = None) -> SoapFault:
+    code = description = None
+    if element is not None:
+        for child in element.iter():
+            if child.tag == _FAULT_STRING and faultstring is None:
+                faultstring = child.text
+            elif child.tag == _STATUS_CODE:
+                code = child.text
+            elif child.tag == _STATUS_DESCRIPTION:
+                description = child.text
+    return SoapFault(faultstring or UNDEFINED_ERROR, code, description)
+
+
+def decode_fault(envelope: _Element) -> Optional[SoapFault]:
+    """
+    read the fault of a response envelope, the same for every operation of the api
+    :param envelope: envelope received from the api
+    :return: the decoded fault or None if the response is not a fault
+    """
+    if envelope is None:
+        return None
+    faults = _FAULT(envelope)
+    if not faults:
+        return None
+    return _decode(faults[0])
+
+
+def decode_fault_error(error: Fault) -> SoapFault:
+    """
+    read the service status of a fault raised by zeep
+    :param error: instance of the generated error
+    :return: the decoded fault
+    """
+    return _decode(error.detail, faultstring=error.message)
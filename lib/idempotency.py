@@ -0,0 +1,193 @@
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+IN_FLIGHT = "in_flight"
+COMPLETED = "completed"
+
+
+class IdempotencyError(Exception):
+    pass
+
+
+class RequestInFlightError(IdempotencyError):
+    def __init__(self):
+        super().__init__("La misma solicitud ya está en curso, consulte de nuevo en unos segundos")
+
+
+class IdempotencyConflictError(IdempotencyError):
+    def __init__(self):
+        super().__init__("La clave de la solicitud ya fue usada con otros datos")
+
+
+def _is_error_result(result: Any) -> bool:
+    return isinstance(result, dict) and result.get("error") is True
+
+
+def _is_replayable(result: Any) -> bool:
+    return not _is_error_result(result)
+
+
+class IdempotencyStore:
+    """
+    records the submissions of the operations that must not be repeated in credifamilia. The first call with a key
+    runs and stores its result, the repeated calls get the stored result back or wait for the call in flight.
+    Errors, and the results that replayable rejects, are not stored: the key is released so the caller can try again
+    :param name: prefix of the keys inside the backend
+    :param backend: store with get, set, add and delete (see lib.cache), None disables the store
+    :param ttl: seconds a completed result is answered to the repeated calls
+    :param in_flight_timeout: seconds after which a call in flight is considered abandoned (ej. the lambda was
+    stopped before storing the result) and a new call can take its key
+    :param wait_timeout: seconds a repeated call waits for the call in flight
+    :param poll_interval: seconds between the checks of a waiting call
+    """
+
+    def __init__(
+        self,
+        name: str,
+        backend=None,
+        ttl: float = 86400,
+        in_flight_timeout: float = 60,
+        wait_timeout: float = 20,
+        poll_interval: float = 0.1,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.name = name
+        self.backend = backend
+        self.ttl = ttl
+        self.in_flight_timeout = in_flight_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "replays": 0, "waits": 0, "takeovers": 0, "conflicts": 0, "released": 0}
+
+    def _backend_key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _expired(self, record: dict) -> bool:
+        age = self.clock() - record["updated_at"]
+        return age >= (self.ttl if record["state"] == COMPLETED else self.in_flight_timeout)
+
+    def _claim(self, key: str, fingerprint: str) -> Optional[dict]:
+        """
+        :return: None when this call owns the key, otherwise the record of the previous call
+        """
+        record = {"state": IN_FLIGHT, "fingerprint": fingerprint, "updated_at": self.clock()}
+        while True:
+            if self.backend.add(self._backend_key(key), record):
+                return None
+            found = self.backend.get(self._backend_key(key))
+            if found is None:
+                # released between add and get
+                continue
+            if self._expired(found):
+                self.backend.set(self._backend_key(key), record)
+                self._count("takeovers")
+                return None
+            if found["fingerprint"] != fingerprint:
+                self._count("conflicts")
+                raise IdempotencyConflictError()
+            return found
+
+    def _complete(self, key: str, fingerprint: str, result: Any, replayable: Callable[[Any], bool]):
+        if not replayable(result):
+            self._release(key)
+            return
+        if isinstance(result, dict):
+            # the timings belong to the invocation that made the call
+            result = {name: value for name, value in result.items() if name != "timings"}
+        record = {"state": COMPLETED, "fingerprint": fingerprint, "updated_at": self.clock(), "result": result}
+        self.backend.set(self._backend_key(key), record)
+
+    def _release(self, key: str):
+        self.backend.delete(self._backend_key(key))
+        self._count("released")
+
+    def run(
+        self,
+        key: Optional[str],
+        fingerprint: str,
+        function: Callable[[], Any],
+        replayable: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """
+        :param key: identifier of the submission, without key the function just runs
+        :param fingerprint: hash of the data, the same key with other data is a conflict
+        :param function: makes the submission
+        :param replayable: True for the results that are answered to the repeated calls, by default the ones that
+        are not errors
+        :return: the result of the function or the one stored by a previous call with the same key
+        """
+        if self.backend is None or not key:
+            return function()
+        self._count("calls")
+        deadline = self.clock() + self.wait_timeout
+        waited = False
+        while True:
+            found = self._claim(key, fingerprint)
+            if found is None:
+                break
+            if found["state"] == COMPLETED:
+                self._count("replays")
+                return found["result"]
+            if self.clock() >= deadline:
+                raise RequestInFlightError()
+            if not waited:
+                self._count("waits")
+                waited = True
+            time.sleep(self.poll_interval)
+
+        try:
+            result = function()
+        except BaseException:
+            self._release(key)
+            raise
+        self._complete(key, fingerprint, result, replayable or _is_replayable)
+        return result
+
+    async def run_async(
+        self,
+        key: Optional[str],
+        fingerprint: str,
+        function: Callable[[], Awaitable],
+        replayable: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """
+        async version of run, function returns an awaitable
+        """
+        import asyncio
+
+        if self.backend is None or not key:
+            return await function()
+        self._count("calls")
+        deadline = self.clock() + self.wait_timeout
+        waited = False
+        while True:
+            found = self._claim(key, fingerprint)
+            if found is None:
+                break
+            if found["state"] == COMPLETED:
+                self._count("replays")
+                return found["result"]
+            if self.clock() >= deadline:
+                raise RequestInFlightError()
+            if not waited:
+                self._count("waits")
+                waited = True
+            await asyncio.sleep(self.poll_interval)
+
+        try:
+            result = await function()
+        except BaseException:
+            self._release(key)
+            raise
+        self._complete(key, fingerprint, result, replayable or _is_replayable)
+        return result
+
+    def stats(self) -> dict:
+        return dict(self._stats)
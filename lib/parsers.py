@@ -0,0 +1,104 @@
+from lxml import etree
+from lxml.etree import _Element
+
+SOAP_ENV_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+SERVICE_NS = "http://web.proptech.credifamilia.com"
+RESPONSE_NS = "http://response.web.proptech.credifamilia.com/xsd"
+MODEL_NS = "http://model.web.proptech.credifamilia.com/xsd"
+
+NAMESPACES = {"soapenv": SOAP_ENV_NS, "ns": SERVICE_NS, "ax22": RESPONSE_NS, "ax28": MODEL_NS}
+
+_PREAPROBADO_RETURN = etree.XPath(
+    "/soapenv:Envelope/soapenv:Body/ns:getPreaprobadoResponse/ns:return", namespaces=NAMESPACES
+)
+_CARTA_PREAPROBADO = etree.QName(RESPONSE_NS, "cartaPreaprobado").text
+_RESULTADO_CLIENTE = etree.QName(RESPONSE_NS, "resultadoCliente").text
+_DETALLE = etree.QName(MODEL_NS, "detalle").text
+
+
+def _prefixed_name(name: str, nsmap: dict) -> str:
+    """
+    translate a name in clark notation to the prefixed name used in the document
+    :param name: tag or attribute name, ej. {http://www.w3.org/2001/XMLSchema-instance}type
+    :param nsmap: namespaces in scope of the element
+    :return: prefixed name, ej. xsi:type
+    """
+    if name[0] != "{":
+        return name
+    uri, local_name = name[1:].split("}", 1)
+    for prefix, namespace in nsmap.items():
+        if namespace == uri and prefix is not None:
+            return f"{prefix}:{local_name}"
+    return local_name
+
+
+def _tag_name(element: _Element) -> str:
+    tag = element.tag
+    if tag[0] == "{":
+        tag = tag[tag.index("}") + 1 :]
+    return tag if element.prefix is None else f"{element.prefix}:{tag}"
+
+
+def element_to_dict(element: _Element, skip: str = None):
+    """
+    convert an element to the same structure xmltodict builds from its serialized form, prefixes are kept
+    as they come in the document
+    :param element: element to convert
+    :param skip: tag in clark notation of a child that must be left out
+    :return: text of the element, None when empty or a dictionary with its attributes and children
+    """
+    result = {}
+    nsmap = element.nsmap
+    parent = element.getparent()
+    parent_nsmap = parent.nsmap if parent is not None else {}
+    for prefix, namespace in nsmap.items():
+        if parent_nsmap.get(prefix) != namespace:
+            result["@xmlns:" + prefix if prefix else "@xmlns"] = namespace
+    for name, value in element.attrib.items():
+        result["@" + _prefixed_name(name, nsmap)] = value
+
+    skipped = False
+    for child in element:
+        if child.tag == skip:
+            skipped = True
+            continue
+        if not isinstance(child.tag, str):
+            continue
+        key = _tag_name(child)
+        value = element_to_dict(child)
+        if key not in result:
+            result[key] = value
+        elif isinstance(result[key], list):
+            result[key].append(value)
+        else:
+            result[key] = [result[key], value]
+
+    text = element.text.strip() if element.text else None
+    if not result and not skipped:
+        return text or None
+    if text:
+        result["#text"] = text
+    return result
+
+
+def extract_preaprobado(envelope: _Element) -> dict:
+    """
+    take the result of the prevalidator straight from the envelope of getPreaprobado
+    :param envelope: envelope received from the api
+    :return: dictionary with the client result, its detail and the pre-approval letter
+    """
+    result_client = result_client_detail = preaproved_letter = None
+    for result_return in _PREAPROBADO_RETURN(envelope):
+        for child in result_return:
+            if child.tag == _RESULTADO_CLIENTE:
+                result_client = element_to_dict(child, skip=_DETALLE)
+                detail = child.find(_DETALLE)
+                result_client_detail = element_to_dict(detail) if detail is not None else None
+            elif child.tag == _CARTA_PREAPROBADO:
+                preaproved_letter = element_to_dict(child)
+
+    return {
+        "result_client": result_client,
+        "result_client_detail": result_client_detail,
+        "preaproved_letter": preaproved_letter,
+    }
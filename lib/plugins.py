@@ -0,0 +1,39 @@
+import time
+from contextvars import ContextVar
+
+from zeep import Plugin
+
+from lib.timing import current_timings, record
+
+received_envelope = ContextVar("received_envelope", default=None)
+_exchange_started = ContextVar("exchange_started", default=None)
+
+
+class EnvelopeCapturePlugin(Plugin):
+    """
+    keep the envelope received by the current call in a context variable, every thread and asyncio task
+    sees only the envelope of its own call
+    """
+
+    def ingress(self, envelope, http_headers, operation):
+        received_envelope.set(envelope)
+        return envelope, http_headers
+
+
+class TimingPlugin(Plugin):
+    """
+    measure the exchange of every call, from the envelope leaving zeep (before it is signed) until the response
+    arrives, the stage is named exchange
+    """
+
+    def egress(self, envelope, http_headers, operation, binding_options):
+        if current_timings() is not None:
+            _exchange_started.set(time.perf_counter())
+        return envelope, http_headers
+
+    def ingress(self, envelope, http_headers, operation):
+        started = _exchange_started.get()
+        if started is not None:
+            record("exchange", (time.perf_counter() - started) * 1000)
+            _exchange_started.set(None)
+        return envelope, http_headers
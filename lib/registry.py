@@ -0,0 +1,141 @@
+import importlib
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+
+class Operation(NamedTuple):
+    """
+    service of the lambda and what the machinery around it needs to know about it
+    :param name: value of the field service of the events
+    :param handler: function called with the client and the data of the event
+    :param soap_operation: main operation of credifamilia behind the service, the timeout applies to it
+    :param input_model: "module:attribute" of the callable that validates the data and builds the request of the
+    handler, it is imported on the first use
+    :param cache: TTLCache where the responses are kept
+    :param cache_key: key of the data inside the cache, the data without a key (None) is not cached
+    :param idempotent: it can be repeated without side effects in credifamilia
+    :param timeout: read timeout of the soap operation in seconds, SOAP_OPERATION_TIMEOUTS takes precedence
+    :param concurrency: calls of the service in flight inside a batch
+    :param needs_client: False when the handler does not call credifamilia, the client is not built for it
+    :param idempotency_key: key of the submission inside the data, the repeated submissions get the result of the
+    first one (see lib.idempotency)
+    :param replayable: tells the results of the submission that are stored for the repeated ones, by default every
+    result that is not an error
+    """
+
+    name: str
+    handler: Callable[[Any, Any], Any]
+    soap_operation: Optional[str] = None
+    input_model: Optional[str] = None
+    cache: Any = None
+    cache_key: Optional[Callable[[Any], Optional[str]]] = None
+    idempotent: bool = False
+    timeout: Optional[float] = None
+    concurrency: Optional[int] = None
+    needs_client: bool = True
+    idempotency_key: Optional[Callable[[Any], Optional[str]]] = None
+    replayable: Optional[Callable[[Any], bool]] = None
+
+    @property
+    def cacheable(self) -> bool:
+        return self.cache is not None
+
+    @property
+    def ttl(self) -> Optional[float]:
+        return self.cache.ttl if self.cache is not None else None
+
+    def validate(self, data: Any) -> Any:
+        """
+        :return: the data converted by the input model, the same data when the operation has none
+        """
+        if self.input_model is None:
+            return data
+        return load_attribute(self.input_model)(data)
+
+
+_attributes = {}
+
+
+def load_attribute(path: str) -> Any:
+    """
+    :param path: "module:attribute.attribute", ej. factories:FilingFactory.get_request
+    """
+    attribute = _attributes.get(path)
+    if attribute is None:
+        module, _, name = path.partition(":")
+        attribute = importlib.import_module(module)
+        for part in name.split("."):
+            attribute = getattr(attribute, part)
+        _attributes[path] = attribute
+    return attribute
+
+
+class OperationRegistry:
+    """
+    operations of the lambda by name, the handlers dispatch the events with it
+    """
+
+    def __init__(self, operations: Dict[str, Operation] = None):
+        self._operations = dict(operations or {})
+
+    def register(self, operation: Operation) -> Operation:
+        if operation.name in self._operations:
+            raise ValueError(f"Operation {operation.name} is already registered")
+        self._operations[operation.name] = operation
+        return operation
+
+    def get(self, name: str) -> Optional[Operation]:
+        return self._operations.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._operations
+
+    def __iter__(self):
+        return iter(self._operations.values())
+
+    def __len__(self) -> int:
+        return len(self._operations)
+
+    def with_handlers(self, handlers: Dict[str, Callable]) -> "OperationRegistry":
+        """
+        same operations and metadata with other handlers, ej. the async versions of the services
+        :param handlers: handler of every operation to replace by name
+        """
+        return OperationRegistry(
+            {
+                name: operation._replace(handler=handlers.get(name, operation.handler))
+                for name, operation in self._operations.items()
+            }
+        )
+
+    def idempotent_soap_operations(self) -> set:
+        """
+        :return: soap operations of the idempotent services, they can be retried
+        """
+        return {operation.soap_operation for operation in self if operation.idempotent and operation.soap_operation}
+
+    def timeouts(self) -> dict:
+        """
+        :return: read timeout of the soap operations that declare one
+        """
+        return {
+            operation.soap_operation: operation.timeout
+            for operation in self
+            if operation.soap_operation and operation.timeout is not None
+        }
+
+
+# operations of the lambda, service.py registers them and the transports read their timeouts
+operations = OperationRegistry()
+
+
+def registered_operations(registry: OperationRegistry = None) -> OperationRegistry:
+    """
+    :param registry: registry given by the caller, by default the one filled by service.py
+    :return: the registry, the timeouts and the retries of the soap operations are read from it
+    :raise RuntimeError: the registry is empty, without it the operations would silently lose their timeouts and
+    retries, ej. the caller creates a client without importing service
+    """
+    registry = operations if registry is None else registry
+    if not len(registry):
+        raise RuntimeError("No operations registered, import service or pass the registry of the operations")
+    return registry
@@ -0,0 +1,239 @@
+import random
+import sys
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+from requests.exceptions import ConnectionError, Timeout
+from zeep.exceptions import Fault, TransportError
+
+from lib.registry import OperationRegistry, registered_operations
+from lib.settings import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT,
+    SOAP_RETRY_ATTEMPTS,
+    SOAP_RETRY_BASE_DELAY,
+    SOAP_RETRY_MAX_DELAY,
+)
+
+
+class CircuitOpenError(Exception):
+    """
+    credifamilia failed too many times in a row, the calls are rejected without reaching it
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Credifamilia no disponible, se reintentará en {retry_after:.0f} segundos")
+        self.retry_after = retry_after
+
+
+def is_transport_error(error: Exception) -> bool:
+    """
+    errors where credifamilia did not answer or answered an http error instead of a soap response, a Fault is an
+    answer and does not count
+    """
+    if isinstance(error, (ConnectionError, Timeout)):
+        return True
+    if isinstance(error, TransportError):
+        return error.status_code >= 500 or error.status_code == 429
+    # httpx is only imported by the async transport
+    httpx = sys.modules.get("httpx")
+    return httpx is not None and isinstance(error, httpx.TransportError)
+
+
+def backoff(
+    attempt: int, base_delay: float = SOAP_RETRY_BASE_DELAY, max_delay: float = SOAP_RETRY_MAX_DELAY
+) -> float:
+    """
+    exponential backoff with full jitter, so the retries of concurrent calls do not hit credifamilia together
+    :param attempt: number of the retry, starting at 0
+    :return: seconds to wait before the retry
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2**attempt))
+
+
+class CircuitBreaker:
+    """
+    after failure_threshold transport errors in a row the circuit opens and the calls fail fast for reset_timeout
+    seconds, then a single call is let through and its result closes or opens the circuit again. It lives in the
+    module, so the state is shared by the warm invocations of the container.
+    before_call tells the call whether it is the trial, the call hands it back to record_success, record_failure or
+    release so only the trial frees the half open circuit for the next one
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "failures": 0, "retries": 0, "trips": 0, "rejected": 0}
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self.clock() - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def before_call(self) -> bool:
+        """
+        :return: True when the call is the trial of the half open circuit
+        :raise CircuitOpenError: while the circuit is open, or half open with its trial call in flight
+        """
+        with self._lock:
+            state = self.state
+            trial = state == "half_open" and not self._trial
+            if trial:
+                self._trial = True
+            elif state != "closed":
+                self._stats["rejected"] += 1
+                retry_after = max(self._opened_at + self.reset_timeout - self.clock(), 0)
+                raise CircuitOpenError(retry_after)
+            self._stats["calls"] += 1
+            return trial
+
+    def record_success(self, trial: bool = False):
+        """
+        :param trial: what before_call returned to the call
+        """
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            if trial:
+                self._trial = False
+
+    def record_failure(self, trial: bool = False):
+        """
+        :param trial: what before_call returned to the call, a failed trial opens the circuit again
+        """
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            if trial or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._stats["trips"] += 1
+                self._opened_at = self.clock()
+            if trial:
+                self._trial = False
+
+    def record_retry(self):
+        with self._lock:
+            self._stats["retries"] += 1
+
+    def release(self, trial: bool = False):
+        """
+        end a call without judging the health of credifamilia
+        :param trial: what before_call returned to the call
+        """
+        if trial:
+            with self._lock:
+                self._trial = False
+
+    def reset(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def stats(self) -> dict:
+        return {**self._stats, "state": self.state, "consecutive_failures": self._failures}
+
+
+# breaker of the calls to credifamilia, shared by every invocation of the container
+circuit_breaker = CircuitBreaker()
+
+
+def retry_attempts(operation: str, registry: OperationRegistry = None) -> int:
+    """
+    :param operation: name of the soap operation
+    :param registry: operations of the lambda, see registered_operations
+    :return: retries allowed, only the operations of the idempotent services are retried
+    """
+    return SOAP_RETRY_ATTEMPTS if operation in registered_operations(registry).idempotent_soap_operations() else 0
+
+
+def call_with_resilience(
+    operation: str,
+    call: Callable,
+    breaker: Optional[CircuitBreaker] = None,
+    registry: Optional[OperationRegistry] = None,
+):
+    """
+    make a call to credifamilia through the circuit breaker, retrying the transport errors of idempotent operations
+    :param operation: name of the soap operation
+    :param call: function that makes the call
+    :param registry: operations of the lambda, it tells the idempotent ones
+    :return: the result of the call
+    """
+    breaker = breaker or circuit_breaker
+    attempts = retry_attempts(operation, registry)
+    for attempt in range(attempts + 1):
+        trial = breaker.before_call()
+        try:
+            result = call()
+        except Exception as error:
+            if not is_transport_error(error):
+                # a fault is an answer of credifamilia, other errors say nothing about its health
+                if isinstance(error, Fault):
+                    breaker.record_success(trial)
+                else:
+                    breaker.release(trial)
+                raise
+            breaker.record_failure(trial)
+            if attempt == attempts:
+                raise
+            breaker.record_retry()
+            time.sleep(backoff(attempt))
+        except BaseException:
+            breaker.release(trial)
+            raise
+        else:
+            breaker.record_success(trial)
+            return result
+
+
+async def async_call_with_resilience(
+    operation: str,
+    call: Callable[[], Awaitable],
+    breaker: Optional[CircuitBreaker] = None,
+    registry: Optional[OperationRegistry] = None,
+):
+    """
+    async version of call_with_resilience
+    """
+    import asyncio
+
+    breaker = breaker or circuit_breaker
+    attempts = retry_attempts(operation, registry)
+    for attempt in range(attempts + 1):
+        trial = breaker.before_call()
+        try:
+            result = await call()
+        except Exception as error:
+            if not is_transport_error(error):
+                # a fault is an answer of credifamilia, other errors say nothing about its health
+                if isinstance(error, Fault):
+                    breaker.record_success(trial)
+                else:
+                    breaker.release(trial)
+                raise
+            breaker.record_failure(trial)
+            if attempt == attempts:
+                raise
+            breaker.record_retry()
+            await asyncio.sleep(backoff(attempt))
+        except BaseException:
+            # ej. the task was cancelled while the trial was in flight
+            breaker.release(trial)
+            raise
+        else:
+            breaker.record_success(trial)
+            return result
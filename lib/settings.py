@@ -1,6 +1,4 @@
 import os
-import sentry_sdk
-from sentry_sdk.integrations.aws_lambda import AwsLambdaIntegration
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ENV = os.getenv("APP_ENV", default="DEV")
@@ -10,12 +8,78 @@ if ENV == "PRD":
 else:
     WSDL = "lib/wsdl/credifamilia-dev.wsdl"
 
+KEY_FILE = os.path.join(BASE_DIR, "lib/certs_lqn/key.pem")
+CERT_FILE = os.path.join(BASE_DIR, "lib/certs_lqn/certificate.pem")
+
 UNDEFINED_ERROR = "Error indefinido."
+CLIENT_CREATED = "Cliente creado correctamente"
+
+# Transport towards credifamilia, timeouts in seconds
+CREDIFAMILIA_ENDPOINT = os.getenv("CREDIFAMILIA_ENDPOINT")
+SOAP_POOL_CONNECTIONS = int(os.getenv("SOAP_POOL_CONNECTIONS", default="1"))
+SOAP_POOL_MAXSIZE = int(os.getenv("SOAP_POOL_MAXSIZE", default="10"))
+SOAP_CONNECT_TIMEOUT = float(os.getenv("SOAP_CONNECT_TIMEOUT", default="3.05"))
+SOAP_READ_TIMEOUT = float(os.getenv("SOAP_READ_TIMEOUT", default="30"))
+SOAP_OPERATION_TIMEOUTS = os.getenv("SOAP_OPERATION_TIMEOUTS", default="")
+
+# Calls to credifamilia: retries of the idempotent operations after transport errors, with exponential backoff
+# and jitter in seconds, and a circuit breaker that fails fast for CIRCUIT_RESET_TIMEOUT seconds after
+# CIRCUIT_FAILURE_THRESHOLD transport errors in a row
+SOAP_RETRY_ATTEMPTS = int(os.getenv("SOAP_RETRY_ATTEMPTS", default="2"))
+SOAP_RETRY_BASE_DELAY = float(os.getenv("SOAP_RETRY_BASE_DELAY", default="0.2"))
+SOAP_RETRY_MAX_DELAY = float(os.getenv("SOAP_RETRY_MAX_DELAY", default="2"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", default="5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", default="30"))
+
+# Requests checked against the schema of the WSDL before they are signed and sent, comma separated operations,
+# empty disables the check
+SOAP_PREFLIGHT_OPERATIONS = {
+    operation.strip()
+    for operation in os.getenv(
+        "SOAP_PREFLIGHT_OPERATIONS", default="postCliente,postExisteCliente,postClienteRadicacion"
+    ).split(",")
+    if operation.strip()
+}
 
+# create_client: "concurrent" checks the catalogs while postExisteCliente is in flight, "serial" one after another
+CREATE_CLIENT_PIPELINE = os.getenv("CREATE_CLIENT_PIPELINE", default="concurrent")
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", default="4"))
 
-sentry_sdk.init(
-    dsn="https://82569d4f1ab94d708d8d51bb89b99618@o412045.ingest.sentry.io/5288222",
-    integrations=[AwsLambdaIntegration()],
-    traces_sample_rate=1.0,  # adjust the sample rate in production as needed
-    environment=ENV,
+# Batch events: calls in flight per batch and seconds before the pending items are reported as timed out
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", default="8"))
+BATCH_DEADLINE = float(os.getenv("BATCH_DEADLINE", default="25"))
+
+# Duration of every stage of an invocation: TIMINGS off, log (json line) or emf (CloudWatch embedded metrics).
+# With TIMINGS_IN_RESPONSE the reply messages include them in the field timings
+TIMINGS = os.getenv("TIMINGS", default="off")
+TIMINGS_IN_RESPONSE = os.getenv("TIMINGS_IN_RESPONSE", default="false").lower() == "true"
+TIMINGS_NAMESPACE = os.getenv("TIMINGS_NAMESPACE", default="lqn-soap-credifamilia")
+
+# Sentry is initialized on the first invocation. Failed invocations and the ones slower than
+# SENTRY_SLOW_THRESHOLD_MS are always traced, the rest with SENTRY_TRACES_SAMPLE_RATE. An empty dsn disables it
+SENTRY_DSN = os.getenv(
+    "SENTRY_DSN", default="https://82569d4f1ab94d708d8d51bb89b99618@o412045.ingest.sentry.io/5288222"
 )
+SENTRY_TRACES_SAMPLE_RATE = float(os.getenv("SENTRY_TRACES_SAMPLE_RATE", default="0.05"))
+SENTRY_SLOW_THRESHOLD_MS = float(os.getenv("SENTRY_SLOW_THRESHOLD_MS", default="5000"))
+SENTRY_FLUSH_TIMEOUT = float(os.getenv("SENTRY_FLUSH_TIMEOUT", default="2"))
+
+# Caches, ttl in seconds. CACHE_BACKEND: none, memory, file, sqlite or dynamodb
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", default="file")
+CACHE_DIR = os.getenv("CACHE_DIR", default="/tmp/lqn-soap-credifamilia")
+CACHE_TABLE = os.getenv("CACHE_TABLE", default="lqn-soap-credifamilia-cache")
+LIST_SELECTION_TTL = float(os.getenv("LIST_SELECTION_TTL", default="86400"))
+LIST_SELECTION_STALE_TTL = float(os.getenv("LIST_SELECTION_STALE_TTL", default="86400"))
+PROYECTOS_TTL = float(os.getenv("PROYECTOS_TTL", default="3600"))
+PROYECTOS_MAX_ENTRIES = int(os.getenv("PROYECTOS_MAX_ENTRIES", default="128"))
+
+# Submissions of create_client and post_cliente_radicacion already made, the repeated ones get the stored result.
+# IDEMPOTENCY_BACKEND: none, memory, sqlite or dynamodb (IDEMPOTENCY_ENDPOINT points it to a local stand-in), times
+# in seconds
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", default="memory")
+IDEMPOTENCY_PATH = os.getenv("IDEMPOTENCY_PATH", default=os.path.join(CACHE_DIR, "idempotency.sqlite3"))
+IDEMPOTENCY_TABLE = os.getenv("IDEMPOTENCY_TABLE", default="lqn-soap-credifamilia-idempotency")
+IDEMPOTENCY_ENDPOINT = os.getenv("IDEMPOTENCY_ENDPOINT")
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", default="86400"))
+IDEMPOTENCY_IN_FLIGHT_TIMEOUT = float(os.getenv("IDEMPOTENCY_IN_FLIGHT_TIMEOUT", default="120"))
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", default="20"))
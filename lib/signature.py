@@ -1,45 +1,100 @@
-from zeep import Client
-from zeep.wsse.signature import BinarySignature
-from zeep.wsse import utils
+import base64
+import os
+import ssl
+import threading
+from typing import Any, NamedTuple
+
+from zeep import Client, ns
+from zeep.wsse.signature import BinarySignature, _make_sign_key, _read_file, _signature_prepare
 from datetime import datetime, timedelta
 from lxml import etree
 
+from lib.timing import stage
+
+
+_KEY_IDENTIFIER = etree.QName(ns.WSSE, "KeyIdentifier")
+_KEY_IDENTIFIER_ATTRIBUTES = {
+    "EncodingType": "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-soap-message-security-1.0#Base64Binary",
+    "ValueType": "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-x509-token-profile-1.0#X509v3",
+}
+
+
+class KeyMaterial(NamedTuple):
+    signature: tuple
+    key: Any
+    token: str
+
+
+_key_materials = {}
+_key_materials_lock = threading.Lock()
+
+
+def _stat_signature(*paths) -> tuple:
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def certificate_token(cert_data: bytes) -> str:
+    """
+    :param cert_data: certificate in PEM format
+    :return: base64 of the DER certificate in a single line, the text of the KeyIdentifier
+    """
+    pem = cert_data.decode("ascii")
+    begin = pem.index(ssl.PEM_HEADER)
+    end = pem.index(ssl.PEM_FOOTER, begin) + len(ssl.PEM_FOOTER)
+    return base64.b64encode(ssl.PEM_cert_to_DER_cert(pem[begin:end])).decode("ascii")
+
+
+def load_key_material(key_file: str, certfile: str, password=None) -> KeyMaterial:
+    """
+    parse the signing key and the certificate once per container, they are loaded again only when the
+    modification time or the size of the files change
+    :param key_file: private key in PEM format
+    :param certfile: certificate in PEM format
+    :param password: password of the private key
+    :return: xmlsec key with its certificate and the token of the certificate
+    """
+    cache_key = (key_file, certfile, password)
+    signature = _stat_signature(key_file, certfile)
+    material = _key_materials.get(cache_key)
+    if material is not None and material.signature == signature:
+        return material
+
+    with _key_materials_lock:
+        material = _key_materials.get(cache_key)
+        if material is None or material.signature != signature:
+            key_data, cert_data = _read_file(key_file), _read_file(certfile)
+            key = _make_sign_key(key_data, cert_data, password)
+            material = KeyMaterial(signature, key, certificate_token(cert_data))
+            _key_materials[cache_key] = material
+        return material
+
 
 class BinarySignatureTimestamp(BinarySignature):
-    def find_by_str(self, elements: list, text: str):
-        for e in elements:
-            name = str(e)
-            if text in name:
-                return e
-            childs = e.getchildren()
-            if childs:
-                result = self.find_by_str(childs, text)
-                if result:
-                    return result
-        return None
+    def __init__(self, key_file, certfile, password=None, signature_method=None, digest_method=None):
+        # the files are read by load_key_material, shared by every client of the container
+        self.key_file = key_file
+        self.certfile = certfile
+        self.password = password
+        self.signature_method = signature_method
+        self.digest_method = digest_method
 
     def apply(self, envelope, headers):
-        super().apply(envelope, headers)
-
-        security = utils.get_security_header(envelope)
-        children = security.getchildren()
-        ref = self.find_by_str(children, "SecurityTokenReference")
-        old_key = ref.find("wsse:Reference", namespaces=utils.NSMAP)
-        ref.remove(old_key)
-        binary = security.find("wsse:BinarySecurityToken", namespaces=utils.NSMAP)
-        identifier = utils.WSSE("KeyIdentifier")
-        identifier.text = binary.text.replace("\n", "")
-        identifier.set(
-            "EncodingType",
-            "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-soap-message-security-1.0#Base64Binary",
-        )
-        identifier.set(
-            "ValueType", "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-x509-token-profile-1.0#X509v3"
-        )
-        ref.append(identifier)
-        se = security.find("wsse:BinarySecurityToken", namespaces=utils.NSMAP)
-        parent = se.getparent()
-        parent.remove(se)
+        """
+        sign the envelope and reference the certificate with a KeyIdentifier inside the SecurityTokenReference,
+        the certificate is not sent as a BinarySecurityToken
+        """
+        with stage("signature"):
+            material = load_key_material(self.key_file, self.certfile, self.password)
+            _, sec_token_ref, x509_data = _signature_prepare(
+                envelope, material.key, self.signature_method, self.digest_method
+            )
+            identifier = etree.SubElement(sec_token_ref, _KEY_IDENTIFIER, _KEY_IDENTIFIER_ATTRIBUTES)
+            identifier.text = material.token
+            x509_data.getparent().remove(x509_data)
         return envelope, headers
 
     def verify(self, envelope):
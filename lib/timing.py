@@ -0,0 +1,121 @@
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Optional
+
+from lib.settings import TIMINGS, TIMINGS_IN_RESPONSE, TIMINGS_NAMESPACE
+from lib.tracing import current_span
+
+# durations in milliseconds of the stages of the current invocation, None when they are not collected
+_timings = ContextVar("timings", default=None)
+_lock = threading.Lock()
+_NULL_STAGE = nullcontext()
+
+
+def is_enabled() -> bool:
+    return TIMINGS != "off" or TIMINGS_IN_RESPONSE
+
+
+def current_timings() -> Optional[dict]:
+    return _timings.get()
+
+
+def record(name: str, duration: float):
+    """
+    add a duration to a stage of the current invocation, the same stage can be measured several times
+    :param name: name of the stage
+    :param duration: milliseconds
+    """
+    timings = _timings.get()
+    if timings is not None:
+        with _lock:
+            timings[name] = timings.get(name, 0) + duration
+
+
+class _Stage:
+    __slots__ = ("name", "parent", "span", "token", "started")
+
+    def __init__(self, name: str, parent):
+        self.name = name
+        self.parent = parent
+        self.span = None
+
+    def __enter__(self):
+        if self.parent is not None:
+            op, _, description = self.name.partition(":")
+            self.span = self.parent.start_child(op=op, description=description or op)
+            self.token = current_span.set(self.span)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record(self.name, (time.perf_counter() - self.started) * 1000)
+        if self.span is not None:
+            if exc_type is not None:
+                self.span.set_status("internal_error")
+            self.span.finish()
+            current_span.reset(self.token)
+
+
+def stage(name: str):
+    """
+    context manager that measures a stage of the invocation and traces it as a span of sentry, without a
+    collector nor a traced invocation it does nothing
+    :param name: name of the stage, ej. signature or soap:postCliente
+    """
+    parent = current_span.get()
+    if parent is None and _timings.get() is None:
+        return _NULL_STAGE
+    return _Stage(name, parent)
+
+
+@contextmanager
+def collect():
+    """
+    collect the stages measured inside the block, the threads started with lib.utils.submit write to the
+    same collector
+    :return: dictionary with the duration of every stage or None when timings are disabled
+    """
+    if not is_enabled():
+        yield None
+        return
+    token = _timings.set({})
+    try:
+        yield _timings.get()
+    finally:
+        _timings.reset(token)
+
+
+def emit(timings: Optional[dict], service: str):
+    """
+    write the timings of an invocation to the logs, as a json line (TIMINGS=log) or in CloudWatch embedded metric
+    format (TIMINGS=emf)
+    :param timings: dictionary returned by collect
+    :param service: service of the event, it is the dimension of the metrics
+    """
+    if not timings or TIMINGS == "off":
+        return
+    values = {name: round(duration, 3) for name, duration in timings.items()}
+    if TIMINGS == "emf":
+        print(
+            json.dumps(
+                {
+                    "_aws": {
+                        "Timestamp": int(time.time() * 1000),
+                        "CloudWatchMetrics": [
+                            {
+                                "Namespace": TIMINGS_NAMESPACE,
+                                "Dimensions": [["service"]],
+                                "Metrics": [{"Name": name, "Unit": "Milliseconds"} for name in values],
+                            }
+                        ],
+                    },
+                    "service": service,
+                    **values,
+                }
+            )
+        )
+    else:
+        print(json.dumps({"message": "timings", "service": service, "timings": values}))
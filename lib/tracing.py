@@ -0,0 +1,110 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from lib.settings import (
+    ENV,
+    SENTRY_DSN,
+    SENTRY_FLUSH_TIMEOUT,
+    SENTRY_SLOW_THRESHOLD_MS,
+    SENTRY_TRACES_SAMPLE_RATE,
+)
+
+# span of sentry where the stages of the current invocation are attached, None when the call is not traced
+current_span = ContextVar("current_span", default=None)
+
+# None until the first invocation initializes the sdk, then True or False if there is no dsn
+_state = None
+
+
+def init_sentry(**options) -> bool:
+    """
+    initialize sentry on the first invocation instead of at import, so the sdk is not part of the cold start
+    :param options: extra options of sentry_sdk.init
+    :return: whether sentry is enabled
+    """
+    global _state
+    if _state is None:
+        if not SENTRY_DSN:
+            _state = False
+            return _state
+        import sentry_sdk
+
+        sentry_sdk.init(
+            dsn=SENTRY_DSN,
+            environment=ENV,
+            # every invocation starts its transaction sampled and trace() decides at the end whether it is sent,
+            # the rate 0 only keeps tracing enabled
+            traces_sample_rate=0.0,
+            auto_enabling_integrations=False,
+            **options,
+        )
+        _state = True
+    return _state
+
+
+def keep_trace(duration_ms: float, failed: bool, sample_rate: float = None) -> bool:
+    """
+    failed and slow invocations are always kept, the healthy ones with the sample rate
+    """
+    if failed or duration_ms >= SENTRY_SLOW_THRESHOLD_MS:
+        return True
+    return random.random() < (SENTRY_TRACES_SAMPLE_RATE if sample_rate is None else sample_rate)
+
+
+class Trace:
+    """
+    outcome of a traced invocation, the handler marks it as failed when it answers an error
+    """
+
+    __slots__ = ("failed",)
+
+    def __init__(self):
+        self.failed = False
+
+
+@contextmanager
+def trace(name: str, op: str = "function.aws.lambda"):
+    """
+    transaction of sentry around an invocation, the stages measured with lib.timing.stage become its spans and
+    unhandled errors are reported
+    :param name: name of the transaction, the service of the event
+    :return: the Trace of the invocation
+    """
+    outcome = Trace()
+    if not init_sentry():
+        yield outcome
+        return
+
+    import sentry_sdk
+
+    transaction = sentry_sdk.start_transaction(op=op, name=name or "handler", sampled=True)
+    token = current_span.set(transaction)
+    started = time.perf_counter()
+    try:
+        yield outcome
+    except Exception as error:
+        outcome.failed = True
+        transaction.set_status("internal_error")
+        sentry_sdk.capture_exception(error)
+        raise
+    finally:
+        current_span.reset(token)
+        transaction.sampled = keep_trace((time.perf_counter() - started) * 1000, outcome.failed)
+        if outcome.failed and transaction.status is None:
+            transaction.set_status("unknown_error")
+        transaction.finish()
+        if transaction.sampled or outcome.failed:
+            # the lambda is frozen after answering, send now what was captured
+            sentry_sdk.flush(timeout=SENTRY_FLUSH_TIMEOUT)
+
+
+def capture_message(message: str, **extra):
+    """
+    report a message to sentry, nothing is done while sentry is not initialized
+    """
+    if _state:
+        import sentry_sdk
+
+        sentry_sdk.capture_message(message, extras=extra)
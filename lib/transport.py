@@ -0,0 +1,143 @@
+from requests import Session
+from requests.adapters import HTTPAdapter
+from zeep.transports import AsyncTransport, Transport
+
+from lib.registry import OperationRegistry, registered_operations
+from lib.settings import (
+    CREDIFAMILIA_ENDPOINT,
+    SOAP_CONNECT_TIMEOUT,
+    SOAP_OPERATION_TIMEOUTS,
+    SOAP_POOL_CONNECTIONS,
+    SOAP_POOL_MAXSIZE,
+    SOAP_READ_TIMEOUT,
+)
+
+
+def parse_operation_timeouts(value: str) -> dict:
+    """
+    :param value: read timeouts per operation, ej. "getListSelection=60,postCliente=45"
+    :return: dictionary with the read timeout of every operation
+    """
+    timeouts = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        operation, timeout = item.split("=", 1)
+        timeouts[operation.strip()] = float(timeout)
+    return timeouts
+
+
+def resolve_operation_timeouts(operation_timeouts: dict = None, registry: OperationRegistry = None) -> dict:
+    """
+    :param operation_timeouts: read timeouts given to the transport, they take precedence
+    :param registry: operations of the lambda, see registered_operations
+    :return: read timeouts declared by the registered operations, replaced by SOAP_OPERATION_TIMEOUTS and then by
+    operation_timeouts
+    """
+    return {
+        **registered_operations(registry).timeouts(),
+        **parse_operation_timeouts(SOAP_OPERATION_TIMEOUTS),
+        **(operation_timeouts or {}),
+    }
+
+
+def build_session(pool_connections: int = SOAP_POOL_CONNECTIONS, pool_maxsize: int = SOAP_POOL_MAXSIZE) -> Session:
+    """
+    session with a sized pool of keep-alive connections, it lives as long as the client that owns it so warm
+    invocations reuse the connections already opened to credifamilia
+    :param pool_connections: number of hosts with their own pool
+    :param pool_maxsize: connections kept alive per host
+    :return: session ready to be used by the transport
+    """
+    session = Session()
+    session.verify = False
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def soap_operation(headers: dict) -> str:
+    """
+    :param headers: headers of the request, zeep sends the operation in the SOAPAction, ej. "urn:postCliente"
+    :return: name of the operation
+    """
+    return headers.get("SOAPAction", "").strip('"').rsplit(":", 1)[-1]
+
+
+class PooledTransport(Transport):
+    """
+    transport with separate connect and read timeouts, the read timeout can be set per operation. The registry of
+    the operations gives the timeouts and, to call_service, the operations that are retried
+    """
+
+    def __init__(
+        self,
+        session: Session = None,
+        connect_timeout: float = SOAP_CONNECT_TIMEOUT,
+        read_timeout: float = SOAP_READ_TIMEOUT,
+        operation_timeouts: dict = None,
+        endpoint: str = CREDIFAMILIA_ENDPOINT,
+        registry: OperationRegistry = None,
+    ):
+        super().__init__(session=session or build_session(), operation_timeout=(connect_timeout, read_timeout))
+        self.connect_timeout = connect_timeout
+        self.registry = registered_operations(registry)
+        self.operation_timeouts = resolve_operation_timeouts(operation_timeouts, self.registry)
+        self.endpoint = endpoint
+
+    def timeout_for(self, operation: str) -> tuple:
+        read_timeout = self.operation_timeouts.get(operation)
+        if read_timeout is None:
+            return self.operation_timeout
+        return self.connect_timeout, read_timeout
+
+    def post(self, address, message, headers):
+        return self.session.post(
+            self.endpoint or address, data=message, headers=headers, timeout=self.timeout_for(soap_operation(headers))
+        )
+
+
+def build_async_http_client(pool_maxsize: int = SOAP_POOL_MAXSIZE):
+    """
+    httpx client with a pool of keep-alive connections, it is bound to the event loop where it is first used
+    :param pool_maxsize: connections kept alive, also the limit of calls in flight
+    :return: async client ready to be used by the transport
+    """
+    import httpx
+
+    return httpx.AsyncClient(
+        verify=False, limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize)
+    )
+
+
+class AsyncPooledTransport(AsyncTransport):
+    """
+    async version of PooledTransport built on httpx, same endpoint and timeouts per operation
+    """
+
+    def __init__(
+        self,
+        client=None,
+        connect_timeout: float = SOAP_CONNECT_TIMEOUT,
+        read_timeout: float = SOAP_READ_TIMEOUT,
+        operation_timeouts: dict = None,
+        endpoint: str = CREDIFAMILIA_ENDPOINT,
+        registry: OperationRegistry = None,
+    ):
+        super().__init__(client=client or build_async_http_client(), verify_ssl=False)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.registry = registered_operations(registry)
+        self.operation_timeouts = resolve_operation_timeouts(operation_timeouts, self.registry)
+        self.endpoint = endpoint
+
+    def timeout_for(self, operation: str):
+        import httpx
+
+        read_timeout = self.operation_timeouts.get(operation, self.read_timeout)
+        return httpx.Timeout(read_timeout, connect=self.connect_timeout)
+
+    async def post(self, address, message, headers):
+        timeout = self.timeout_for(soap_operation(headers))
+        return await self.client.post(self.endpoint or address, content=message, headers=headers, timeout=timeout)
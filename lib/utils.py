@@ -1,18 +1,32 @@
+import contextvars
+import hashlib
+import inspect
 import json
 import os
-from collections import deque
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any
 from urllib import parse
 from urllib.request import pathname2url
 
 from lxml.etree import _Element
-from requests import Session
-from zeep import Client, Settings, helpers
+from zeep import AsyncClient, Client, Settings
 from zeep.exceptions import Fault
-from zeep.transports import Transport
+from zeep.xsd.valueobjects import CompoundValue
 
-from lib.settings import WSDL, BASE_DIR
+from lib.settings import BACKGROUND_WORKERS, WSDL, CERT_FILE, ENV, KEY_FILE, TIMINGS_IN_RESPONSE
+from lib.faults import decode_fault_error
+from lib.resilience import async_call_with_resilience, call_with_resilience
+from lib.plugins import EnvelopeCapturePlugin, TimingPlugin, received_envelope
 from lib.signature import BinarySignatureTimestamp
+from lib.timing import current_timings, stage
+from lib.transport import AsyncPooledTransport, PooledTransport
+from lib.validation import check_request
+from lib.wsdl_cache import load_document
+
+
+SoapResponse = namedtuple("SoapResponse", ["result", "envelope"])
 
 
 class CustomEncoder(json.JSONEncoder):
@@ -24,10 +38,22 @@ class CustomEncoder(json.JSONEncoder):
 
 
 def capture_soap_error(function):
+    if inspect.iscoroutinefunction(function):
+
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await function(*args, **kwargs)
+            except Fault as error:
+                error.soap_fault = decode_fault_error(error)
+                raise
+
+        return async_wrapper
+
     def wrapper(*args, **kwargs):
         try:
             return function(*args, **kwargs)
         except Fault as error:
+            error.soap_fault = decode_fault_error(error)
             raise
             return render_soap_error(error, from_function=function.__name__)
         # except Exception as error:
@@ -46,8 +72,13 @@ def build_reply_message(is_error: bool, message: str, payload: Any, from_functio
     :param payload: additional information answered by the credifamilia api
     :return: a reply message in json format
     """
-    print("BUILD reply", is_error, payload)
-    return {"error": is_error, "message": message, "payload": payload, "function": from_function}
+    reply = {"error": is_error, "message": message, "payload": payload, "function": from_function}
+    timings = current_timings()
+    if TIMINGS_IN_RESPONSE and timings is not None:
+        # a copy, the items of a batch that outlive its deadline keep writing stages in the dictionary of the
+        # invocation while the reply is serialized
+        reply["timings"] = dict(timings)
+    return reply
 
 
 def get_detail_recursively(element: _Element):
@@ -70,8 +101,44 @@ def render_soap_error(error: Fault, from_function: str):
     :param error: instance of the generated error
     :return: a reply message in json format
     """
-    detail = get_detail_recursively(error.detail)
-    return build_reply_message(True, str(error), detail, from_function=from_function)
+    fault = getattr(error, "soap_fault", None) or decode_fault_error(error)
+    return build_reply_message(True, fault.message, fault._asdict(), from_function=from_function)
+
+
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+def to_builtin(obj):
+    """
+    convert a zeep response to plain python structures in a single pass, zeep objects and mappings become
+    dictionaries, sequences become lists and any other value (Decimal, datetime, elements) becomes text
+    :param obj: value to convert
+    :return: structure that can be dumped to json without an encoder
+    """
+    if type(obj) in _SCALAR_TYPES:
+        return obj
+    if isinstance(obj, CompoundValue):
+        obj = obj.__values__
+    if isinstance(obj, dict):
+        return {key: to_builtin(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple, deque)):
+        return [to_builtin(value) for value in obj]
+    if isinstance(obj, _SCALAR_TYPES):
+        return obj
+    return str(obj)
+
+
+def json_default(o: Any) -> Any:
+    """
+    fallback of the json encoder for the values to_builtin would convert
+    """
+    if isinstance(o, (CompoundValue, deque)):
+        return to_builtin(o)
+    return str(o)
+
+
+def to_json(obj) -> str:
+    return json.dumps(obj, default=json_default)
 
 
 def serialize_soap_response(soap_object):
@@ -80,15 +147,8 @@ def serialize_soap_response(soap_object):
     :param soap_object: object returned by the library that consumes the api
     :return: dictionary with response elements
     """
-    input_dict = helpers.serialize_object(soap_object)
-    format_keys = []
-    for x in input_dict:
-        if isinstance(input_dict[x], deque):
-            format_keys.append(x)
-
-    for x in format_keys:
-        input_dict[x] = list(input_dict[x])
-    return json.loads(json.dumps(input_dict, cls=CustomEncoder, default=str))
+    with stage("serialize"):
+        return to_builtin(soap_object)
 
 
 def clean_dict(d):
@@ -100,22 +160,199 @@ def clean_dict(d):
     return response
 
 
-def create_client(history):
-    key_file = os.path.join(BASE_DIR, "lib/certs_lqn/key.pem")
-    cert_file = os.path.join(BASE_DIR, "lib/certs_lqn/certificate.pem")
+def call_service(client, operation: str, *args, preflight: bool = True, **kwargs) -> SoapResponse:
+    """
+    consume an operation of the api keeping the envelope received by this call, through the circuit breaker and
+    with retries of the transport errors when the operation is idempotent
+    :param client: zeep client created with create_client
+    :param operation: name of the operation in the WSDL
+    :param preflight: False when the caller already checked the request with lib.validation.preflight_errors
+    :return: the parsed result and the raw envelope of the response
+    :raise RequestValidationError: the request does not match the schema of the WSDL, it is not sent
+    """
+    if preflight and "request" in kwargs:
+        check_request(operation, kwargs["request"])
+    token = received_envelope.set(None)
+    try:
+        with stage("soap:" + operation):
+            result = call_with_resilience(
+                operation,
+                lambda: getattr(client.service, operation)(*args, **kwargs),
+                registry=getattr(client.transport, "registry", None),
+            )
+        return SoapResponse(result, received_envelope.get())
+    finally:
+        received_envelope.reset(token)
 
-    session = Session()
-    session.verify = False
-    # session.cert = (cert_file, key_file)
 
-    transport = Transport(session=session)
+async def async_call_service(client, operation: str, *args, preflight: bool = True, **kwargs) -> SoapResponse:
+    """
+    async version of call_service, every task sees only the envelope of its own call
+    :param client: zeep client created with create_async_client
+    :param operation: name of the operation in the WSDL
+    :param preflight: False when the caller already checked the request with lib.validation.preflight_errors
+    :return: the parsed result and the raw envelope of the response
+    :raise RequestValidationError: the request does not match the schema of the WSDL, it is not sent
+    """
+    if preflight and "request" in kwargs:
+        check_request(operation, kwargs["request"])
+    token = received_envelope.set(None)
+    try:
+        with stage("soap:" + operation):
+            result = await async_call_with_resilience(
+                operation,
+                lambda: getattr(client.service, operation)(*args, **kwargs),
+                registry=getattr(client.transport, "registry", None),
+            )
+        return SoapResponse(result, received_envelope.get())
+    finally:
+        received_envelope.reset(token)
+
+
+def create_client(registry=None):
+    """
+    :param registry: operations whose timeouts and retries the client applies, by default the ones registered by
+    service.py
+    :return: zeep client ready to consume the api
+    """
+    transport = PooledTransport(registry=registry)
     settings = Settings(strict=False, xml_huge_tree=True)
-    wsdl_url = parse.urljoin("file:", pathname2url(os.path.abspath(WSDL)))
-
-    return Client(
-        wsdl_url,
-        transport=transport,
-        settings=settings,
-        wsse=BinarySignatureTimestamp(key_file=key_file, certfile=cert_file),
-        plugins=[history],
-    )
+    with stage("wsdl_load"):
+        wsdl = load_document(WSDL, transport, settings)
+        if wsdl is None:
+            wsdl = parse.urljoin("file:", pathname2url(os.path.abspath(WSDL)))
+
+        return Client(
+            wsdl,
+            transport=transport,
+            settings=settings,
+            wsse=BinarySignatureTimestamp(key_file=KEY_FILE, certfile=CERT_FILE),
+            plugins=[EnvelopeCapturePlugin(), TimingPlugin()],
+        )
+
+
+def create_async_client(registry=None):
+    """
+    client whose operations are awaitable, the requests go through httpx and are signed the same as the
+    ones of create_client
+    :param registry: see create_client
+    :return: zeep async client ready to consume the api
+    """
+    transport = AsyncPooledTransport(registry=registry)
+    settings = Settings(strict=False, xml_huge_tree=True)
+    with stage("wsdl_load"):
+        wsdl = load_document(WSDL, transport, settings)
+        if wsdl is None:
+            # the async transport loads local files only from plain paths
+            wsdl = os.path.abspath(WSDL)
+
+        return AsyncClient(
+            wsdl,
+            transport=transport,
+            settings=settings,
+            wsse=BinarySignatureTimestamp(key_file=KEY_FILE, certfile=CERT_FILE),
+            plugins=[EnvelopeCapturePlugin(), TimingPlugin()],
+        )
+
+
+_client_cache = {}
+_client_cache_lock = threading.Lock()
+_client_cache_stats = {"hits": 0, "misses": 0}
+_cert_fingerprints = {}
+
+
+def _files_signature(*paths):
+    """
+    cheap change detector for the files a client is built from
+    :param paths: files to inspect
+    :return: tuple with the path, modification time and size of every file
+    """
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def _cert_fingerprint(cert_signature):
+    """
+    sha256 of the certificate, only recomputed when the file changes on disk
+    :param cert_signature: signature of the certificate file
+    :return: hex digest of the certificate contents
+    """
+    fingerprint = _cert_fingerprints.get(cert_signature)
+    if fingerprint is None:
+        with open(cert_signature[0][0], "rb") as cert:
+            fingerprint = hashlib.sha256(cert.read()).hexdigest()
+        _cert_fingerprints.clear()
+        _cert_fingerprints[cert_signature] = fingerprint
+    return fingerprint
+
+
+def _get_cached_client(kind: str, factory):
+    wsdl_path = os.path.abspath(WSDL)
+    signature = _files_signature(wsdl_path, KEY_FILE, CERT_FILE)
+    key = (ENV, wsdl_path, _cert_fingerprint(signature[2:]))
+
+    with _client_cache_lock:
+        cached = _client_cache.get(kind)
+        if cached is not None and cached[0] == key and cached[1] == signature:
+            _client_cache_stats["hits"] += 1
+            return cached[2]
+
+        _client_cache_stats["misses"] += 1
+        with stage("client"):
+            client = factory()
+        _client_cache[kind] = (key, signature, client)
+        return client
+
+
+def get_client():
+    """
+    return a zeep client reused across invocations of the same container, the client is rebuilt
+    only when the environment, the WSDL or the certificates change
+    :return: zeep client ready to consume the api
+    """
+    return _get_cached_client("sync", create_client)
+
+
+def get_async_client():
+    """
+    same as get_client for the async client, its connections belong to the event loop where it is first used
+    so the invocations must run on the same loop
+    :return: zeep async client ready to consume the api
+    """
+    return _get_cached_client("async", create_async_client)
+
+
+def get_client_cache_stats() -> dict:
+    """
+    hit and miss counters of the client cache, useful to confirm warm reuse
+    :return: dictionary with the counters and the number of cached clients
+    """
+    return {**_client_cache_stats, "size": len(_client_cache)}
+
+
+def clear_client_cache():
+    with _client_cache_lock:
+        _client_cache.clear()
+        _client_cache_stats["hits"] = 0
+        _client_cache_stats["misses"] = 0
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def submit(function, *args, **kwargs) -> Future:
+    """
+    run a function in the pool of background threads shared by the warm invocations, the function sees the
+    context variables of the caller
+    :return: future with the result of the function
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="soap")
+    return _executor.submit(contextvars.copy_context().run, function, *args, **kwargs)
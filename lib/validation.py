@@ -0,0 +1,240 @@
+import datetime
+import os
+import re
+import threading
+from decimal import Decimal
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from lxml import etree
+
+from lib.settings import BASE_DIR, SOAP_PREFLIGHT_OPERATIONS, WSDL
+
+XS_NS = "http://www.w3.org/2001/XMLSchema"
+
+_INTEGER = re.compile(r"^[+-]?\d+$")
+_DECIMAL = re.compile(r"^[+-]?(\d+(\.\d*)?|\.\d+)$")
+_DATE_TIME = re.compile(r"^(\d{4}-\d{2}-\d{2})T(\d{2}:\d{2}:\d{2})(\.\d+)?(Z|[+-]\d{2}:\d{2})?$")
+_DATE = re.compile(r"^(\d{4}-\d{2}-\d{2})(Z|[+-]\d{2}:\d{2})?$")
+
+
+class RequestValidationError(Exception):
+    """
+    the request of an operation does not match the schema of the WSDL, it was not sent
+    """
+
+    def __init__(self, operation: str, errors: list):
+        super().__init__(f"Error de validación en {operation}: {' '.join(errors)}")
+        self.operation = operation
+        self.errors = errors
+
+
+class Field(NamedTuple):
+    name: str
+    type: Tuple[str, str]
+    required: bool
+    nillable: bool
+    repeated: bool
+
+
+def _is_integer(value: Any, bits: int) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, str) and _INTEGER.match(value.strip()):
+        value = int(value)
+    if not isinstance(value, int):
+        return False
+    return -(2 ** (bits - 1)) <= value < 2 ** (bits - 1)
+
+
+def _is_decimal(value: Any) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, Decimal)):
+        return True
+    if isinstance(value, float):
+        return value == value and value not in (float("inf"), float("-inf"))
+    return isinstance(value, str) and _DECIMAL.match(value.strip()) is not None
+
+
+def _is_boolean(value: Any) -> bool:
+    return isinstance(value, bool) or value in ("true", "false", "1", "0")
+
+
+def _is_date_time(value: Any) -> bool:
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return True
+    match = _DATE_TIME.match(value) if isinstance(value, str) else None
+    if match is None:
+        return False
+    try:
+        datetime.datetime.fromisoformat(f"{match.group(1)}T{match.group(2)}")
+    except ValueError:
+        return False
+    return True
+
+
+def _is_date(value: Any) -> bool:
+    if isinstance(value, datetime.date):
+        return True
+    match = _DATE.match(value) if isinstance(value, str) else None
+    if match is None:
+        return False
+    try:
+        datetime.date.fromisoformat(match.group(1))
+    except ValueError:
+        return False
+    return True
+
+
+def _is_string(value: Any) -> bool:
+    return isinstance(value, (str, int, float, Decimal)) and not isinstance(value, bool)
+
+
+# xs type: (check of the value, description for the messages), the types missing here are not checked
+_SIMPLE_TYPES = {
+    "string": (_is_string, "un texto"),
+    "long": (lambda value: _is_integer(value, 64), "un número entero"),
+    "int": (lambda value: _is_integer(value, 32), "un número entero"),
+    "short": (lambda value: _is_integer(value, 16), "un número entero"),
+    "integer": (lambda value: _is_integer(value, 128), "un número entero"),
+    "decimal": (_is_decimal, "un número"),
+    "double": (_is_decimal, "un número"),
+    "float": (_is_decimal, "un número"),
+    "boolean": (_is_boolean, "true o false"),
+    "dateTime": (_is_date_time, "una fecha AAAA-MM-DDTHH:MM:SS"),
+    "date": (_is_date, "una fecha AAAA-MM-DD"),
+}
+
+
+def _qname(element: etree._Element, value: str) -> Tuple[str, str]:
+    prefix, _, name = value.rpartition(":")
+    return element.nsmap.get(prefix or None), name
+
+
+def _fields(complex_type: etree._Element) -> Dict[str, Field]:
+    fields = {}
+    for element in complex_type.iterfind(f".//{{{XS_NS}}}element"):
+        max_occurs = element.get("maxOccurs", "1")
+        fields[element.get("name")] = Field(
+            name=element.get("name"),
+            type=_qname(element, element.get("type", "xs:string")),
+            required=element.get("minOccurs", "1") != "0",
+            nillable=element.get("nillable") == "true",
+            repeated=max_occurs == "unbounded" or int(max_occurs) > 1,
+        )
+    return fields
+
+
+class RequestValidator:
+    """
+    check the requests of the operations against the schema of the WSDL without building nor signing the envelope.
+    The schema is compiled once to a table of fields per type, a check walks the request once and returns every
+    error instead of stopping at the first one
+    :param wsdl: path of the WSDL
+    """
+
+    def __init__(self, wsdl: str):
+        document = etree.parse(wsdl)
+        self.types = {}
+        self.requests = {}
+        for schema in document.iter(f"{{{XS_NS}}}schema"):
+            namespace = schema.get("targetNamespace")
+            for complex_type in schema.iterfind(f"{{{XS_NS}}}complexType"):
+                self.types[(namespace, complex_type.get("name"))] = _fields(complex_type)
+            for element in schema.iterfind(f"{{{XS_NS}}}element"):
+                complex_type = element.find(f"{{{XS_NS}}}complexType")
+                if complex_type is not None:
+                    # the element of an operation wraps its request, ej. postCliente/request
+                    self.requests[element.get("name")] = _fields(complex_type).get("request")
+
+    def errors(self, operation: str, request: Any) -> list:
+        """
+        :param operation: name of the operation in the WSDL
+        :param request: request as it is given to zeep
+        :return: list with a message for every field that does not match the schema, empty when it is valid
+        """
+        field = self.requests.get(operation)
+        if field is None:
+            return []
+        errors = []
+        self._check_value(field, request, "", errors)
+        return errors
+
+    def _check_value(self, field: Field, value: Any, path: str, errors: list):
+        if value is None:
+            if field.required and not field.nillable:
+                errors.append(f"{path or field.name}: El campo es obligatorio.")
+            return
+        if field.repeated and isinstance(value, (list, tuple)):
+            for index, item in enumerate(value):
+                self._check_single(field, item, f"{path}[{index}]", errors)
+        else:
+            self._check_single(field, value, path, errors)
+
+    def _check_single(self, field: Field, value: Any, path: str, errors: list):
+        namespace, name = field.type
+        if namespace != XS_NS:
+            fields = self.types.get(field.type)
+            if fields is None:
+                return
+            if not isinstance(value, dict):
+                errors.append(f"{path or field.name}: El valor '{value}' no es válido, se esperaba un objeto.")
+                return
+            self._check_fields(fields, value, path, errors)
+            return
+        check = _SIMPLE_TYPES.get(name)
+        if check is not None and not check[0](value):
+            errors.append(f"{path}: El valor '{value}' no es válido, se esperaba {check[1]}.")
+
+    def _check_fields(self, fields: Dict[str, Field], value: dict, path: str, errors: list):
+        prefix = f"{path}." if path else ""
+        for name, item in value.items():
+            field = fields.get(name)
+            if field is None:
+                errors.append(f"{prefix}{name}: El campo no existe en el WSDL.")
+            else:
+                self._check_value(field, item, prefix + name, errors)
+        for name, field in fields.items():
+            if field.required and name not in value:
+                errors.append(f"{prefix}{name}: El campo es obligatorio.")
+
+
+_validators = {}
+_lock = threading.Lock()
+
+
+def get_request_validator(wsdl: str = WSDL) -> RequestValidator:
+    """
+    :return: the validator of the WSDL, compiled on the first use and kept by the container
+    """
+    validator = _validators.get(wsdl)
+    if validator is None:
+        with _lock:
+            validator = _validators.get(wsdl)
+            if validator is None:
+                validator = _validators[wsdl] = RequestValidator(os.path.join(BASE_DIR, wsdl))
+                missing = sorted(
+                    operation for operation in SOAP_PREFLIGHT_OPERATIONS if validator.requests.get(operation) is None
+                )
+                if missing:
+                    # the requests of these operations would pass unchecked, ej. postClienteRadicacion in the PRD WSDL
+                    print(f"SOAP_PREFLIGHT_OPERATIONS not in the schema of {wsdl}, not validated: {', '.join(missing)}")
+    return validator
+
+
+def preflight_errors(operation: str, request: Any, wsdl: str = WSDL) -> Optional[list]:
+    """
+    :return: errors of the request of the operations listed in SOAP_PREFLIGHT_OPERATIONS, None for the rest
+    """
+    if operation not in SOAP_PREFLIGHT_OPERATIONS:
+        return None
+    return get_request_validator(wsdl).errors(operation, request)
+
+
+def check_request(operation: str, request: Any):
+    """
+    :raise RequestValidationError: the request does not match the schema, before it is signed and sent
+    """
+    errors = preflight_errors(operation, request)
+    if errors:
+        raise RequestValidationError(operation, errors)
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import pickle
+import sys
+
+import zeep
+from lxml import etree
+from zeep import Settings
+from zeep.transports import Transport
+from zeep.wsdl import Document
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WSDL_FILES = ("lib/wsdl/credifamilia-dev.wsdl", "lib/wsdl/credifamilia-prd.wsdl")
+ARTIFACT_SUFFIX = ".pickle"
+
+_SETTINGS_ID = "settings"
+_TRANSPORT_ID = "transport"
+_DYNAMIC_MODULES = ("zeep.xsd.dynamic_types", "zeep.objects")
+_DYNAMIC_ATTRIBUTES = ("__module__", "_xsd_name", "_xsd_type")
+
+
+def _make_type(name, bases, attributes):
+    return type(name, bases, attributes)
+
+
+class _DocumentPickler(pickle.Pickler):
+    """
+    pickles a parsed zeep document, the settings and transport are left out so the ones of the client
+    loading the artifact are used, the classes zeep builds on the fly are recreated on load
+    """
+
+    def __init__(self, file, settings, transport):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._settings = settings
+        self._transport = transport
+
+    def persistent_id(self, obj):
+        if obj is self._settings:
+            return _SETTINGS_ID
+        if obj is self._transport:
+            return _TRANSPORT_ID
+        return None
+
+    def reducer_override(self, obj):
+        if isinstance(obj, type) and obj.__module__ in _DYNAMIC_MODULES:
+            attributes = {key: value for key, value in vars(obj).items() if key in _DYNAMIC_ATTRIBUTES}
+            return _make_type, (obj.__name__, obj.__bases__, attributes)
+        if isinstance(obj, etree.QName):
+            return etree.QName, (obj.text,)
+        if isinstance(obj, etree._Element):
+            return etree.fromstring, (etree.tostring(obj),)
+        return NotImplemented
+
+
+class _DocumentUnpickler(pickle.Unpickler):
+    def __init__(self, file, settings, transport):
+        super().__init__(file)
+        self._persistent = {_SETTINGS_ID: settings, _TRANSPORT_ID: transport}
+
+    def persistent_load(self, pid):
+        return self._persistent[pid]
+
+
+def wsdl_hash(wsdl_path: str) -> str:
+    """
+    :param wsdl_path: path of the source WSDL
+    :return: sha256 of the WSDL contents
+    """
+    with open(wsdl_path, "rb") as wsdl:
+        return hashlib.sha256(wsdl.read()).hexdigest()
+
+
+def artifact_path(wsdl_path: str) -> str:
+    return wsdl_path + ARTIFACT_SUFFIX
+
+
+def build_artifact(wsdl_path: str, settings: Settings = None) -> str:
+    """
+    parse the WSDL and store the resulting document next to it
+    :param wsdl_path: path of the source WSDL
+    :param settings: zeep settings used to parse the WSDL
+    :return: path of the generated artifact
+    """
+    wsdl_path = os.path.abspath(wsdl_path)
+    settings = settings or Settings(strict=False, xml_huge_tree=True)
+    transport = Transport()
+    document = Document(wsdl_path, transport, settings=settings)
+    header = {"sha256": wsdl_hash(wsdl_path), "zeep": zeep.__version__}
+
+    path = artifact_path(wsdl_path)
+    with open(path, "wb") as artifact:
+        pickle.dump(header, artifact, protocol=pickle.HIGHEST_PROTOCOL)
+        _DocumentPickler(artifact, settings, transport).dump(document)
+    return path
+
+
+def load_document(wsdl_path: str, transport: Transport, settings: Settings):
+    """
+    load the precompiled document of a WSDL, the artifact is discarded when it was generated from
+    another version of the WSDL or of zeep
+    :param wsdl_path: path of the source WSDL
+    :param transport: transport of the client that will use the document
+    :param settings: settings of the client that will use the document
+    :return: the zeep document or None if there is no valid artifact
+    """
+    wsdl_path = os.path.abspath(wsdl_path)
+    try:
+        with open(artifact_path(wsdl_path), "rb") as artifact:
+            header = pickle.load(artifact)
+            if header != {"sha256": wsdl_hash(wsdl_path), "zeep": zeep.__version__}:
+                return None
+            return _DocumentUnpickler(artifact, settings, transport).load()
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # a corrupt artifact must never prevent the client from being built
+        return None
+
+
+if __name__ == "__main__":
+    for wsdl_file in sys.argv[1:] or WSDL_FILES:
+        print(build_artifact(os.path.join(BASE_DIR, wsdl_file)))
@@ -66,7 +66,7 @@ class Employe(UserBasicInfo):
     direccionEmpresa: str
     ciudadEmpresa: str
     telefonoEmpresa: int
-    trabajaSedeDiferente: str
+    trabajaSedeDiferente: bool
     cargo: str
     experienciaLaboral: int
 
@@ -90,7 +90,7 @@ class IndependentServiceProvider(UserBasicInfo):
     ciudadEmpresa: str
     telefonoEmpresa: int
     extensionTelefonoEmpresa: Optional[int]
-    trabajaSedeDiferente: str
+    trabajaSedeDiferente: bool
     cargo: str
     experienciaLaboral: str
 
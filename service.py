@@ -1,29 +1,81 @@
-import json
+import contextvars
 import os
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import nullcontext
 from typing import Any
 from urllib import parse
 from urllib.request import pathname2url
 
-import xmltodict
-from lxml import etree
-from factories import FilingFactory
-from zeep import helpers
-from zeep.plugins import HistoryPlugin
-from lib.settings import UNDEFINED_ERROR
+from zeep.exceptions import Fault
+
+from lib.cache import TTLCache, build_backend, value_version
+from lib.catalogs import post_cliente_catalog_errors
+from lib.faults import decode_fault
+from lib.idempotency import IdempotencyError, IdempotencyStore
+from lib.parsers import extract_preaprobado
+from lib.registry import Operation, operations
+from lib.resilience import CircuitOpenError, circuit_breaker
+from lib.settings import (
+    BATCH_CONCURRENCY,
+    BATCH_DEADLINE,
+    CLIENT_CREATED,
+    CACHE_BACKEND,
+    CACHE_DIR,
+    CACHE_TABLE,
+    CREATE_CLIENT_PIPELINE,
+    ENV,
+    IDEMPOTENCY_BACKEND,
+    IDEMPOTENCY_ENDPOINT,
+    IDEMPOTENCY_IN_FLIGHT_TIMEOUT,
+    IDEMPOTENCY_PATH,
+    IDEMPOTENCY_TABLE,
+    IDEMPOTENCY_TTL,
+    IDEMPOTENCY_WAIT,
+    LIST_SELECTION_STALE_TTL,
+    LIST_SELECTION_TTL,
+    PROYECTOS_MAX_ENTRIES,
+    PROYECTOS_TTL,
+    UNDEFINED_ERROR,
+)
+from lib.timing import collect, emit, stage
+from lib.tracing import capture_message, trace
 from lib.utils import (
-    CustomEncoder,
     build_reply_message,
+    call_service,
     capture_soap_error,
     serialize_soap_response,
-    create_client,
+    get_client,
+    get_client_cache_stats,
     clean_dict,
+    render_soap_error,
+    submit,
+    to_json,
 )
+from lib.validation import RequestValidationError, preflight_errors
 
 
 warnings.simplefilter("ignore")
 
-history = HistoryPlugin()
+_NO_LIMIT = nullcontext()
+
+list_selection_cache = TTLCache(
+    "getListSelection",
+    ttl=LIST_SELECTION_TTL,
+    stale_ttl=LIST_SELECTION_STALE_TTL,
+    backend=build_backend(CACHE_BACKEND, directory=CACHE_DIR, table=CACHE_TABLE),
+)
+proyectos_cache = TTLCache("getListProyectosByConstructora", ttl=PROYECTOS_TTL, max_entries=PROYECTOS_MAX_ENTRIES)
+idempotency_store = IdempotencyStore(
+    "submissions",
+    backend=build_backend(
+        IDEMPOTENCY_BACKEND, table=IDEMPOTENCY_TABLE, path=IDEMPOTENCY_PATH, endpoint_url=IDEMPOTENCY_ENDPOINT
+    ),
+    ttl=IDEMPOTENCY_TTL,
+    in_flight_timeout=IDEMPOTENCY_IN_FLIGHT_TIMEOUT,
+    wait_timeout=IDEMPOTENCY_WAIT,
+)
 
 
 @capture_soap_error
@@ -34,9 +86,11 @@ def get_list_selection(client):
     respectiva etiqueta (label) y valor (value). Se recomienda consumir este servicio a diario para estar
     sincronizados con los posibles cambios que se puedan presentar en nuestro CRM y evitar errores en el
     registro del cliente.
+
+    Desde el handler la respuesta se sirve de list_selection_cache y solo se vuelve a consultar cuando vence.
     """
-    get_list_selection_response = helpers.serialize_object(client.service.getListSelection(_soapheaders=None))
-    return get_list_selection_response
+    get_list_selection_response = call_service(client, "getListSelection", _soapheaders=None)
+    return serialize_soap_response(get_list_selection_response.result)
 
 
 @capture_soap_error
@@ -45,8 +99,8 @@ def post_existe_cliente(client, request_data):
     Este método debe ser invocado al inicio del proceso ya que retorna si el cliente se encuentra registrado en
     nuestro CRM, si ya existe NO se permitirá su registro.
     """
-    post_existe_cliente_response = client.service.postExisteCliente(**{"request": request_data}, _soapheaders=None)
-    return serialize_soap_response(post_existe_cliente_response)
+    post_existe_cliente_response = call_service(client, "postExisteCliente", request=request_data, _soapheaders=None)
+    return serialize_soap_response(post_existe_cliente_response.result)
 
 
 @capture_soap_error
@@ -54,9 +108,36 @@ def get_list_proyectos_by_constructora(client, request_data):
     """
     Llamado al servicio para conocer los proyectos existentes que se encuentran activos y con aprobación de riesgos,
     relacionados a la constructora indicada.
+
+    Desde el handler los proyectos de cada constructora se sirven de proyectos_cache.
     """
-    resp = client.service.getListProyectosByConstructora(request=request_data, _soapheaders=None)
-    return serialize_soap_response(resp)
+    resp = call_service(client, "getListProyectosByConstructora", request=request_data, _soapheaders=None)
+    return serialize_soap_response(resp.result)
+
+
+def invalidate_proyectos_by_constructora(data):
+    """
+    Elimina del cache los proyectos de la constructora indicada (nombre), o de todas con {"all": true}. Las métricas
+    del cache se consultan sin invalidar nada con get_resilience_stats.
+    """
+    data = data or {}
+    if data.get("all") is True:
+        proyectos_cache.invalidate()
+    elif data.get("nombre"):
+        proyectos_cache.invalidate(data["nombre"])
+    else:
+        return build_reply_message(
+            True,
+            "Indique el nombre de la constructora, o all para invalidar todas",
+            proyectos_cache.stats(),
+            from_function="invalidate_proyectos_by_constructora",
+        )
+    return build_reply_message(
+        False,
+        "Cache de proyectos invalidado",
+        proyectos_cache.stats(),
+        from_function="invalidate_proyectos_by_constructora",
+    )
 
 
 
@@ -65,11 +146,16 @@ def post_cliente_radicacion(client, request_data):
     """
     Después de registrar al cliente, se debe invocar este servicio para registrar la radicación de crédito.
     """
-    filing = FilingFactory.get_filing(request_data)
-    filing_data = filing.dict(exclude_unset=True)
+    # Los modelos de pydantic solo se cargan en los contenedores que reciben radicaciones
+    from factories import FilingFactory
+
+    return _post_cliente_radicacion(client, FilingFactory.get_request(request_data))
+
 
-    resp = client.service.postClienteRadicacion(request=filing_data, _soapheaders=None)
-    return serialize_soap_response(resp)
+@capture_soap_error
+def _post_cliente_radicacion(client, filing_data):
+    resp = call_service(client, "postClienteRadicacion", request=filing_data, _soapheaders=None)
+    return serialize_soap_response(resp.result)
 
 
 @capture_soap_error
@@ -86,8 +172,8 @@ def get_address_pregunta(client):
     http://aplicaciones.adres.gov.co/COM_4023//Telerik.Web.UI.WebResource.axd?type=rca&isc=true&guid=54889294-a809-4632-9d1d-cce8da7a8a59
     """
 
-    get_address_pregunta_response = client.service.getAdresPreguntaRequest()
-    return serialize_soap_response(get_address_pregunta_response)
+    get_address_pregunta_response = call_service(client, "getAdresPreguntaRequest")
+    return serialize_soap_response(get_address_pregunta_response.result)
 
 
 @capture_soap_error
@@ -97,8 +183,11 @@ def post_cliente(client, request_data):
     permite el registro del cliente y su respectiva pre-validación, todos los campos descritos a continuación
     son requeridos
     """
-    post_cliente_response = client.service.postCliente(**{"request": request_data}, _soapheaders=None)
-    return serialize_soap_response(post_cliente_response)
+    return serialize_soap_response(_post_cliente(client, request_data).result)
+
+
+def _post_cliente(client, request_data, preflight=True):
+    return call_service(client, "postCliente", request=request_data, preflight=preflight, _soapheaders=None)
 
 
 @capture_soap_error
@@ -108,103 +197,334 @@ def get_preaprobado(client, idTransaccion):
     proptech se debe invocar este servicio para obtener el detalle del resultado del prevalidador.
     """
     request_data = {"idTransaccion": idTransaccion or "1"}
-    post_existe_cliente_response = client.service.getPreaprobado(**{"request": request_data}, _soapheaders=None)
-    your_pretty_xml = etree.tostring(history.last_received["envelope"], encoding="unicode", pretty_print=True)
-    xml = xmltodict.parse(your_pretty_xml)
-    result_str = json.dumps(xml, cls=CustomEncoder, default=str)
-    result = json.loads(result_str)
-    result_return = (
-        result.get("soapenv:Envelope").get("soapenv:Body").get("ns:getPreaprobadoResponse").get("ns:return")
-    )
-    result_client = result_return.get("ax22:resultadoCliente")
-    result_client_detail = result_return.get("ax22:resultadoCliente").get("ax28:detalle")
-    preaproved_letter = result_return.get("ax22:cartaPreaprobado")
-    result_client.pop("ax28:detalle")
-    response = {}
-    response["result_client"] = clean_dict(result_client)
-    response["result_client_detail"] = clean_dict(result_client_detail)
-    response["preaproved_letter"] = preaproved_letter
-    response = clean_dict(response)
-    return serialize_soap_response(response)
+    get_preaprobado_response = call_service(client, "getPreaprobado", request=request_data, _soapheaders=None)
+    with stage("preaprobado"):
+        response = extract_preaprobado(get_preaprobado_response.envelope)
+        for key in ("result_client", "result_client_detail"):
+            if isinstance(response[key], dict):
+                response[key] = clean_dict(response[key])
+    return response
 
 
 @capture_soap_error
 def service_create_client(client, data):
+    # los errores de tipos y campos del esquema se responden sin llamar a Credifamilia
+    schema_errors = preflight_errors("postCliente", data)
+    if schema_errors:
+        return build_reply_message(
+            True,
+            f"Error al crear cliente: {' '.join(schema_errors)}",
+            {"errors": schema_errors},
+            from_function="service_create_client",
+        )
     client_exist_data = {
         "tipoDocumento": data.get("tipoDocumento"),
         "numeroDocumento": data.get("numeroDocumento"),
         "origen": "LQN",
     }
-    client_exist_result = post_existe_cliente(client, client_exist_data)
+    if CREATE_CLIENT_PIPELINE == "concurrent":
+        # la validación empieza junto con postExisteCliente y no se puede interrumpir: si el cliente ya existe o la
+        # consulta falla, la carga de las listas termina en segundo plano y deja el cache listo para el siguiente
+        client_exist_future = submit(post_existe_cliente, client, client_exist_data)
+        catalog_errors_future = submit(_post_cliente_catalog_errors, client, data)
+        client_exist_result = client_exist_future.result()
+    else:
+        client_exist_result = post_existe_cliente(client, client_exist_data)
+        catalog_errors_future = None
+
     exists = client_exist_result.get("existe")
     if exists is False:
-        client_result = post_cliente(client, data)
-        your_pretty_xml = etree.tostring(history.last_received["envelope"], encoding="unicode", pretty_print=True)
-        xml = xmltodict.parse(your_pretty_xml)
-        result_str = json.dumps(xml, cls=CustomEncoder, default=str)
-        result = json.loads(result_str)
-        fault = result.get("soapenv:Envelope").get("soapenv:Body").get("soapenv:Fault")
+        if catalog_errors_future is not None:
+            catalog_errors = catalog_errors_future.result()
+        else:
+            catalog_errors = _post_cliente_catalog_errors(client, data)
+        if catalog_errors:
+            return build_reply_message(
+                True,
+                f"Error al crear cliente: {' '.join(catalog_errors)}",
+                {"errors": catalog_errors},
+                from_function="service_create_client",
+            )
+
+        # el esquema ya se revisó al comienzo
+        post_cliente_response = _post_cliente(client, data, preflight=False)
+        client_result = serialize_soap_response(post_cliente_response.result)
+        fault = decode_fault(post_cliente_response.envelope)
         if fault:
-            description = None
-            fault_string = fault.get("faultstring", UNDEFINED_ERROR)
-            if fault_string == UNDEFINED_ERROR:
-                # TODO: Reportar error a Sentry
-                pass
-
-            fault_detail = fault.get("detail", UNDEFINED_ERROR)
-            if fault_detail is not None:
-                description = (
-                    fault_detail.get("ns:proptechEndPointServiceFaultException")
-                    .get("ServiceFaultException")
-                    .get("ax21:serviceStatus")
-                    .get("ax22:description")
-                )
-
-            if description is not None:
-                fault_string += f". {str(description)}"
+            if fault.faultstring == UNDEFINED_ERROR:
+                capture_message("postCliente respondió un error indefinido", fault=fault._asdict())
 
             return build_reply_message(
                 True,
-                f"Error al crear cliente: (fault = {fault_string})",
+                f"Error al crear cliente: (fault = {fault.message})",
                 client_result,
                 from_function="service_create_client",
             )
         else:
             approved_result = get_preaprobado(client, client_result.get("idTransaccion"))
             approved_result.update({"idTransaccion": client_result.get("idTransaccion")})
-            return build_reply_message(
-                False, "Cliente creado correctamente", approved_result, from_function="service_create_client"
-            )
+            return build_reply_message(False, CLIENT_CREATED, approved_result, from_function="service_create_client")
     else:
         return build_reply_message(
             False, client_exist_result.get("mensaje"), client_exist_result, from_function="service_create_client"
         )
 
 
+def _client_submission_key(data):
+    """
+    Un cliente se crea una sola vez por documento (y transacción, si ya se tiene una).
+    """
+    if not data or not data.get("numeroDocumento"):
+        return None
+    return f"postCliente:{data.get('tipoDocumento')}:{data['numeroDocumento']}:{data.get('idTransaccion') or ''}"
+
+
+def _client_created(reply):
+    """
+    Solo la creación del cliente se repite desde el store; si el cliente ya existía la respuesta no se guarda y el
+    mismo documento se puede enviar de nuevo con otros datos.
+    """
+    return isinstance(reply, dict) and reply.get("error") is False and reply.get("message") == CLIENT_CREATED
+
+
+def _radicacion_submission_key(data):
+    """
+    Una radicación por transacción.
+    """
+    id_transaccion = (data or {}).get("idTransaccion")
+    return f"postClienteRadicacion:{id_transaccion}" if id_transaccion else None
+
+
+def get_resilience_stats():
+    """
+    Estado del circuit breaker de las llamadas a Credifamilia, contadores de reintentos y aperturas del contenedor,
+    en clients los aciertos y fallos del cache de clientes zeep y en caches las métricas de los caches. La version de
+    list_selection es el hash de las listas del CRM guardadas y changes cuenta las veces que cambiaron. No modifica
+    nada.
+    """
+    stats = {
+        **circuit_breaker.stats(),
+        "clients": get_client_cache_stats(),
+        "caches": {
+            "list_selection": {**list_selection_cache.stats(), "version": list_selection_cache.version(ENV)},
+            "proyectos": proyectos_cache.stats(),
+        },
+    }
+    return build_reply_message(
+        False, "Estado de las llamadas a Credifamilia", stats, from_function="get_resilience_stats"
+    )
+
+
+def _post_cliente_catalog_errors(client, data):
+    """
+    Valida los campos del cliente contra las listas de get_list_selection (normalmente servidas desde cache). Si
+    las listas no se pueden obtener no se valida y Credifamilia responde el error.
+    """
+    try:
+        list_selection = list_selection_cache.get_or_load(ENV, lambda: get_list_selection(client))
+    except Exception:
+        return []
+    return post_cliente_catalog_errors(data, list_selection)
+
+
+operations.register(
+    Operation(
+        "create_client",
+        lambda client, data: service_create_client(client, data),
+        soap_operation="postCliente",
+        timeout=45,
+        concurrency=2,
+        idempotency_key=_client_submission_key,
+        replayable=_client_created,
+    )
+)
+operations.register(
+    Operation(
+        "get_list_selection",
+        lambda client, data: get_list_selection(client),
+        soap_operation="getListSelection",
+        cache=list_selection_cache,
+        cache_key=lambda data: ENV,
+        idempotent=True,
+        timeout=60,
+    )
+)
+operations.register(
+    Operation(
+        "get_address_pregunta",
+        lambda client, data: get_address_pregunta(client),
+        soap_operation="getAdresPreguntaRequest",
+        idempotent=True,
+    )
+)
+operations.register(
+    Operation(
+        "post_existe_cliente",
+        lambda client, data: post_existe_cliente(client, data),
+        soap_operation="postExisteCliente",
+        idempotent=True,
+    )
+)
+operations.register(
+    Operation(
+        "get_preaprobado",
+        lambda client, data: get_preaprobado(client, data["idTransaccion"]),
+        soap_operation="getPreaprobado",
+        idempotent=True,
+    )
+)
+operations.register(
+    Operation(
+        "post_cliente_radicacion",
+        lambda client, data: _post_cliente_radicacion(client, data),
+        soap_operation="postClienteRadicacion",
+        input_model="factories:FilingFactory.get_request",
+        timeout=45,
+        concurrency=2,
+        idempotency_key=_radicacion_submission_key,
+    )
+)
+operations.register(
+    Operation(
+        "get_list_proyectos_by_constructora",
+        lambda client, data: get_list_proyectos_by_constructora(client, data),
+        soap_operation="getListProyectosByConstructora",
+        cache=proyectos_cache,
+        cache_key=lambda data: (data or {}).get("nombre"),
+        idempotent=True,
+    )
+)
+operations.register(
+    Operation(
+        "invalidate_proyectos_by_constructora",
+        lambda client, data: invalidate_proyectos_by_constructora(data),
+        idempotent=True,
+        needs_client=False,
+    )
+)
+operations.register(
+    Operation("get_resilience_stats", lambda client, data: get_resilience_stats(), idempotent=True, needs_client=False)
+)
+
+
+def dispatch(client, service, data):
+    """
+    Ejecuta un servicio del lambda con sus datos, es lo que resuelve cada evento simple y cada elemento de un lote.
+    Los datos pasan por el input_model de la operación y las operaciones con cache responden desde él. Los envíos
+    repetidos de create_client y post_cliente_radicacion responden el resultado del primero (idempotency_store).
+    Mientras Credifamilia está caído (circuito abierto) responde un error sin llamarlo.
+    """
+    operation = operations.get(service)
+    if operation is None:
+        return {"error": True, "message": "Ningun servicio utilizado"}
+
+    data = operation.validate(data)
+    try:
+        cache_key = operation.cache_key(data) if operation.cacheable else None
+        if cache_key is not None:
+            return operation.cache.get_or_load(cache_key, lambda: operation.handler(client, data))
+        if operation.idempotency_key is not None:
+            return idempotency_store.run(
+                operation.idempotency_key(data),
+                value_version(data),
+                lambda: operation.handler(client, data),
+                operation.replayable,
+            )
+        return operation.handler(client, data)
+    except CircuitOpenError as error:
+        return build_reply_message(True, str(error), circuit_breaker.stats(), from_function=service)
+    except IdempotencyError as error:
+        return build_reply_message(True, str(error), idempotency_store.stats(), from_function=service)
+    except RequestValidationError as error:
+        return build_reply_message(True, str(error), {"errors": error.errors}, from_function=service)
+
+
+def _batch_item(client, index, item, limits):
+    service = item.get("service")
+    try:
+        with limits.get(service, _NO_LIMIT):
+            result = dispatch(client, service, item.get("data"))
+    except Fault as error:
+        reply = render_soap_error(error, from_function=service)
+        return {"index": index, "service": service, "error": True, "message": reply["message"], "result": reply}
+    except Exception as error:
+        message = f"{type(error).__name__}: {error}"
+        return {"index": index, "service": service, "error": True, "message": message, "result": None}
+    error = isinstance(result, dict) and result.get("error") is True
+    return {"index": index, "service": service, "error": error, "message": None, "result": result}
+
+
+def run_batch(client, items, concurrency=BATCH_CONCURRENCY, deadline=BATCH_DEADLINE):
+    """
+    Ejecuta los elementos de un lote ({"service": ..., "data": ...}) con el mismo cliente y a lo sumo concurrency
+    llamadas en curso. Responde un resultado por elemento en el mismo orden; los errores de un elemento no afectan a
+    los demás y los que no terminan antes de deadline segundos se reportan como vencidos.
+    """
+    items = items or []
+    results = [None] * len(items)
+    # calls in flight of the operations that declare a lower concurrency than the batch
+    limits = {
+        operation.name: threading.BoundedSemaphore(operation.concurrency)
+        for operation in operations
+        if operation.concurrency and operation.concurrency < concurrency
+    }
+    executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items) or 1)), thread_name_prefix="batch")
+    try:
+        futures = {
+            executor.submit(contextvars.copy_context().run, _batch_item, client, index, item, limits): index
+            for index, item in enumerate(items)
+        }
+        done, not_done = wait(futures, timeout=deadline)
+        for future in done:
+            results[futures[future]] = future.result()
+        for future in not_done:
+            future.cancel()
+            index = futures[future]
+            results[index] = {
+                "index": index,
+                "service": items[index].get("service"),
+                "error": True,
+                "message": "Tiempo límite del lote agotado",
+                "result": None,
+            }
+    finally:
+        # the calls already in flight can not be interrupted, they finish in background
+        executor.shutdown(wait=False)
+
+    errors = sum(1 for result in results if result["error"])
+    return build_reply_message(
+        errors > 0, f"{len(results) - errors} de {len(results)} elementos procesados", results, from_function="batch"
+    )
+
+
+def _batch_deadline(event, context):
+    deadline = float(event.get("deadline") or BATCH_DEADLINE)
+    if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+        # leave a second to build the response before the lambda is stopped
+        deadline = min(deadline, context.get_remaining_time_in_millis() / 1000 - 1)
+    return max(deadline, 0)
+
+
 def handler(event, context):
-    client = create_client(history)
     service = event.get("service")
     format = event.get("format", "json")
     data = event.get("data", None)
-    result = {"error": True, "message": "Ningun servicio utilizado"}
-
-    if service == "create_client":  # post_cliente
-        result = service_create_client(client, data)
-    elif service == "get_list_selection":
-        result = get_list_selection(client)
-    elif service == "get_address_pregunta":
-        result = get_address_pregunta(client)
-    elif service == "post_existe_cliente":
-        result = post_existe_cliente(client, data)
-    elif service == "get_preaprobado":
-        id_transaccion = data["idTransaccion"]
-        result = get_preaprobado(client, id_transaccion)
-    elif service == "post_cliente_radicacion":
-        result = post_cliente_radicacion(client, data)
-    elif service == "get_list_proyectos_by_constructora":
-        result = get_list_proyectos_by_constructora(client, data)
-
-    if format == "json" and not isinstance(result, str):
-        result = json.dumps(result, cls=CustomEncoder, default=str)
+
+    with trace("batch" if "batch" in event else service) as outcome, collect() as timings:
+        try:
+            operation = operations.get(service)
+            client = get_client() if "batch" in event or (operation is not None and operation.needs_client) else None
+            if "batch" in event:
+                concurrency = int(event.get("concurrency") or BATCH_CONCURRENCY)
+                result = run_batch(client, event["batch"], concurrency, _batch_deadline(event, context))
+            else:
+                result = dispatch(client, service, data)
+            outcome.failed = isinstance(result, dict) and result.get("error") is True
+
+            if format == "json" and not isinstance(result, str):
+                with stage("json"):
+                    result = to_json(result)
+        finally:
+            emit(timings, "batch" if "batch" in event else service)
 
     return result
@@ -0,0 +1,4 @@
+import os
+
+# the tests do not report to the sentry project of the lambda
+os.environ.setdefault("SENTRY_DSN", "")
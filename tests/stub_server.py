@@ -0,0 +1,175 @@
+"""
+Stand-in of the credifamilia api for load and latency tests. The responses of every operation are generated from
+the types of the dev WSDL, with configurable latency, faults, errors and size.
+
+    python -m tests.stub_server --port 8088 --latency 0.05 --fault-rate 0.01 --scale 10
+
+and point the lambda to it with CREDIFAMILIA_ENDPOINT=http://127.0.0.1:8088/
+"""
+import argparse
+import datetime
+import os
+import random
+import threading
+import time
+from collections import deque
+from decimal import Decimal
+
+from lxml import etree
+from zeep import Client, Settings
+from zeep.xsd import ComplexType
+
+from lib.parsers import NAMESPACES, SOAP_ENV_NS
+from lib.settings import BASE_DIR
+from tests.utils import FAULT_BODY, SOAP_ENVELOPE, LocalSoapServer
+
+DEV_WSDL = os.path.join(BASE_DIR, "lib/wsdl/credifamilia-dev.wsdl")
+
+# values of the leaf elements that the code reads, the rest get a generated text
+VALUES = {
+    "existe": False,
+    "mensaje": "El cliente no existe",
+    "recibido": True,
+    "radicado": True,
+    "estadoConsulta": "Finalizada",
+    "resultadPrevalidador": "Preaprobado",
+    "observacionesPrevalidador": "Sin observaciones",
+    "fechaRetomaSolicitud": "2021-07-19 00:00:00",
+    "tipoDocumento": "Cédula ciudadanía",
+    "urlCaptcha": "http://aplicaciones.adres.gov.co/COM_4023//Telerik.Web.UI.WebResource.axd?type=rca&isc=true",
+}
+LETTER_SIZE = 16 * 1024
+
+
+def sample_value(xsd_type, name: str, scale: int, index: int = 0):
+    """
+    build a value of a WSDL type with realistic data, unbounded elements get scale items and the
+    pre-approval letter scale * 16 KB
+    :param xsd_type: zeep type of the element
+    :param name: name of the element
+    :param scale: size of the generated responses
+    :param index: position of the value inside its list
+    """
+    if isinstance(xsd_type, ComplexType):
+        values = {}
+        for child_name, element in xsd_type.elements:
+            if element.max_occurs == "unbounded" or element.max_occurs > 1:
+                values[child_name] = [sample_value(element.type, child_name, scale, i) for i in range(scale)]
+            else:
+                values[child_name] = sample_value(element.type, child_name, scale, index)
+        return xsd_type(**values)
+
+    if name in VALUES:
+        return VALUES[name]
+    type_name = xsd_type.name
+    if type_name == "boolean":
+        return False
+    if type_name in ("long", "int", "integer"):
+        return 10000000 + index
+    if type_name == "decimal":
+        return Decimal("0.35")
+    if type_name == "base64Binary":
+        return (b"%PDF-1.4\n" + b"0" * LETTER_SIZE * scale)[: LETTER_SIZE * scale]
+    if type_name == "dateTime":
+        return datetime.datetime(2021, 7, 19)
+    if name == "value":
+        return str(index)
+    if name == "idTransaccion":
+        return "%032x" % random.getrandbits(128)
+    return f"{name} {index}"
+
+
+def generate_bodies(scale: int = 1, wsdl: str = DEV_WSDL) -> dict:
+    """
+    :param scale: size of the generated responses
+    :return: serialized body of the response of every operation of the WSDL
+    """
+    client = Client(wsdl, settings=Settings(strict=False, xml_huge_tree=True))
+    bodies = {}
+    for name, operation in client.service._binding._operations.items():
+        element = operation.output.body
+        body = etree.Element(etree.QName(SOAP_ENV_NS, "Body"), nsmap=NAMESPACES)
+        element.render(body, sample_value(element.type, name, scale))
+        bodies[name] = "".join(etree.tostring(child, encoding="unicode") for child in body)
+    return bodies
+
+
+class StubServer(LocalSoapServer):
+    """
+    LocalSoapServer that answers every operation of the WSDL
+    :param latency: seconds before answering, uniformly spread by latency_jitter
+    :param fault_rate: fraction of the requests answered with a soap fault
+    :param error_rate: fraction of the requests whose connection is closed without an answer
+    :param scale: size of the responses, items of the lists and 16 KB blocks of the pre-approval letter
+    :param operations: options of a single operation, ej. {"getPreaprobado": {"latency": 0.5}}
+    """
+
+    def __init__(
+        self,
+        latency: float = 0,
+        latency_jitter: float = 0,
+        fault_rate: float = 0,
+        error_rate: float = 0,
+        scale: int = 1,
+        operations: dict = None,
+        address=("127.0.0.1", 0),
+    ):
+        super().__init__(generate_bodies(scale), delay=latency, address=address)
+        self.options = {"latency": latency, "latency_jitter": latency_jitter, "fault_rate": fault_rate}
+        self.options["error_rate"] = error_rate
+        self.operations = operations or {}
+        self.fault = SOAP_ENVELOPE.format(
+            body=FAULT_BODY.format(faultstring="Error", code="STUB_ERR", description="Fallo inyectado")
+        ).encode("utf-8")
+        self.requests = deque(maxlen=100)
+        self.counts = {"requests": 0, "faults": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def option(self, operation, name):
+        return self.operations.get(operation, {}).get(name, self.options[name])
+
+    def respond(self, operation):
+        latency = self.option(operation, "latency")
+        jitter = self.option(operation, "latency_jitter")
+        time.sleep(max(0, latency + random.uniform(-jitter, jitter)))
+
+        draw = random.random()
+        fault_rate = self.option(operation, "fault_rate")
+        with self._lock:
+            self.counts["requests"] += 1
+            if draw < fault_rate:
+                self.counts["faults"] += 1
+            elif draw < fault_rate + self.option(operation, "error_rate"):
+                self.counts["errors"] += 1
+                return None
+        body = self.bodies.get(operation)
+        if draw < fault_rate or body is None:
+            return 500, self.fault
+        return 200, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in of the credifamilia api generated from the dev WSDL")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--latency", type=float, default=0, help="seconds before answering")
+    parser.add_argument("--latency-jitter", type=float, default=0)
+    parser.add_argument("--fault-rate", type=float, default=0, help="fraction answered with a soap fault")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of connections closed without answer")
+    parser.add_argument("--scale", type=int, default=1, help="items of the lists and 16 KB blocks of the letter")
+    args = parser.parse_args()
+
+    server = StubServer(
+        args.latency, args.latency_jitter, args.fault_rate, args.error_rate, args.scale, address=(args.host, args.port)
+    )
+    with server:
+        print(f"stub server listening on {server.url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,77 +1,78 @@
+import asyncio
+import csv
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import json
+import os
 import random
-from collections import OrderedDict
+import subprocess
+import sys
+from collections import OrderedDict, deque
+from decimal import Decimal
 from pydantic import ValidationError
+from sentry_sdk.transport import Transport as SentryTransport
+from requests.exceptions import ConnectionError, ReadTimeout
 
 import pytest
 from faker import Faker
+from lxml import etree
 from lxml.etree import Element, _Element
+from zeep import Settings
 from zeep.exceptions import Fault
-from lib.utils import create_client, get_detail_recursively
-from service import handler, history
-from tests.utils import get_list_proyectos_by_constructora
+from zeep.transports import Transport
+from zeep.wsse.signature import BinarySignature, _make_verify_key, _verify_envelope_with_key
+import lib.utils
+import lib.validation
+from lib.cache import FileBackend, MemoryBackend, TTLCache, build_backend, value_version
+from lib.idempotency import IdempotencyConflictError, IdempotencyStore, RequestInFlightError
+from lib.faults import SoapFault, decode_fault
+from lib.registry import Operation, OperationRegistry
+from lib.resilience import CircuitBreaker, CircuitOpenError, async_call_with_resilience, backoff, circuit_breaker
+from lib.signature import BinarySignatureTimestamp, load_key_material
+from lib.transport import PooledTransport, parse_operation_timeouts
+from lib.validation import RequestValidationError, check_request, get_request_validator
+from lib.wsdl_cache import build_artifact, load_document
+from lib.utils import async_call_service, call_service, clear_client_cache, create_async_client, serialize_soap_response, to_builtin, create_client, get_client, get_client_cache_stats, get_detail_recursively
+import async_service
+import filing_validator
+import models
+from factories import FILING_TYPES, CompiledModel, FilingFactory
+import lib.registry
+import lib.resilience
+import lib.timing
+import lib.tracing
+import service
+from service import get_preaprobado, handler, post_existe_cliente, service_create_client
+from tests.stub_server import StubServer
+from tests.utils import (
+    CLIENTE_EXISTE_BODY,
+    EXISTE_CLIENTE_BODY,
+    FAULT_BODY,
+    LIST_SELECTION,
+    LocalSoapServer,
+    PREAPROBADO_BODY,
+    RADICACION,
+    radicacion_data,
+    RESULTADO_CODEUDOR,
+    get_list_proyectos_by_constructora,
+    soap_response,
+    soap_router,
+)
 
 fake = Faker()
 
-CONSTRUCTORA = "Constructora Bolivar S.A"
 
-RADICACION = {
-    "service": "post_cliente_radicacion",
-    "data": {
-        "idTransaccion": "32258d905f9aba15f1e6427249cd18c9",
-        "lugarNacimiento": "76001",
-        "lugarExpedicionCedula": "76001",
-        "fechaExpedicionCedula": "2015-09-20T00:00:00",
-        "nacionalidad": "Colombia",
-        "nivelEducacion": "Pregrado (Graduado)",
-        "activos": "2700000",
-        "pasivos": "1000000",
-        "direccionResidencia": "Calle 74 # 02 - 10",
-        "ciudadResidencia": "76001",
-        "estrato": 3,
-        "tipoViviendaResidencia": "Familiar",
-        "nitEmpresa": "764363838",
-        "nombreEmpresa": "LQN",
-        "direccionEmpresa": "Calle 74 # 02 - 10",
-        "ciudadEmpresa": "76001",
-        "telefonoEmpresa": "80000000",
-        "trabajaSedeDiferente": False,
-        "cargo": "Desarrollador jefe",
-        "experienciaLaboral": 2,
-        "egresos": "500000",
-        "manejaRecursosPublicos": False,
-        "tieneVinculoPEP": False,
-        "referenciaPersonal": {
-            "nombres": "Mauricio Gonzales",
-            "parentesco": "Amigo(a)",
-            "ciudad": "76001",
-            "celular": "3876780000",
-        },
-        "referenciaFamiliar": {
-            "nombres": "Mauricio Gonzales",
-            "parentesco": "Hijo(a)",
-            "ciudad": "76001",
-            "celular": "3876780001",
-        },
-        "ip": "192.168.0.1",
-        "canal": "Web",
-        "vivienda": {
-            "tipoVivienda": "Usada",
-            "tipoInmueble": "Casa",
-            "destinoInmueble": "Renta",
-            "constructora": "Constructora Bolivar S.A",
-            "tieneParqueadero": True,
-            "tipoParqueadero": "Cubierto",
-            "modalidadCredito": "Uvr",
-            "plazoCredito": "20",
-            "valorInmueble": "240000000",
-            "creditoSolicitadoValorAFinanciar": "120000000",
-            "recursosPropios": "24000000",
-            "subsidioVivienda": "240000000",
-        },
-    },
-}
+@pytest.fixture(autouse=True)
+def closed_circuit():
+    # the breaker is shared by the whole process, the failures of a test must not reject the calls of the next one
+    circuit_breaker.reset()
+    yield
+    circuit_breaker.reset()
+
+CONSTRUCTORA = "Constructora Bolivar S.A"
 
 RANDOM_EMPTY_FIELDS = [
     "ip",
@@ -255,6 +256,55 @@ def test_service_create_client_error_empty_field():
     assert expected_result["message"] == result["message"]
 
 
+def test_service_create_client_rejects_values_outside_catalogs(monkeypatch):
+    list_selection_cache = TTLCache("test", ttl=10)
+    list_selection_cache.refresh(service.ENV, lambda: LIST_SELECTION)
+    monkeypatch.setattr(service, "list_selection_cache", list_selection_cache)
+    client = create_client()
+    calls = []
+    client.transport.post_xml = soap_router({"postExisteCliente": EXISTE_CLIENTE_BODY.format(mensaje="")}, calls)
+
+    result = service_create_client(client, {**data_sin_codeudor, "estadoCivil": "Viudo"})
+    assert result["error"] is True
+    assert result["message"] == "Error al crear cliente: estadoCivil: El valor 'Viudo' no es válido."
+    assert calls == ["postExisteCliente"]
+
+
+def test_service_create_client_checks_the_schema_once(monkeypatch):
+    list_selection_cache = TTLCache("test", ttl=10)
+    list_selection_cache.refresh(service.ENV, lambda: LIST_SELECTION)
+    monkeypatch.setattr(service, "list_selection_cache", list_selection_cache)
+    checked = []
+    errors = lib.validation.RequestValidator.errors
+    monkeypatch.setattr(
+        lib.validation.RequestValidator,
+        "errors",
+        lambda validator, operation, request: checked.append(operation) or errors(validator, operation, request),
+    )
+    client = create_client()
+    calls = []
+    fault = FAULT_BODY.format(faultstring="Error", code="CTE_ERR", description="Rechazado")
+    bodies = {"postExisteCliente": EXISTE_CLIENTE_BODY.format(mensaje=""), "postCliente": fault}
+    client.transport.post_xml = soap_router(bodies, calls)
+
+    with pytest.raises(Fault):
+        service_create_client(client, data_sin_codeudor)
+    assert calls == ["postExisteCliente", "postCliente"]
+    assert checked.count("postCliente") == 1
+
+
+def test_service_create_client_existing_client_serial(monkeypatch):
+    monkeypatch.setattr(service, "CREATE_CLIENT_PIPELINE", "serial")
+    client = create_client()
+    calls = []
+    client.transport.post_xml = soap_router({"postExisteCliente": CLIENTE_EXISTE_BODY}, calls)
+
+    result = service_create_client(client, data_sin_codeudor)
+    assert result["error"] is False
+    assert result["message"] == "Lead en gestión por otro canal"
+    assert calls == ["postExisteCliente"]
+
+
 # ------------------------ get_list_selection ------------------------
 
 
@@ -388,6 +438,125 @@ def test_get_list_selection_raw_elements():
     assert expected_result == result["listCiudadResidencia"]["field"]
 
 
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_serves_fresh_values_without_loading():
+    clock = FakeClock()
+    cache = TTLCache("test", ttl=10, clock=clock)
+    loads = []
+    loader = lambda: loads.append(1) or {"listSexo": {"field": []}}
+
+    assert cache.get_or_load("DEV", loader) == {"listSexo": {"field": []}}
+    clock.now = 9
+    cache.get_or_load("DEV", loader)
+    assert len(loads) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_cache_stale_while_revalidate():
+    clock = FakeClock()
+    cache = TTLCache("test", ttl=10, stale_ttl=10, clock=clock)
+    cache.get_or_load("DEV", lambda: {"version": 1})
+    version = cache.version("DEV")
+
+    clock.now = 15
+    refreshed = threading.Event()
+    assert cache.get_or_load("DEV", lambda: refreshed.set() or {"version": 2}) == {"version": 1}
+    assert refreshed.wait(1)
+    for _ in range(100):
+        if cache.stats()["refreshes"] == 2:
+            break
+        time.sleep(0.01)
+
+    assert cache.get_or_load("DEV", lambda: {"version": 3}) == {"version": 2}
+    assert cache.version("DEV") != version
+    assert cache.stats()["changes"] == 1
+
+    clock.now = 40
+    assert cache.get_or_load("DEV", lambda: {"version": 3}) == {"version": 3}
+
+
+def test_resilience_stats_report_list_selection_version(monkeypatch):
+    cache = TTLCache("test", ttl=10)
+    monkeypatch.setattr(service, "list_selection_cache", cache)
+    lists = {"listSexo": {"field": []}}
+    cache.get_or_load(service.ENV, lambda: lists)
+
+    stats = handler({"service": "get_resilience_stats", "format": "dict"}, None)["payload"]
+    assert stats["caches"]["list_selection"]["version"] == value_version(lists)
+    assert stats["caches"]["list_selection"]["changes"] == 0
+
+
+def test_ttl_cache_persistent_tier(tmp_path):
+    for backend in (FileBackend(str(tmp_path)), MemoryBackend()):
+        TTLCache("test", ttl=10, backend=backend).get_or_load("DEV", lambda: {"listSexo": {"field": []}})
+
+        cold_cache = TTLCache("test", ttl=10, backend=backend)
+        assert cold_cache.get_or_load("DEV", lambda: pytest.fail("backend not used")) == {"listSexo": {"field": []}}
+
+        cold_cache.invalidate("DEV")
+        assert backend.get("test:DEV") is None
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache("test", ttl=10, max_entries=2)
+    cache.get_or_load("Constructora Bolivar S.A", lambda: {"listProyectos": 1})
+    cache.get_or_load("Amarilo", lambda: {"listProyectos": 2})
+    cache.get_or_load("Constructora Bolivar S.A", lambda: pytest.fail("cache not used"))
+    cache.get_or_load("Marval", lambda: {"listProyectos": 3})
+
+    assert cache.version("Amarilo") is None
+    assert cache.version("Constructora Bolivar S.A") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_proyectos_by_constructora():
+    service.proyectos_cache.get_or_load(CONSTRUCTORA, lambda: {"listProyectos": None})
+    result = handler({"service": "invalidate_proyectos_by_constructora", "data": {"nombre": CONSTRUCTORA}}, None)
+    result = json.loads(result)
+
+    assert result["error"] is False
+    assert service.proyectos_cache.version(CONSTRUCTORA) is None
+
+
+def test_invalidate_proyectos_needs_nombre_or_all(monkeypatch):
+    monkeypatch.setattr(service, "proyectos_cache", TTLCache("test", ttl=10))
+    service.proyectos_cache.get_or_load(CONSTRUCTORA, lambda: {"listProyectos": None})
+
+    result = handler({"service": "invalidate_proyectos_by_constructora", "format": "dict"}, None)
+    assert result["error"] is True
+    stats = handler({"service": "get_resilience_stats", "format": "dict"}, None)["payload"]
+    assert stats["caches"]["proyectos"]["size"] == 1
+
+    event = {"service": "invalidate_proyectos_by_constructora", "data": {"all": True}, "format": "dict"}
+    result = handler(event, None)
+    assert result["error"] is False and result["payload"]["size"] == 0
+
+
+def test_get_list_proyectos_without_data_skips_the_cache(monkeypatch):
+    calls = []
+    monkeypatch.setattr(service, "get_client", lambda: None)
+    monkeypatch.setattr(
+        service,
+        "get_list_proyectos_by_constructora",
+        lambda client, data: calls.append(data) or {"listProyectos": None},
+    )
+    size = service.proyectos_cache.stats()["size"]
+
+    for _ in range(2):
+        result = handler({"service": "get_list_proyectos_by_constructora", "format": "dict"}, None)
+        assert result == {"listProyectos": None}
+    assert calls == [None, None]
+    assert service.proyectos_cache.stats()["size"] == size
+
+
 # ------------------------ get_address_pregunta ------------------------
 
 
@@ -458,6 +627,572 @@ def test_get_preaprobado_id():
     )
 
 
+def test_get_preaprobado_extracts_result():
+    client = create_client()
+    body = PREAPROBADO_BODY.format(
+        carta="JVBERi0xLjQ=", codeudores=RESULTADO_CODEUDOR.format(monto=1, numero_documento=10000000)
+    )
+    client.transport.post_xml = lambda address, envelope, headers: soap_response(body)
+
+    result = get_preaprobado(client, "1128bd688fb4eeaf8ae2b4965cf2ab4b")
+    assert result == {
+        "result_client": {
+            "@xsi:type": "ax28:ResultadoCliente",
+            "estadoConsulta": "Disponible para consulta",
+            "fechaRetomaSolicitud": {"@xsi:nil": "true"},
+            "observacionesPrevalidador": "Consulta exitosa",
+            "resultadPrevalidador": "VIABLE",
+        },
+        "result_client_detail": {
+            "@xsi:type": "ax28:Detalle",
+            "LTVPrevalidado": "70.0",
+            "endeudamientoFinancieroPrevalidado": "14.917695473251028",
+            "montoSugeridoPreaprobado": "102260992",
+            "relacionCuotaIngresoPrevalidado": "33.0",
+        },
+        "preaproved_letter": "JVBERi0xLjQ=",
+    }
+
+
+# ------------------------ faults ------------------------
+
+
+def test_decode_fault():
+    body = FAULT_BODY.format(faultstring="Error de validación", code="RAD_CTE_ERR", description="Transacción inválida")
+    envelope = etree.fromstring(soap_response(body).content)
+    fault = decode_fault(envelope)
+    assert fault == SoapFault("Error de validación", "RAD_CTE_ERR", "Transacción inválida")
+    assert fault.message == "Error de validación. Transacción inválida"
+
+
+def test_decode_fault_without_fault():
+    envelope = etree.fromstring(soap_response(EXISTE_CLIENTE_BODY.format(mensaje="")).content)
+    assert decode_fault(envelope) is None
+
+
+def test_capture_soap_error_decodes_fault():
+    client = create_client()
+    body = FAULT_BODY.format(faultstring="Error", code="RAD_CTE_ERR", description="Ya existe")
+    client.transport.post_xml = lambda address, envelope, headers: soap_response(body, status_code=500)
+
+    with pytest.raises(Fault) as error:
+        post_existe_cliente(client, {"numeroDocumento": 1})
+    assert error.value.soap_fault == SoapFault("Error", "RAD_CTE_ERR", "Ya existe")
+
+
+# ------------------------ signature ------------------------
+
+
+def build_envelope():
+    client = create_client()
+    client.wsse = None
+    return client.create_message(client.service, "postExisteCliente", request={"numeroDocumento": 1})
+
+
+def test_key_material_token_matches_binary_security_token():
+    envelope = build_envelope()
+    BinarySignature(lib.utils.KEY_FILE, lib.utils.CERT_FILE).apply(envelope, {})
+    token = envelope.find(".//{*}BinarySecurityToken").text.replace("\n", "")
+
+    assert load_key_material(lib.utils.KEY_FILE, lib.utils.CERT_FILE).token == token
+
+
+def test_signature_uses_key_identifier():
+    envelope = build_envelope()
+    BinarySignatureTimestamp(key_file=lib.utils.KEY_FILE, certfile=lib.utils.CERT_FILE).apply(envelope, {})
+
+    security = envelope.find(".//{*}Security")
+    assert [etree.QName(child).localname for child in security] == ["Signature"]
+    reference = security.find(".//{*}SecurityTokenReference")
+    assert [etree.QName(child).localname for child in reference] == ["KeyIdentifier"]
+    assert reference[0].text == load_key_material(lib.utils.KEY_FILE, lib.utils.CERT_FILE).token
+    _verify_envelope_with_key(envelope, _make_verify_key(open(lib.utils.CERT_FILE, "rb").read()))
+
+
+def test_key_material_reloads_when_files_change(tmp_path):
+    key_file, cert_file = tmp_path / "key.pem", tmp_path / "certificate.pem"
+    key_file.write_bytes(open(lib.utils.KEY_FILE, "rb").read())
+    cert_file.write_bytes(open(lib.utils.CERT_FILE, "rb").read())
+    signer = BinarySignatureTimestamp(key_file=str(key_file), certfile=str(cert_file))
+
+    signer.apply(build_envelope(), {})
+    material = load_key_material(str(key_file), str(cert_file))
+    signer.apply(build_envelope(), {})
+    assert load_key_material(str(key_file), str(cert_file)) is material
+
+    cert_file.write_bytes(cert_file.read_bytes() + b"\n")
+    signer.apply(build_envelope(), {})
+    assert load_key_material(str(key_file), str(cert_file)) is not material
+
+
+# ------------------------ batch ------------------------
+
+
+def test_batch_results_in_order_with_errors(monkeypatch):
+    client = create_client()
+    fault = FAULT_BODY.format(faultstring="Error", code="PRE_ERR", description="No existe")
+
+    def post_xml(address, envelope, headers):
+        if "getPreaprobado" in headers["SOAPAction"]:
+            return soap_response(fault, status_code=500)
+        numero_documento = envelope.find(".//{*}numeroDocumento").text
+        time.sleep(random.random() / 100)
+        return soap_response(EXISTE_CLIENTE_BODY.format(mensaje=numero_documento))
+
+    client.transport.post_xml = post_xml
+    monkeypatch.setattr(service, "get_client", lambda: client)
+    batch = [{"service": "post_existe_cliente", "data": {"numeroDocumento": numero}} for numero in range(1, 11)]
+    batch.insert(3, {"service": "get_preaprobado", "data": {"idTransaccion": "1"}})
+    batch.insert(5, {"service": "get_preaprobado"})
+
+    result = handler({"batch": batch, "concurrency": 4, "format": "dict"}, None)
+    assert result["error"] is True
+    assert result["message"] == "10 de 12 elementos procesados"
+    items = result["payload"]
+    assert [item["index"] for item in items] == list(range(12))
+    assert items[3]["error"] is True and items[3]["message"] == "Error. No existe"
+    assert items[5]["error"] is True and items[5]["message"].startswith("TypeError")
+    mensajes = [item["result"]["mensaje"] for item in items if item["service"] == "post_existe_cliente"]
+    assert mensajes == [str(numero) for numero in range(1, 11)]
+
+
+def test_batch_limits_concurrency_per_operation(monkeypatch):
+    in_flight = {"slow": 0, "fast": 0}
+    peaks = {"slow": 0, "fast": 0}
+    lock = threading.Lock()
+
+    def call(name):
+        def handler(client, data):
+            with lock:
+                in_flight[name] += 1
+                peaks[name] = max(peaks[name], in_flight[name])
+            time.sleep(0.02)
+            with lock:
+                in_flight[name] -= 1
+            return {"error": False}
+
+        return handler
+
+    registry = OperationRegistry()
+    registry.register(Operation("slow", call("slow"), concurrency=1))
+    registry.register(Operation("fast", call("fast")))
+    monkeypatch.setattr(service, "operations", registry)
+
+    batch = [{"service": name} for name in ("slow", "fast") * 4]
+    result = service.run_batch(None, batch, concurrency=4)
+    assert result["error"] is False
+    assert peaks["slow"] == 1
+    assert peaks["fast"] > 1
+
+
+def test_batch_deadline():
+    client = create_client()
+
+    def post_xml(address, envelope, headers):
+        time.sleep(0.3)
+        return soap_response(EXISTE_CLIENTE_BODY.format(mensaje="ok"))
+
+    client.transport.post_xml = post_xml
+    batch = [{"service": "post_existe_cliente", "data": {"numeroDocumento": numero}} for numero in range(3)]
+
+    result = service.run_batch(client, batch, concurrency=2, deadline=0.1)
+    assert [item["message"] for item in result["payload"]] == ["Tiempo límite del lote agotado"] * 3
+
+
+# ------------------------ operations ------------------------
+
+
+def test_operation_registry():
+    assert {operation.name for operation in lib.registry.operations} == {
+        operation.name for operation in async_service.async_operations
+    }
+    radicacion = lib.registry.operations.get("post_cliente_radicacion")
+    assert async_service.async_operations.get("post_cliente_radicacion")[2:] == radicacion[2:]
+    assert lib.registry.operations.get("get_list_selection").cacheable
+    assert lib.registry.operations.get("get_list_selection").ttl == service.list_selection_cache.ttl
+    assert not radicacion.idempotent and radicacion.validate(radicacion_data())["vivienda"]
+
+    with pytest.raises(ValueError):
+        lib.registry.operations.register(radicacion)
+
+
+def test_dispatch_validates_and_caches(monkeypatch):
+    calls = []
+    registry = OperationRegistry()
+    registry.register(
+        Operation(
+            "echo",
+            lambda client, data: calls.append(data) or data,
+            input_model="json:loads",
+            cache=TTLCache("echo", ttl=10),
+            cache_key=lambda data: data["key"],
+        )
+    )
+    monkeypatch.setattr(service, "operations", registry)
+
+    assert service.dispatch(None, "echo", '{"key": "a"}') == {"key": "a"}
+    assert service.dispatch(None, "echo", '{"key": "a"}') == {"key": "a"}
+    assert calls == [{"key": "a"}]
+    assert service.dispatch(None, "unknown", None) == {"error": True, "message": "Ningun servicio utilizado"}
+
+
+def test_handler_skips_client_for_local_operations(monkeypatch):
+    def get_client():
+        raise AssertionError("the client is not needed")
+
+    monkeypatch.setattr(service, "get_client", get_client)
+    result = handler({"service": "invalidate_proyectos_by_constructora", "data": {"all": True}, "format": "dict"}, None)
+    assert result["message"] == "Cache de proyectos invalidado"
+
+
+# ------------------------ resilience ------------------------
+
+
+def test_retries_only_idempotent_operations(monkeypatch):
+    monkeypatch.setattr(lib.resilience, "backoff", lambda attempt: 0)
+    client = create_client()
+    calls = []
+
+    def post_xml(address, envelope, headers):
+        calls.append(headers["SOAPAction"])
+        if len(calls) % 3:
+            raise ConnectionError("connection reset")
+        return soap_response(EXISTE_CLIENTE_BODY.format(mensaje="ok"))
+
+    client.transport.post_xml = post_xml
+    retries = circuit_breaker.stats()["retries"]
+    assert call_service(client, "postExisteCliente", request={"numeroDocumento": 1}).result.mensaje == "ok"
+    assert len(calls) == 3
+    assert circuit_breaker.stats()["retries"] == retries + 2
+
+    calls.clear()
+    with pytest.raises(ConnectionError):
+        call_service(client, "postCliente", request={})
+    assert len(calls) == 1
+
+
+def test_circuit_breaker_opens_and_recovers():
+    now = [0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    now[0] = 10
+    trial = breaker.before_call()
+    assert trial is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure(trial)
+    assert breaker.state == "open"
+
+    now[0] = 20
+    breaker.record_success(breaker.before_call())
+    assert breaker.state == "closed"
+    assert breaker.before_call() is False
+    assert breaker.stats()["trips"] == 2 and breaker.stats()["rejected"] == 2
+    assert all(0 <= backoff(attempt, 0.2, 2) <= 2 for attempt in range(10))
+
+
+def test_circuit_breaker_trial_is_freed_only_by_its_call():
+    now = [0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    late = breaker.before_call()
+    breaker.record_failure(breaker.before_call())
+    now[0] = 10
+    trial = breaker.before_call()
+
+    # a call that started before the circuit opened ends while the trial is in flight
+    breaker.release(late)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.release(trial)
+    assert breaker.before_call() is True
+
+
+def test_async_call_with_resilience_frees_the_trial_when_cancelled():
+    now = [0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure(breaker.before_call())
+    now[0] = 10
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(async_call_with_resilience("postExisteCliente", cancelled, breaker, lib.registry.operations))
+    assert breaker.before_call() is True
+
+
+def test_handler_fails_fast_while_circuit_is_open(monkeypatch):
+    client = create_client()
+    client.transport.post_xml = lambda *args: pytest.fail("credifamilia must not be called")
+    monkeypatch.setattr(service, "get_client", lambda: client)
+    before = circuit_breaker.stats()
+    for _ in range(circuit_breaker.failure_threshold):
+        circuit_breaker.record_failure()
+
+    result = handler({"service": "post_existe_cliente", "format": "dict", "data": {"numeroDocumento": 1}}, None)
+    assert result["error"] is True
+    assert result["message"].startswith("Credifamilia no disponible")
+
+    stats = handler({"service": "get_resilience_stats", "format": "dict"}, None)["payload"]
+    assert stats["state"] == "open"
+    assert stats["trips"] == before["trips"] + 1 and stats["rejected"] == before["rejected"] + 1
+    assert stats["clients"] == get_client_cache_stats()
+
+
+# ------------------------ idempotency ------------------------
+
+
+@pytest.fixture(params=["memory", "file", "sqlite"])
+def submissions(request, tmp_path):
+    backend = build_backend(request.param, directory=str(tmp_path), path=str(tmp_path / "idempotency.sqlite3"))
+    return IdempotencyStore("test", backend=backend, in_flight_timeout=5, wait_timeout=1, poll_interval=0.01)
+
+
+def test_idempotency_store_replays_completed_submissions(submissions):
+    calls = []
+
+    def submit():
+        calls.append(1)
+        return {"error": False, "message": "ok", "payload": len(calls), "timings": {"soap:postCliente": 1}}
+
+    assert submissions.run("1", "a", submit)["payload"] == 1
+    assert submissions.run("1", "a", submit) == {"error": False, "message": "ok", "payload": 1}
+    assert submissions.run(None, "a", submit)["payload"] == 2
+    with pytest.raises(IdempotencyConflictError):
+        submissions.run("1", "b", submit)
+    assert submissions.stats()["replays"] == 1 and submissions.stats()["conflicts"] == 1
+
+
+def test_idempotency_store_releases_errors(submissions):
+    assert submissions.run("1", "a", lambda: {"error": True, "message": "fault"})["error"] is True
+    with pytest.raises(ValueError):
+        submissions.run("1", "a", lambda: int("x"))
+    assert submissions.run("1", "a", lambda: {"error": False})["error"] is False
+
+
+def test_idempotency_store_in_flight(submissions, monkeypatch):
+    now = [1000.0]
+    submissions.clock = lambda: now[0]
+    submissions.backend.add("test:1", {"state": "in_flight", "fingerprint": "a", "updated_at": now[0]})
+
+    def sleep(seconds):
+        now[0] += 0.5
+
+    monkeypatch.setattr(time, "sleep", sleep)
+    with pytest.raises(RequestInFlightError):
+        submissions.run("1", "a", lambda: pytest.fail("the submission is in flight"))
+
+    now[0] += submissions.in_flight_timeout
+    assert submissions.run("1", "a", lambda: {"error": False, "message": "retomada"})["message"] == "retomada"
+    assert submissions.stats()["takeovers"] == 1
+
+
+def test_handler_replays_repeated_radicacion(monkeypatch):
+    store = IdempotencyStore("test", backend=MemoryBackend(), poll_interval=0.01)
+    monkeypatch.setattr(service, "idempotency_store", store)
+    client = create_client()
+    monkeypatch.setattr(service, "get_client", lambda: client)
+    event = {"service": "post_cliente_radicacion", "data": radicacion_data()}
+
+    with StubServer(operations={"postClienteRadicacion": {"latency": 0.2}}) as server:
+        client.transport.endpoint = server.url
+        batch = handler({"batch": [event, event], "format": "dict"}, None)
+        repeated = handler({**event, "format": "dict"}, None)
+
+    assert [item["result"] for item in batch["payload"]] == [True, True]
+    assert repeated is True
+    assert server.counts["requests"] == 1
+    assert store.stats()["waits"] == 1 and store.stats()["replays"] == 2
+
+
+# ------------------------ filing validation ------------------------
+
+
+def _filing_outcome(validate, profile):
+    try:
+        return validate(profile)
+    except ValidationError as error:
+        return error.errors()
+
+
+@pytest.mark.parametrize("profile_type", list(FILING_TYPES))
+def test_compiled_filing_matches_model(profile_type):
+    valid = radicacion_data(profile_type)
+    coerced = {**radicacion_data(profile_type), "estrato": "3", "activos": 2700000, "nombrePEP": None}
+    invalid = radicacion_data(profile_type)
+    invalid.pop("ip")
+    invalid.update(estrato="tres", manejaRecursosPublicos="tal vez")
+    invalid["vivienda"]["plazoCredito"] = "veinte"
+    invalid["vivienda"].pop("proyecto")
+
+    for profile in (valid, coerced, invalid):
+        expected = _filing_outcome(lambda data: FilingFactory.get_filing(data).dict(exclude_unset=True), profile)
+        assert _filing_outcome(FilingFactory.get_request, profile) == expected
+    assert "type" not in FilingFactory.get_request(valid)
+    assert FilingFactory.get_request(coerced)["estrato"] == 3
+
+
+def test_compiled_model_falls_back_to_models_with_validators():
+    from pydantic import root_validator
+
+    class Checked(models.Reference):
+        @root_validator
+        def same_city(cls, values):
+            assert values.get("ciudad") == "76001", "ciudad fuera de cobertura"
+            return values
+
+    plan = CompiledModel(Checked)
+    reference = {"nombres": "Ana", "parentesco": "Amigo(a)", "ciudad": "76001", "celular": 3001234567}
+    assert not plan.compiled and plan.validate(reference)["celular"] == "3001234567"
+    with pytest.raises(ValidationError):
+        plan.validate({**reference, "ciudad": "11001"})
+
+
+def test_handler_does_not_replay_existing_client(monkeypatch):
+    store = IdempotencyStore("test", backend=MemoryBackend(), poll_interval=0.01)
+    monkeypatch.setattr(service, "idempotency_store", store)
+    monkeypatch.setattr(service, "CREATE_CLIENT_PIPELINE", "serial")
+    client = create_client()
+    monkeypatch.setattr(service, "get_client", lambda: client)
+    calls = []
+    client.transport.post_xml = soap_router({"postExisteCliente": CLIENTE_EXISTE_BODY}, calls)
+
+    first = handler({"service": "create_client", "data": data_sin_codeudor, "format": "dict"}, None)
+    corrected = {**data_sin_codeudor, "ingresosMensuales": 3100000}
+    second = handler({"service": "create_client", "data": corrected, "format": "dict"}, None)
+
+    assert first["message"] == second["message"] == "Lead en gestión por otro canal"
+    assert calls == ["postExisteCliente", "postExisteCliente"]
+    assert store.stats()["conflicts"] == 0 and store.stats()["released"] == 2
+
+
+# ------------------------ filing validator ------------------------
+
+
+def test_filing_validator_reports_errors_per_line(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(lib.utils, "create_client", lambda: pytest.fail("the validator must run offline"))
+    invalid = radicacion_data()
+    invalid["vivienda"]["plazoCredito"] = "veinte"
+    unknown_parentesco = radicacion_data()
+    unknown_parentesco["referenciaFamiliar"]["parentesco"] = "Vecino(a)"
+    lines = [json.dumps(radicacion_data()), json.dumps(invalid), "", "{roto", json.dumps(unknown_parentesco)]
+    filings = tmp_path / "filings.jsonl"
+    filings.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    catalogs = tmp_path / "list_selection.json"
+    catalogs.write_text(
+        json.dumps({"payload": {"listParentescoFamiliar": {"field": [{"label": "Hijo", "value": "Hijo(a)"}]}}})
+    )
+    output = tmp_path / "errors.jsonl"
+
+    status = filing_validator.main(
+        [str(filings), "--output", str(output), "--catalogs", str(catalogs), "--workers", "2", "--chunksize", "1"]
+    )
+
+    results = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert status == 1
+    assert [result["line"] for result in results] == [2, 4, 5]
+    assert results[0]["errors"] == ["vivienda.plazoCredito: value is not a valid integer"]
+    assert results[1]["errors"][0].startswith("JSON inválido")
+    assert results[2]["errors"] == ["referenciaFamiliar.parentesco: El valor 'Vecino(a)' no es válido."]
+    assert "4 radicaciones, 1 válidas, 3 con errores" in capsys.readouterr().err
+
+
+def test_filing_validator_reads_csv_with_nested_columns(tmp_path):
+    filing = radicacion_data("pensioner")
+    row = {name: value for name, value in filing.items() if not isinstance(value, dict)}
+    for parent in ("vivienda", "referenciaPersonal", "referenciaFamiliar"):
+        row.update({f"{parent}.{name}": value for name, value in filing[parent].items()})
+    filings = tmp_path / "filings.csv"
+    with open(filings, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=list(row))
+        writer.writeheader()
+        writer.writerow(row)
+        writer.writerow({**row, "estrato": "", "vivienda.valorInmueble": "muchos"})
+    output = io.StringIO()
+
+    report = filing_validator.validate_file(str(filings), output, write_valid=True)
+
+    valid, invalid = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert report["records"] == 2 and report["valid"] == 1 and report["records_per_second"] > 0
+    assert valid == {"line": 2, "idTransaccion": filing["idTransaccion"], "errors": []}
+    assert invalid["errors"] == ["estrato: field required", "vivienda.valorInmueble: value is not a valid integer"]
+
+
+# ------------------------ preflight validation ------------------------
+
+
+def test_request_validator_reports_every_error():
+    request = json.loads(json.dumps(data))
+    request.update(numeroDocumento="abc", celular=True, fechaNacimiento="20/09/1997", apodo="Pepe")
+    request["codeudor"]["aportaIngresos"] = "si"
+
+    assert get_request_validator().errors("postCliente", request) == [
+        "numeroDocumento: El valor 'abc' no es válido, se esperaba un número entero.",
+        "fechaNacimiento: El valor '20/09/1997' no es válido, se esperaba una fecha AAAA-MM-DDTHH:MM:SS.",
+        "celular: El valor 'True' no es válido, se esperaba un número entero.",
+        "codeudor.aportaIngresos: El valor 'si' no es válido, se esperaba true o false.",
+        "apodo: El campo no existe en el WSDL.",
+    ]
+    assert get_request_validator().errors("postCliente", data) == []
+
+
+def test_request_validator_checks_radicacion_in_microseconds():
+    request = FilingFactory.get_request(radicacion_data())
+    validator = get_request_validator()
+    assert validator.errors("postClienteRadicacion", request) == []
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        validator.errors("postClienteRadicacion", request)
+    assert (time.perf_counter() - started) / 1000 < 0.001
+
+    request["vivienda"]["plazoCredito"] = "veinte"
+    with pytest.raises(RequestValidationError) as error:
+        check_request("postClienteRadicacion", request)
+    assert error.value.errors == [
+        "vivienda.plazoCredito: El valor 'veinte' no es válido, se esperaba un número entero."
+    ]
+
+
+def test_request_validator_warns_of_operations_missing_in_the_wsdl(monkeypatch, capsys):
+    monkeypatch.setattr(lib.validation, "_validators", {})
+    validator = get_request_validator("lib/wsdl/credifamilia-prd.wsdl")
+
+    assert capsys.readouterr().out == (
+        "SOAP_PREFLIGHT_OPERATIONS not in the schema of lib/wsdl/credifamilia-prd.wsdl, not validated: "
+        "postClienteRadicacion\n"
+    )
+    assert validator.errors("postClienteRadicacion", {"vivienda": {"plazoCredito": "veinte"}}) == []
+    get_request_validator("lib/wsdl/credifamilia-prd.wsdl")
+    assert capsys.readouterr().out == ""
+
+
+def test_handler_rejects_invalid_requests_before_sending(monkeypatch):
+    client = create_client()
+    monkeypatch.setattr(service, "get_client", lambda: client)
+    radicacion = radicacion_data()
+    radicacion["vivienda"]["fechaEstimadaEntrega"] = "2030/01/01"
+    cliente = {**data, "numeroDocumento": "abc"}
+
+    with StubServer() as server:
+        client.transport.endpoint = server.url
+        filing = handler({"service": "post_cliente_radicacion", "data": radicacion, "format": "dict"}, None)
+        created = handler({"service": "create_client", "data": cliente, "format": "dict"}, None)
+
+    assert filing["error"] is True and filing["payload"]["errors"] == [
+        "vivienda.fechaEstimadaEntrega: El valor '2030/01/01' no es válido, se esperaba una fecha AAAA-MM-DDTHH:MM:SS."
+    ]
+    assert created["error"] is True and created["payload"]["errors"][0].startswith("numeroDocumento:")
+    assert server.counts["requests"] == 0
+
+
 # ------------------------ utils ------------------------
 
 
@@ -476,6 +1211,379 @@ def test_get_detail_recursively_bytes():
     assert expected_result == result
 
 
+# ------------------------ client cache ------------------------
+
+
+def test_get_client_reuses_warm_client():
+    clear_client_cache()
+    client = get_client()
+    assert client is get_client()
+    assert get_client_cache_stats() == {"hits": 1, "misses": 1, "size": 1}
+
+    stats = handler({"service": "get_resilience_stats", "format": "dict"}, None)["payload"]
+    assert stats["clients"] == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_get_client_rebuilds_when_certificate_changes(tmp_path, monkeypatch):
+    cert_file = tmp_path / "certificate.pem"
+    cert_file.write_bytes(open(lib.utils.CERT_FILE, "rb").read())
+    monkeypatch.setattr(lib.utils, "CERT_FILE", str(cert_file))
+    clear_client_cache()
+    client = get_client()
+
+    cert_file.write_bytes(cert_file.read_bytes() + b"\n")
+    assert client is not get_client()
+    assert get_client_cache_stats()["misses"] == 2
+
+
+# ------------------------ call_service ------------------------
+
+
+def test_call_service_captures_envelope_per_call():
+    client = create_client()
+
+    def post_xml(address, envelope, headers):
+        numero_documento = envelope.find(".//{*}numeroDocumento").text
+        time.sleep(random.random() / 100)
+        return soap_response(EXISTE_CLIENTE_BODY.format(mensaje=numero_documento))
+
+    client.transport.post_xml = post_xml
+
+    def existe_cliente(numero_documento):
+        request = {"tipoDocumento": "Cédula ciudadanía", "numeroDocumento": numero_documento, "origen": "LQN"}
+        response = call_service(client, "postExisteCliente", request=request)
+        return response.result.mensaje, response.envelope.find(".//{*}mensaje").text
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(existe_cliente, range(10000000, 10000032)))
+
+    assert all(result == envelope for result, envelope in results)
+
+
+# ------------------------ transport ------------------------
+
+
+def test_pooled_transport_reuses_connection():
+    client = create_client()
+    request = {"tipoDocumento": "Cédula ciudadanía", "numeroDocumento": 10000000, "origen": "LQN"}
+    with LocalSoapServer(EXISTE_CLIENTE_BODY.format(mensaje="ok")) as server:
+        client.transport.endpoint = server.url
+        for _ in range(3):
+            assert call_service(client, "postExisteCliente", request=request).result.mensaje == "ok"
+
+    assert len(server.requests) == 3
+    assert server.connections == 1
+
+
+def test_pooled_transport_operation_timeout():
+    client = create_client()
+    client.transport.operation_timeouts = {"postExisteCliente": 0.05}
+    with LocalSoapServer(EXISTE_CLIENTE_BODY.format(mensaje="ok"), delay=0.5) as server:
+        client.transport.endpoint = server.url
+        with pytest.raises(ReadTimeout):
+            call_service(client, "postExisteCliente", request={"numeroDocumento": 1})
+
+
+def test_parse_operation_timeouts():
+    assert parse_operation_timeouts("getListSelection=60, postCliente=4.5,") == {
+        "getListSelection": 60.0,
+        "postCliente": 4.5,
+    }
+    transport = PooledTransport(connect_timeout=1, read_timeout=10, operation_timeouts={"postCliente": 4.5})
+    assert transport.timeout_for("postCliente") == (1, 4.5)
+    assert transport.timeout_for("getListSelection") == (1, 60)
+    assert transport.timeout_for("postExisteCliente") == (1, 10)
+
+
+def test_transport_takes_the_registry_explicitly(monkeypatch):
+    registry = OperationRegistry()
+    registry.register(Operation("consulta", lambda client, data: None, "postExisteCliente", idempotent=True, timeout=7))
+    transport = PooledTransport(connect_timeout=1, read_timeout=10, registry=registry)
+    assert transport.timeout_for("postExisteCliente") == (1, 7)
+    assert transport.timeout_for("getListSelection") == (1, 10)
+    assert lib.resilience.retry_attempts("postExisteCliente", registry) == lib.resilience.SOAP_RETRY_ATTEMPTS
+    assert lib.resilience.retry_attempts("getListSelection", registry) == 0
+
+    # without the operations of service.py the timeouts and the retries would be lost silently
+    monkeypatch.setattr(lib.registry, "operations", OperationRegistry())
+    with pytest.raises(RuntimeError):
+        PooledTransport()
+    with pytest.raises(RuntimeError):
+        lib.resilience.retry_attempts("postExisteCliente")
+
+
+# ------------------------ async client ------------------------
+
+
+def test_async_call_service_concurrent_calls():
+    async def existe_clientes(url):
+        client = create_async_client()
+        client.transport.endpoint = url
+
+        async def existe_cliente(numero_documento):
+            request = {"tipoDocumento": "Cédula ciudadanía", "numeroDocumento": numero_documento, "origen": "LQN"}
+            response = await async_call_service(client, "postExisteCliente", request=request)
+            return response.result.mensaje, response.envelope.find(".//{*}mensaje").text
+
+        try:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(existe_cliente(numero) for numero in range(10000000, 10000008)))
+            return results, time.perf_counter() - started
+        finally:
+            await client.transport.aclose()
+
+    with LocalSoapServer(EXISTE_CLIENTE_BODY.format(mensaje="ok"), delay=0.2) as server:
+        results, elapsed = asyncio.run(existe_clientes(server.url))
+
+    assert results == [("ok", "ok")] * 8
+    assert len(server.requests) == 8
+    assert b"wsse:Security" in server.requests[0]
+    assert elapsed < 0.2 * 4
+
+
+def test_async_handler_post_existe_cliente():
+    clear_client_cache()
+    with LocalSoapServer(EXISTE_CLIENTE_BODY.format(mensaje="El cliente no existe")) as server:
+        client = lib.utils.get_async_client()
+        client.transport.endpoint = server.url
+        for _ in range(2):
+            result = async_service.handler(
+                {"service": "post_existe_cliente", "format": "dict", "data": {"numeroDocumento": 1}}, None
+            )
+            assert result["mensaje"] == "El cliente no existe"
+
+    assert server.connections == 1
+    assert get_client_cache_stats()["hits"] == 2
+
+
+def test_async_create_client_cancels_catalog_load_of_existing_client(monkeypatch):
+    events = []
+
+    async def get_list_selection(client):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+
+    async def post_existe_cliente(client, data):
+        await asyncio.sleep(0.01)
+        return {"existe": True, "mensaje": "Lead en gestión por otro canal"}
+
+    monkeypatch.setattr(async_service, "list_selection_cache", TTLCache("test", ttl=10))
+    monkeypatch.setattr(async_service, "get_list_selection", get_list_selection)
+    monkeypatch.setattr(async_service, "post_existe_cliente", post_existe_cliente)
+
+    async def create():
+        result = await async_service.service_create_client(None, data_sin_codeudor)
+        await asyncio.sleep(0)
+        return result
+
+    started = time.perf_counter()
+    result = asyncio.run(create())
+    assert result["message"] == "Lead en gestión por otro canal"
+    assert events == ["cancelled"] and time.perf_counter() - started < 1
+
+
+# ------------------------ stub server ------------------------
+
+
+def test_stub_server_answers_every_operation():
+    client = create_client()
+    with StubServer(scale=3) as server:
+        client.transport.endpoint = server.url
+        existe_cliente = post_existe_cliente(client, {"numeroDocumento": 1})
+        assert existe_cliente == {"existe": False, "mensaje": "El cliente no existe"}
+        assert call_service(client, "postCliente", request={}).result.recibido is True
+        assert call_service(client, "postClienteRadicacion", request={}).result is True
+        assert call_service(client, "getAdresPreguntaRequest").result.urlCaptcha
+        proyectos = call_service(client, "getListProyectosByConstructora", request={"nombre": CONSTRUCTORA})
+        assert len(proyectos.result.listProyectos.field) == 3
+        assert len(call_service(client, "getListSelection").result.listTipoDocumento.field) == 3
+
+        preaprobado = get_preaprobado(client, "1")
+        assert preaprobado["result_client"]["resultadPrevalidador"] == "Preaprobado"
+        assert len(preaprobado["preaproved_letter"]) > 3 * 16 * 1024
+
+    assert server.counts == {"requests": 7, "faults": 0, "errors": 0}
+
+
+def test_stub_server_injects_faults_and_errors():
+    client = create_client()
+    with StubServer(fault_rate=1, operations={"postCliente": {"fault_rate": 0, "error_rate": 1}}) as server:
+        client.transport.endpoint = server.url
+        with pytest.raises(Fault) as error:
+            post_existe_cliente(client, {"numeroDocumento": 1})
+        assert error.value.soap_fault == SoapFault("Error", "STUB_ERR", "Fallo inyectado")
+        with pytest.raises(ConnectionError):
+            call_service(client, "postCliente", request={})
+
+
+# ------------------------ timings ------------------------
+
+
+def test_handler_timings_in_response_and_emf(monkeypatch, capsys):
+    monkeypatch.setattr(lib.timing, "TIMINGS", "emf")
+    monkeypatch.setattr(lib.utils, "TIMINGS_IN_RESPONSE", True)
+    monkeypatch.setattr(service, "_post_cliente_catalog_errors", lambda client, data: [])
+    client = create_client()
+    monkeypatch.setattr(service, "get_client", lambda: client)
+
+    with StubServer() as server:
+        client.transport.endpoint = server.url
+        result = json.loads(handler({"service": "create_client", "data": data_sin_codeudor}, None))
+
+    assert result["message"] == "Cliente creado correctamente"
+    stages = {"soap:postExisteCliente", "soap:postCliente", "soap:getPreaprobado", "exchange", "signature"}
+    assert stages | {"serialize", "preaprobado"} <= set(result["timings"])
+    soap = sum(duration for name, duration in result["timings"].items() if name.startswith("soap:"))
+    assert soap >= result["timings"]["exchange"] >= result["timings"]["signature"]
+
+    metrics = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert metrics["service"] == "create_client"
+    assert {metric["Name"] for metric in metrics["_aws"]["CloudWatchMetrics"][0]["Metrics"]} >= stages | {"json"}
+
+
+def test_timings_disabled():
+    assert lib.timing.current_timings() is None
+    assert lib.timing.stage("signature") is lib.timing.stage("serialize")
+    with lib.timing.collect() as timings:
+        assert timings is None
+    assert "timings" not in service.build_reply_message(False, "", None, from_function="test")
+
+
+# ------------------------ tracing ------------------------
+
+
+class RecordingTransport(SentryTransport):
+    def __init__(self, options=None):
+        super().__init__(options)
+        self.items = []
+
+    def capture_envelope(self, envelope):
+        self.items.extend(item.payload.json for item in envelope.items)
+
+    def capture_event(self, event):
+        self.items.append(event)
+
+    def transactions(self):
+        return [item for item in self.items if item.get("type") == "transaction"]
+
+
+@pytest.fixture
+def sentry(monkeypatch):
+    import sentry_sdk
+
+    monkeypatch.setattr(lib.tracing, "_state", None)
+    monkeypatch.setattr(lib.tracing, "SENTRY_DSN", "https://key@sentry.invalid/1")
+    transport = RecordingTransport()
+    lib.tracing.init_sentry(transport=transport)
+    yield transport
+    sentry_sdk.init()
+
+
+def existe_cliente_event():
+    return {"service": "post_existe_cliente", "format": "dict", "data": {"numeroDocumento": 1}}
+
+
+def test_keep_trace():
+    assert lib.tracing.keep_trace(10, failed=True, sample_rate=0)
+    assert lib.tracing.keep_trace(lib.tracing.SENTRY_SLOW_THRESHOLD_MS, failed=False, sample_rate=0)
+    assert not lib.tracing.keep_trace(10, failed=False, sample_rate=0)
+    assert lib.tracing.keep_trace(10, failed=False, sample_rate=1)
+
+
+def test_handler_traces_failed_and_slow_invocations(sentry, monkeypatch):
+    monkeypatch.setattr(lib.tracing, "SENTRY_TRACES_SAMPLE_RATE", 0)
+    client = create_client()
+    monkeypatch.setattr(service, "get_client", lambda: client)
+
+    with StubServer() as server:
+        client.transport.endpoint = server.url
+        handler(existe_cliente_event(), None)
+        assert sentry.transactions() == []
+
+        result = handler({"service": "unknown", "format": "dict"}, None)
+        assert result["error"] is True
+        assert sentry.transactions()[-1]["contexts"]["trace"]["status"] == "unknown_error"
+
+        monkeypatch.setattr(lib.tracing, "SENTRY_SLOW_THRESHOLD_MS", 0)
+        handler(existe_cliente_event(), None)
+
+    transaction = sentry.transactions()[-1]
+    assert len(sentry.transactions()) == 2
+    assert transaction["transaction"] == "post_existe_cliente"
+    spans = {(span["op"], span["description"]) for span in transaction["spans"]}
+    assert {("soap", "postExisteCliente"), ("signature", "signature"), ("serialize", "serialize")} <= spans
+
+
+def test_handler_reports_unhandled_errors(sentry, monkeypatch):
+    client = create_client()
+    monkeypatch.setattr(service, "get_client", lambda: client)
+
+    with StubServer(fault_rate=1) as server:
+        client.transport.endpoint = server.url
+        with pytest.raises(Fault):
+            handler(existe_cliente_event(), None)
+
+    [error] = [item for item in sentry.items if item.get("exception")]
+    assert error["exception"]["values"][0]["type"] == "Fault"
+    [transaction] = sentry.transactions()
+    assert transaction["contexts"]["trace"]["status"] == "internal_error"
+    assert {span["description"] for span in transaction["spans"]} >= {"postExisteCliente"}
+
+
+# ------------------------ cold start ------------------------
+
+
+def test_service_import_does_not_load_optional_dependencies():
+    script = "import sys, service; print(sorted({'asyncio', 'pydantic', 'models', 'sentry_sdk'} & set(sys.modules)))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]"
+
+
+# ------------------------ wsdl artifact ------------------------
+
+
+def test_load_document_from_artifact(tmp_path):
+    wsdl_file = tmp_path / "credifamilia.wsdl"
+    wsdl_file.write_bytes(open(lib.utils.WSDL, "rb").read())
+    build_artifact(str(wsdl_file))
+
+    document = load_document(str(wsdl_file), Transport(), Settings(strict=False))
+    assert "getPreaprobado" in document.bindings[list(document.bindings)[0]]._operations
+
+
+def test_load_document_ignores_stale_artifact(tmp_path):
+    wsdl_file = tmp_path / "credifamilia.wsdl"
+    wsdl_file.write_bytes(open(lib.utils.WSDL, "rb").read())
+    build_artifact(str(wsdl_file))
+
+    wsdl_file.write_bytes(wsdl_file.read_bytes() + b"\n")
+    assert load_document(str(wsdl_file), Transport(), Settings(strict=False)) is None
+
+
+def test_to_builtin_nested_values():
+    element = Element("root")
+    value = OrderedDict(
+        [
+            ("field", deque([OrderedDict([("label", "Cali"), ("value", deque(["Cali"]))])])),
+            ("monto", Decimal("14.5")),
+            ("fecha", datetime(2021, 7, 19)),
+            ("raw", (element,)),
+        ]
+    )
+    expected_result = {
+        "field": [{"label": "Cali", "value": ["Cali"]}],
+        "monto": "14.5",
+        "fecha": "2021-07-19 00:00:00",
+        "raw": [str(element)],
+    }
+    assert expected_result == to_builtin(value)
+    assert json.loads(lib.utils.to_json(serialize_soap_response(value))) == expected_result
+
+
 def test_get_list_proyectos_by_constructora_success():
     json_proyectos = get_list_proyectos_by_constructora(handler, CONSTRUCTORA)
 
@@ -507,7 +1615,7 @@ def test_post_cliente_radicacion_already_exists():
         )
     except Fault as e:
         err_msg = "No se ha podido generar la radicación debido al estado actual de la transacción"
-        client = create_client(history)
+        client = create_client()
 
         parsed_fault_detail = client.wsdl.types.deserialize(e.detail[0])
 
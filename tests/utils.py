@@ -1,4 +1,80 @@
+import copy
 import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from requests import Response
+
+
+RADICACION = {
+    "service": "post_cliente_radicacion",
+    "data": {
+        "idTransaccion": "32258d905f9aba15f1e6427249cd18c9",
+        "lugarNacimiento": "76001",
+        "lugarExpedicionCedula": "76001",
+        "fechaExpedicionCedula": "2015-09-20T00:00:00",
+        "nacionalidad": "Colombia",
+        "nivelEducacion": "Pregrado (Graduado)",
+        "activos": "2700000",
+        "pasivos": "1000000",
+        "direccionResidencia": "Calle 74 # 02 - 10",
+        "ciudadResidencia": "76001",
+        "estrato": 3,
+        "tipoViviendaResidencia": "Familiar",
+        "nitEmpresa": "764363838",
+        "nombreEmpresa": "LQN",
+        "direccionEmpresa": "Calle 74 # 02 - 10",
+        "ciudadEmpresa": "76001",
+        "telefonoEmpresa": "80000000",
+        "trabajaSedeDiferente": False,
+        "cargo": "Desarrollador jefe",
+        "experienciaLaboral": 2,
+        "egresos": "500000",
+        "manejaRecursosPublicos": False,
+        "tieneVinculoPEP": False,
+        "referenciaPersonal": {
+            "nombres": "Mauricio Gonzales",
+            "parentesco": "Amigo(a)",
+            "ciudad": "76001",
+            "celular": "3876780000",
+        },
+        "referenciaFamiliar": {
+            "nombres": "Mauricio Gonzales",
+            "parentesco": "Hijo(a)",
+            "ciudad": "76001",
+            "celular": "3876780001",
+        },
+        "ip": "192.168.0.1",
+        "canal": "Web",
+        "vivienda": {
+            "tipoVivienda": "Usada",
+            "tipoInmueble": "Casa",
+            "destinoInmueble": "Renta",
+            "constructora": "Constructora Bolivar S.A",
+            "tieneParqueadero": True,
+            "tipoParqueadero": "Cubierto",
+            "modalidadCredito": "Uvr",
+            "plazoCredito": "20",
+            "valorInmueble": "240000000",
+            "creditoSolicitadoValorAFinanciar": "120000000",
+            "recursosPropios": "24000000",
+            "subsidioVivienda": "240000000",
+        },
+    },
+}
+
+
+def radicacion_data(type="employe", proyecto="1"):
+    """
+    copy of the data of RADICACION that passes the validation of FilingFactory without calling the api
+    """
+    data = copy.deepcopy(RADICACION["data"])
+    data["type"] = type
+    data["vivienda"]["proyecto"] = proyecto
+    data["vivienda"]["fechaEstimadaEntrega"] = (datetime.now() + timedelta(days=60)).strftime("%Y-%m-%dT00:00:00")
+    return data
 
 
 def get_list_proyectos_by_constructora(handler, constructora):
@@ -13,3 +89,193 @@ def get_list_proyectos_by_constructora(handler, constructora):
     )
 
     return json.loads(lista_proyectos)
+
+
+SOAP_ENVELOPE = (
+    '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">'
+    "<soapenv:Body>{body}</soapenv:Body>"
+    "</soapenv:Envelope>"
+)
+
+LIST_SELECTION = {
+    "listCiudadResidencia": {"field": [{"label": "Cali", "value": "Cali"}]},
+    "listEstadoCivil": {"field": [{"label": "Soltero", "value": "Soltero"}]},
+    "listTipoDocumento": {"field": [{"label": "Cédula de ciudadanía", "value": "Cédula ciudadanía"}]},
+}
+
+EXISTE_CLIENTE_BODY = (
+    '<ns:postExisteClienteResponse xmlns:ns="http://web.proptech.credifamilia.com">'
+    '<ns:return xmlns:ax22="http://response.web.proptech.credifamilia.com/xsd">'
+    "<ax22:existe>false</ax22:existe>"
+    "<ax22:mensaje>{mensaje}</ax22:mensaje>"
+    "</ns:return>"
+    "</ns:postExisteClienteResponse>"
+)
+
+CLIENTE_EXISTE_BODY = (
+    '<ns:postExisteClienteResponse xmlns:ns="http://web.proptech.credifamilia.com">'
+    '<ns:return xmlns:ax22="http://response.web.proptech.credifamilia.com/xsd">'
+    "<ax22:existe>true</ax22:existe>"
+    "<ax22:mensaje>Lead en gestión por otro canal</ax22:mensaje>"
+    "</ns:return>"
+    "</ns:postExisteClienteResponse>"
+)
+
+
+def soap_router(bodies, calls=None):
+    """
+    post_xml replacement that answers every operation with its own body
+    :param bodies: body of the response of every operation, ej. {"postExisteCliente": EXISTE_CLIENTE_BODY}
+    :param calls: list where the called operations are recorded
+    """
+
+    def post_xml(address, envelope, headers):
+        operation = headers["SOAPAction"].strip('"').rsplit(":", 1)[-1]
+        if calls is not None:
+            calls.append(operation)
+        return soap_response(bodies[operation])
+
+    return post_xml
+
+
+def soap_response(body, status_code=200):
+    """
+    build the http response that the transport would receive from credifamilia
+    """
+    response = Response()
+    response.status_code = status_code
+    response.headers["Content-Type"] = "text/xml; charset=UTF-8"
+    response._content = SOAP_ENVELOPE.format(body=body).encode("utf-8")
+    return response
+
+
+PREAPROBADO_BODY = (
+    '<ns:getPreaprobadoResponse xmlns:ns="http://web.proptech.credifamilia.com">'
+    '<ns:return xmlns:ax21="http://exception.web.proptech.credifamilia.com/xsd" '
+    'xmlns:ax28="http://model.web.proptech.credifamilia.com/xsd" '
+    'xmlns:ax22="http://response.web.proptech.credifamilia.com/xsd" '
+    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:type="ax22:GetPreaprobadoResponse">'
+    "<ax22:cartaPreaprobado>{carta}</ax22:cartaPreaprobado>"
+    '<ax22:resultadoCliente xsi:type="ax28:ResultadoCliente">'
+    '<ax28:detalle xsi:type="ax28:Detalle">'
+    "<ax28:LTVPrevalidado>70.0</ax28:LTVPrevalidado>"
+    "<ax28:endeudamientoFinancieroPrevalidado>14.917695473251028</ax28:endeudamientoFinancieroPrevalidado>"
+    "<ax28:montoSugeridoPreaprobado>102260992</ax28:montoSugeridoPreaprobado>"
+    "<ax28:relacionCuotaIngresoPrevalidado>33.0</ax28:relacionCuotaIngresoPrevalidado>"
+    "</ax28:detalle>"
+    "<ax28:estadoConsulta>Disponible para consulta</ax28:estadoConsulta>"
+    '<ax28:fechaRetomaSolicitud xsi:nil="true"/>'
+    "<ax28:observacionesPrevalidador>Consulta exitosa</ax28:observacionesPrevalidador>"
+    "<ax28:resultadPrevalidador>VIABLE</ax28:resultadPrevalidador>"
+    "</ax22:resultadoCliente>"
+    "{codeudores}"
+    "</ns:return>"
+    "</ns:getPreaprobadoResponse>"
+)
+
+RESULTADO_CODEUDOR = (
+    '<ax22:resultadoCodeudor xsi:type="ax28:ResultadoCodeudor">'
+    '<ax28:detalle xsi:type="ax28:Detalle">'
+    "<ax28:montoSugeridoPreaprobado>{monto}</ax28:montoSugeridoPreaprobado>"
+    "</ax28:detalle>"
+    "<ax28:numeroDocumento>{numero_documento}</ax28:numeroDocumento>"
+    "<ax28:tipoDocumento>Cédula ciudadanía</ax28:tipoDocumento>"
+    "</ax22:resultadoCodeudor>"
+)
+
+RADICACION_BODY = (
+    '<ns:postClienteRadicacionResponse xmlns:ns="http://web.proptech.credifamilia.com">'
+    '<ns:return xmlns:ax22="http://response.web.proptech.credifamilia.com/xsd">'
+    "<ax22:radicado>true</ax22:radicado>"
+    "</ns:return>"
+    "</ns:postClienteRadicacionResponse>"
+)
+
+FAULT_BODY = (
+    "<soapenv:Fault>"
+    "<faultcode>soapenv:Server</faultcode>"
+    "<faultstring>{faultstring}</faultstring>"
+    "<detail>"
+    '<ns:proptechEndPointServiceFaultException xmlns:ns="http://web.proptech.credifamilia.com">'
+    '<ServiceFaultException xmlns:ax21="http://exception.web.proptech.credifamilia.com/xsd" '
+    'xmlns:ax22="http://response.web.proptech.credifamilia.com/xsd">'
+    "<ax21:serviceStatus>"
+    "<ax22:code>{code}</ax22:code>"
+    "<ax22:description>{description}</ax22:description>"
+    "</ax21:serviceStatus>"
+    "</ServiceFaultException>"
+    "</ns:proptechEndPointServiceFaultException>"
+    "</detail>"
+    "</soapenv:Fault>"
+)
+
+
+class LocalSoapServer:
+    """
+    soap server on localhost that answers every request with the same body, or with the body of its operation
+    when a dictionary is given, it counts the tcp connections opened by the clients
+    """
+
+    def __init__(self, body, delay=0, address=("127.0.0.1", 0)):
+        if isinstance(body, dict):
+            self.bodies = {
+                operation: SOAP_ENVELOPE.format(body=text).encode("utf-8")
+                for operation, text in body.items()
+            }
+        else:
+            self.bodies = {None: SOAP_ENVELOPE.format(body=body).encode("utf-8")}
+        self.delay = delay
+        self.address = address
+        self.connections = 0
+        self.requests = []
+
+    def respond(self, operation):
+        """
+        :param operation: name of the requested operation, taken from the SOAPAction
+        :return: status and body of the response, or None to close the connection without answering
+        """
+        time.sleep(self.delay)
+        return 200, self.bodies.get(operation) or self.bodies.get(None)
+
+    def __enter__(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are written apart, without this the client waits for the delayed ack
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                server.connections += 1
+                super().setup()
+
+            def do_POST(self):
+                server.requests.append(self.rfile.read(int(self.headers["Content-Length"])))
+                operation = self.headers.get("SOAPAction", "").strip('"').rsplit(":", 1)[-1]
+                response = server.respond(operation)
+                if response is None:
+                    self.close_connection = True
+                    return
+                status, body = response
+                self.send_response(status)
+                self.send_header("Content-Type", "text/xml; charset=UTF-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(self.address, Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return "http://%s:%d/" % (f"[{host}]" if ":" in host else host, port)